@@ -50,6 +50,12 @@ def registerplugins():
         pass # must register plugins    
 
     from rdflib.query import ResultParser, ResultSerializer, Result
+    from rdflib.store import Store
+
+    plugin.register('SQLite', Store,
+        'rdfextras.store.SQLite', 'SQLite')
+    plugin.register('FOPLSQLite', Store,
+        'rdfextras.store.SQLite', 'FOPLSQLite')
 
     plugin.register('sparql', Result,
         'rdfextras.sparql.query', 'SPARQLQueryResult')
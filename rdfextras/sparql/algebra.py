@@ -497,10 +497,11 @@ def TopEvaluate(query,dataset,passedBindings = None,DEBUG=False,exportTree=False
         if result.get_recursive_results is not None:
             selectionF.append(result.map_from)
         vars = result._getAllVariables()
+        # The top union bindings are not needed to build the selection, so
+        # they are only collected from the expansion trees if consumed
         if result.parent1 != None and result.parent2 != None :
-            topUnionBindings=reduce(lambda x,y:x+y,
-                                    [root.returnResult(selectionF) \
-                                      for root in fetchUnionBranchesRoots(result)])
+            topUnionBindings=iterReturnResults(
+                fetchUnionBranchesRoots(result), selectionF[:])
         else:
             if (limit == 0 or limit is not None or offset is not None and \
                  offset > 0):
@@ -511,8 +512,10 @@ def TopEvaluate(query,dataset,passedBindings = None,DEBUG=False,exportTree=False
                     topUnionBindings=[]
 
             else:
-                topUnionBindings=result.top.returnResult(selectionF)
+                topUnionBindings=iterReturnResults(
+                    [result.top], selectionF[:])
         if result.get_recursive_results is not None:
+            topUnionBindings = list(topUnionBindings)
             topUnionBindings.extend(
               result._recur(topUnionBindings, selectionF))
             selectionF.pop()
@@ -672,6 +675,16 @@ class EmptyGraphPatternExpression(AlgebraExpression):
         empty.bound = False
         return sparql_query.Query(empty, tripleStore)
 
+def iterReturnResults(roots, select):
+    """
+    Generator over the result bindings of the given expansion tree roots,
+    only calling returnResult on each root once the previous one has been
+    consumed
+    """
+    for root in roots:
+        for binding in root.returnResult(select):
+            yield binding
+
 def fetchUnionBranchesRoots(node):
     for parent in [node.parent1,node.parent2]:
         if parent.parent1:
@@ -443,13 +443,92 @@ def mapToOperator(expr, prolog, combinationArg=None, constraint=False):
                     expr, type(expr).__name__))
 
 
+SIMPLE_TESTS = {
+    'isIRI': 'isIRI',
+    'isURI': 'isIRI',
+    'isBLANK': 'isBlank',
+    'isLITERAL': 'isLiteral',
+}
+
+
+def _simpleTerm(expr, prolog):
+    if isinstance(expr, ListRedirect):
+        expr = expr.reduce()
+    if isinstance(expr, Variable):
+        return expr
+    elif isinstance(expr, URIRef) and not isinstance(expr, QName):
+        # as mapToOperator has it (QNames are compared as strings there)
+        return URIRef(expr)
+    return None
+
+
+def simpleFilter(expr, prolog):
+    """
+    Converts a parsed filter expression into the neutral form stores which
+    unify whole basic graph patterns at once (see batch_unify) can compile,
+    or returns None if the expression is not (entirely) one of:
+
+    * ``('sameTerm', variable, uri)``, for ``?x = <uri>`` (a full IRI),
+      wrapped in ``('not', ...)`` for ``?x != <uri>``
+    * ``('isIRI', variable)``, ``('isBlank', variable)`` or
+      ``('isLiteral', variable)``
+    * ``('not', expr)``, ``('and', [expr, ...])`` or ``('or', [expr, ...])``
+
+    The conversion is exact, but stores only use it to narrow the solutions
+    down: the constraint functions are checked against each of them anyway.
+    """
+    if isinstance(expr, ListRedirect):
+        expr = expr.reduce()
+    if isinstance(expr, (ParsedConditionalAndExpressionList,
+                         ParsedRelationalExpressionList)):
+        operands = [simpleFilter(operand, prolog) for operand in expr]
+        if [operand for operand in operands if operand is None]:
+            return None
+        if isinstance(expr, ParsedConditionalAndExpressionList):
+            return ('or', operands)
+        return ('and', operands)
+    elif isinstance(expr, LogicalNegation):
+        operand = simpleFilter(expr.argument, prolog)
+        if operand is not None:
+            return ('not', operand)
+    elif isinstance(expr, (EqualityOperator, NotEqualOperator)):
+        left = _simpleTerm(expr.left, prolog)
+        right = _simpleTerm(expr.right, prolog)
+        if isinstance(right, Variable):
+            left, right = right, left
+        if isinstance(left, Variable) and type(right) is URIRef:
+            if isinstance(expr, NotEqualOperator):
+                return ('not', ('sameTerm', left, right))
+            return ('sameTerm', left, right)
+    elif isinstance(expr, BuiltinFunctionCall) and \
+            FUNCTION_NAMES[expr.name] in SIMPLE_TESTS and \
+            len(expr.arguments) == 1:
+        argument = _simpleTerm(expr.arguments[0], prolog)
+        if isinstance(argument, Variable):
+            return (SIMPLE_TESTS[FUNCTION_NAMES[expr.name]], argument)
+    return None
+
+
 def createSPARQLPConstraint(filter, prolog):
     """
     Takes an instance of either ParsedExpressionFilter or ParsedFunctionFilter
     and converts it to a sparql-p operator by composing a python string of
     lambda functions and SPARQL operators.
     This string is then evaluated to return the actual function for sparql-p
+
+    The function has the :func:`simpleFilter` form of the filter (or None)
+    as its ``simpleFilter`` attribute.
     """
+    constraint = _createSPARQLPConstraint(filter, prolog)
+    try:
+        constraint.simpleFilter = simpleFilter(filter.filter, prolog)
+    except AttributeError:
+        # not a plain function
+        pass
+    return constraint
+
+
+def _createSPARQLPConstraint(filter, prolog):
     reducedFilter = isinstance(filter.filter, ListRedirect) \
                     and filter.filter.reduce() \
                     or filter.filter
@@ -2,6 +2,7 @@
 import rdfextras.sparql.parser
 
 from rdfextras.sparql.algebra import TopEvaluate
+from rdfextras.sparql.resultcache import getResultCache
 from rdflib import RDFS, RDF, OWL
 from rdflib.query import Processor
 from rdfextras.sparql.components import Query, Prolog
@@ -27,6 +28,19 @@ class Processor(Processor):
 
         assert isinstance(strOrQuery, (basestring, Query)),"%s must be a string or an rdfextras.sparql.components.Query instance"%strOrQuery
 
+        # Results are only cached for query strings, a Query instance
+        # is modified by its evaluation
+        cacheKey = None
+        cache = getResultCache(getattr(self.graph, 'store', None))
+        if cache is not None and isinstance(strOrQuery, basestring) \
+                and not extensionFunctions:
+            cacheKey = cache.key(self.graph, strOrQuery, initBindings, initNs,
+                                 dataSetBase, dSCompliance, loadContexts)
+            if cacheKey is not None:
+                result = cache.get(cacheKey)
+                if result is not None:
+                    return result
+
         if isinstance(strOrQuery, basestring):
             strOrQuery = rdfextras.sparql.parser.parse(strOrQuery)
 
@@ -39,11 +53,14 @@ class Processor(Processor):
                 if prefix not in strOrQuery.prolog.prefixBindings:
                     strOrQuery.prolog.prefixBindings[prefix] = nsInst
 
-        return TopEvaluate(strOrQuery,
-                           self.graph,
-                           initBindings,
-                           DEBUG=DEBUG,
-                           dataSetBase=dataSetBase,
-                           extensionFunctions=extensionFunctions,
-                           dSCompliance=dSCompliance,
-                           loadContexts=loadContexts)
+        result = TopEvaluate(strOrQuery,
+                             self.graph,
+                             initBindings,
+                             DEBUG=DEBUG,
+                             dataSetBase=dataSetBase,
+                             extensionFunctions=extensionFunctions,
+                             dSCompliance=dSCompliance,
+                             loadContexts=loadContexts)
+        if cacheKey is not None:
+            result = cache.put(cacheKey, result)
+        return result
@@ -14,6 +14,7 @@ from rdfextras.sparql import SPARQLError
 from rdfextras.sparql.components import Prolog
 from rdfextras.sparql.graph import SPARQLGraph
 from rdfextras.sparql.graph import GraphPattern
+from rdfextras.sparql.results import columnar
 
 SPARQL_XML_NAMESPACE = u'http://www.w3.org/2005/sparql-results#'
 
@@ -526,6 +527,10 @@ class _SPARQLNode(object):
     def expand(self, constraints):
         if self.tripleStore.graph.store.batch_unification:
             patterns = []
+            # the unbound blank nodes of the query, as the variables they
+            # are, and back
+            anonymous = {}
+            blankNodes = {}
 
             if self.statement:
                 self.checkForEagerTermination()
@@ -533,17 +538,26 @@ class _SPARQLNode(object):
                 for statement in [self.statement] + self.rest:
                     (s,p,o,func) = statement
 
-                    searchTerms = [self._bind(term) is not None \
-                                    and self._bind(term) \
-                                    or term
-                                        for term in [s,p,o]]
+                    searchTerms = []
+                    for term in [s,p,o]:
+                        bound = self._bind(term)
+                        if bound is not None:
+                            term = bound
+                        elif isinstance(term, BNode) and \
+                                not isinstance(term, SessionBNode):
+                            if term not in anonymous:
+                                anonymous[term] = Variable(BNode())
+                                blankNodes[anonymous[term]] = term
+                            term = anonymous[term]
+                        searchTerms.append(term)
 
                     (search_s, search_p,search_o) = searchTerms # (self._bind(s),self._bind(p),self._bind(o))
 
                     if self.tripleStore.graphVariable:
                         graphName = self.bindings.get(
-                                self.tripleStore.graphVariable,
                                 self.tripleStore.graphVariable)
+                        if graphName is None:
+                            graphName = self.tripleStore.graphVariable
 
                     elif isinstance(self.tripleStore.graph, ConjunctiveGraph) \
                           and self.tripleStore.DAWG_DATASET_COMPLIANCE:
@@ -574,7 +588,7 @@ class _SPARQLNode(object):
 
                     elif isinstance(self.tripleStore.graph, ConjunctiveGraph):
                         # match all graphs
-                        graphName = Variable(BNode())
+                        graphName = None
 
                     else:
                         # otherwise, the default graph is the graph queried
@@ -588,10 +602,18 @@ class _SPARQLNode(object):
                                             if not isGroundQuad(pattern)]
 
                 if nonGroundPatterns:
+                    # the filters the store can apply itself (they are
+                    # checked against each solution below anyway)
+                    filters = [func.simpleFilter for func in constraints
+                               if getattr(func, 'simpleFilter', None)]
 
                     # Only evaluate at the server if not all the terms are ground
-                    for rtDict in self.tripleStore.graph.store.batch_unify(patterns):
+                    for rtDict in self.tripleStore.graph.store.batch_unify(
+                                                            patterns, filters):
                         self.checkForEagerTermination()
+                        for variable, blankNode in blankNodes.items():
+                            if variable in rtDict:
+                                rtDict[blankNode] = rtDict.pop(variable)
 
                         if self.tripleStore.graphVariable:
 
@@ -1516,13 +1538,22 @@ class SPARQLQueryResult(Result):
     * json - as JSON
     * graph - as an RDFLib Graph, for CONSTRUCT and DESCRIBE queries
 
+    The solutions of a SELECT are kept as the tuples handed over by the
+    evaluator and are only turned into binding dictionaries when the
+    ``bindings`` attribute is accessed. Iterating over the result (which is
+    what the serializers do) yields the tuples directly.
     """
+    _rows = None
+    _rowSource = None
+    _bindings = None
+    _length = None
+
     def __init__(self, qResult):
         """
         The constructor is the result straight from sparql. It is tuple of
-        1) a list of tuples (in select order, each item is the valid binding
-           for the corresponding variable or 'None') for SELECTs, a SPARQLGraph
-           for DESCRIBE/CONSTRUCT, and a boolean for ASK
+        1) a list (or any iterable) of tuples (in select order, each item is
+           the valid binding for the corresponding variable or 'None') for
+           SELECTs, a SPARQLGraph for DESCRIBE/CONSTRUCT, and a boolean for ASK
         2) the variables selected
         3) *all* of the variables in the Graph Patterns
         4) the ORDER clause
@@ -1554,20 +1585,103 @@ class SPARQLQueryResult(Result):
             else:
                 self.vars = selectionF
 
-            # self.bindings = [ dict( [ (v, b.get(v)) for v in self.vars ] ) for b in topUnion ]
+            if isinstance(result, (list, tuple)):
+                self._rows = result
+            else:
+                # a one-shot iterator, rows are kept as they are consumed
+                self._rows = []
+                self._rowSource = iter(result)
 
-            if len(self.vars) == 1:
-                self.bindings = [dict(zip(self.vars, [b])) for b in result]
+        else:
+            self.graph = qResult
 
+    def _iterRows(self):
+        """
+        Generator over the raw rows of a SELECT result, in the shape the
+        evaluator produced them (a single value rather than a tuple when only
+        one variable is selected). Rows still held by a pending iterator are
+        pulled from it on demand and kept, so the result can be iterated more
+        than once.
+        """
+        rows = self._rows
+        i = 0
+        while True:
+            if i < len(rows):
+                yield rows[i]
+            elif self._rowSource is None:
+                return
             else:
-                self.bindings = [dict(zip(self.vars, b)) for b in result]
-
-            # remove rows where all bindings are None
-            self.bindings = filter(
-                    lambda x: x.values() != [None]*len(x), self.bindings)
+                try:
+                    row = self._rowSource.next()
+                except StopIteration:
+                    self._rowSource = None
+                    return
+                rows.append(row)
+                yield row
+            i += 1
 
+    def _iterSolutions(self):
+        """
+        Generator over the solutions of a SELECT result as tuples in
+        ``vars`` order, skipping rows where all bindings are None.
+        """
+        if len(self.vars) == 1:
+            for row in self._iterRows():
+                if row is not None:
+                    yield (row,)
         else:
-            self.graph = qResult
+            width = len(self.vars)
+            for row in self._iterRows():
+                for value in row[:width]:
+                    if value is not None:
+                        yield tuple(row[:width])
+                        break
+
+    def __iter__(self):
+        if self.type == 'SELECT':
+            return self._iterSolutions()
+        return Result.__iter__(self)
+
+    def __len__(self):
+        if self.type != 'SELECT':
+            return Result.__len__(self)
+        if self._bindings is not None:
+            return len(self._bindings)
+        if self._length is None:
+            length = 0
+            for solution in self._iterSolutions():
+                length += 1
+            self._length = length
+        return self._length
+
+    def _get_bindings(self):
+        """Method for 'bindings' property."""
+        if self._bindings is None and self.type == 'SELECT':
+            vars = self.vars
+            self._bindings = [dict(zip(vars, solution))
+                                for solution in self._iterSolutions()]
+        return self._bindings
+
+    def _set_bindings(self, bindings):
+        self._bindings = bindings
+
+    bindings = property(_get_bindings, _set_bindings,
+                        doc="the solutions of a SELECT as a list of "
+                            "dictionaries, built on first access")
+
+    def to_columns(self):
+        """
+        Return the solutions of a SELECT as a dictionary of columns, one per
+        selected variable, see :func:`rdfextras.sparql.results.columnar.toColumns`.
+        """
+        return columnar.toColumns(self)
+
+    def to_dataframe(self):
+        """
+        Return the solutions of a SELECT as a pandas ``DataFrame``, see
+        :func:`rdfextras.sparql.results.columnar.toDataFrame`.
+        """
+        return columnar.toDataFrame(self)
 
     def _get_selectionF(self):
         """Method for 'selectionF' property."""
@@ -0,0 +1,271 @@
+"""
+A cache of SPARQL query results, shared by all the queries against a store.
+
+Once enabled for a store, the SPARQL processor looks up SELECT and ASK
+queries in the cache before parsing them and keeps their (fully read)
+solutions afterwards. Entries are keyed on the query text with insignificant
+whitespace and comments removed, the initial bindings and namespaces, the
+graph the query is run against and a version number of the store. The
+version is bumped on every ``TripleAddedEvent`` and ``TripleRemovedEvent``
+the store dispatches, so any change to the data makes the results computed
+before it unreachable (they are then discarded as the cache fills up).
+
+>>> from rdflib.graph import Graph
+>>> from rdflib.term import URIRef
+>>> from rdfextras.sparql.resultcache import enableResultCache
+>>> g = Graph()
+>>> cache = enableResultCache(g.store)
+>>> q = 'SELECT ?s WHERE { ?s ?p ?o }'
+>>> len(g.query(q)), len(g.query(' SELECT ?s\\nWHERE { ?s ?p ?o }'))
+(0, 0)
+>>> cache.hits, cache.misses
+(1, 1)
+>>> g.add((URIRef('urn:a'), URIRef('urn:b'), URIRef('urn:c')))
+>>> len(g.query(q))
+1
+
+The version can only follow the changes a store reports through its
+dispatcher: stores which do not dispatch triple events (or data changed
+behind the store's back, a transaction being rolled back, ...) require an
+explicit call to :meth:`ResultCache.invalidate`.
+"""
+
+import re
+import time
+import weakref
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from rdflib import store as rdflibstore
+
+from rdfextras import store as extrasstore
+from rdfextras.utils.lrucache import LRUCache
+
+__all__ = ['ResultCache', 'enableResultCache', 'disableResultCache',
+           'getResultCache', 'normalizeQuery']
+
+# Default memory budget, in bytes, of a result cache
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Rough number of bytes taken by a term held in a cached row, on top of the
+# length of its lexical form
+TERM_OVERHEAD = 64
+
+# Events which change the content of a store, for rdflib stores as well as
+# for stores derived from rdfextras.store.Store
+STORE_EVENTS = [rdflibstore.StoreCreatedEvent,
+                rdflibstore.TripleAddedEvent,
+                rdflibstore.TripleRemovedEvent,
+                extrasstore.StoreCreatedEvent,
+                extrasstore.TripleAddedEvent,
+                extrasstore.TripleRemovedEvent]
+
+# Strings and IRIs are kept verbatim, comments and runs of whitespace are
+# replaced by a single space
+_QUERY_TOKENS = re.compile(
+    r'("""(?:[^"\\]|\\.|"(?!""))*"""'
+    r"|'''(?:[^'\\]|\\.|'(?!''))*'''"
+    r'|"(?:[^"\\\n\r]|\\.)*"'
+    r"|'(?:[^'\\\n\r]|\\.)*'"
+    r'|<[^<>"{}|^`\\\s]*>)'
+    r'|(?:\s|#[^\n\r]*)+')
+
+_caches = weakref.WeakKeyDictionary()
+# the stores whose dispatcher was subscribed to (see _subscribe)
+_subscribed = weakref.WeakKeyDictionary()
+
+
+def _normalizeToken(match):
+    if match.group(1) is not None:
+        return match.group(1)
+    return ' '
+
+
+def normalizeQuery(queryString):
+    """
+    Return the text of a SPARQL query with its comments removed and the
+    whitespace between tokens collapsed, so that queries differing only in
+    layout share their cache entries.
+
+    >>> normalizeQuery('SELECT ?s # all of them\\n WHERE { ?s ?p  "a  b" }')
+    'SELECT ?s WHERE { ?s ?p "a  b" }'
+    """
+    return _QUERY_TOKENS.sub(_normalizeToken, queryString).strip()
+
+
+def _estimateSize(value):
+    if isinstance(value, bool):
+        return TERM_OVERHEAD
+    size = TERM_OVERHEAD
+    for row in value[0]:
+        if isinstance(row, tuple):
+            for term in row:
+                if term is not None:
+                    size += len(term) + TERM_OVERHEAD
+        elif row is not None:
+            size += len(row) + TERM_OVERHEAD
+    return size
+
+
+class ResultCache(object):
+    """
+    The results of the queries against one store.
+
+    ``maxBytes`` is the memory budget of the cache. Entries older than
+    ``ttl`` seconds (if given) are not returned anymore. With ``compact``
+    set, results are kept pickled: they take far less memory, at the price
+    of unpickling them on every hit.
+    """
+
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES, ttl=None, compact=False):
+        self.ttl = ttl
+        self.compact = compact
+        self.version = 0
+        self._entries = LRUCache(maxBytes, sizeof=self._sizeof,
+                                 expired=self._expired)
+
+    def _sizeof(self, key, entry):
+        if self.compact:
+            return len(entry[1]) + TERM_OVERHEAD
+        return _estimateSize(entry[1])
+
+    def _expired(self, key, entry):
+        return self.ttl is not None and time.time() - entry[0] > self.ttl
+
+    def _get_hits(self):
+        return self._entries.hits
+    hits = property(_get_hits)
+
+    def _get_misses(self):
+        return self._entries.misses
+    misses = property(_get_misses)
+
+    def changed(self, event=None):
+        """
+        Event handler bumping the version of the store, so that the entries
+        computed so far are not used anymore.
+        """
+        self.version += 1
+
+    def invalidate(self):
+        """Discard all the entries of the cache."""
+        self.version += 1
+        self._entries.clear()
+
+    def key(self, graph, queryString, initBindings, initNs, *options):
+        """
+        Return the key of a query against ``graph`` (a graph over the store
+        of this cache), or None if the query cannot be cached.
+        """
+        try:
+            key = (normalizeQuery(queryString),
+                   tuple(sorted(initBindings.items())),
+                   tuple(sorted(initNs.items())),
+                   graph.__class__, graph.identifier,
+                   options, self.version)
+            hash(key)
+        except TypeError:
+            # unhashable bindings
+            return None
+        return key
+
+    def get(self, key):
+        """
+        Return the result cached for ``key`` (in the form returned by
+        :func:`~rdfextras.sparql.algebra.TopEvaluate`), or None.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored, value = entry
+        if self.compact:
+            value = pickle.loads(value)
+        return self._result(value)
+
+    def put(self, key, result):
+        """
+        Cache the ``result`` of an evaluation and return what should be
+        handed over in its place (the solutions of a SELECT are read in
+        full). Only the results of SELECT and ASK queries are cached.
+        """
+        if isinstance(result, bool):
+            value = result
+        elif isinstance(result, tuple):
+            rows, selectionF, allVars, orderBy, distinct, topUnion = result
+            value = (tuple(rows), selectionF, allVars, orderBy, distinct)
+        else:
+            return result
+        if self.compact:
+            entry = (time.time(), pickle.dumps(value, 2))
+        else:
+            entry = (time.time(), value)
+        self._entries[key] = entry
+        return self._result(value)
+
+    def _result(self, value):
+        if isinstance(value, bool):
+            return value
+        rows, selectionF, allVars, orderBy, distinct = value
+        return (rows, list(selectionF), list(allVars), orderBy, distinct, [])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "<ResultCache: version %s, %r>" % (self.version, self._entries)
+
+
+def enableResultCache(store, maxBytes=DEFAULT_MAX_BYTES, ttl=None,
+                      compact=False):
+    """
+    Cache the results of the SPARQL queries against ``store`` and return the
+    :class:`ResultCache` used. The store must have an rdflib event
+    dispatcher.
+    """
+    cache = _caches.get(store)
+    if cache is not None:
+        return cache
+    dispatcher = getattr(store, 'dispatcher', None)
+    if dispatcher is None:
+        raise ValueError(
+            "%r has no event dispatcher, its changes cannot be tracked" % store)
+    cache = ResultCache(maxBytes, ttl, compact)
+    _subscribe(store, dispatcher)
+    _caches[store] = cache
+    return cache
+
+
+def _subscribe(store, dispatcher):
+    # subscribes to the changes of ``store`` once, for all the caches it
+    # will have (rdflib's Dispatcher cannot unsubscribe a handler): the
+    # handler looks up the cache of the store when an event is dispatched
+    if store in _subscribed:
+        return
+    ref = weakref.ref(store)
+
+    def changed(event):
+        store = ref()
+        if store is not None:
+            cache = _caches.get(store)
+            if cache is not None:
+                cache.changed(event)
+    for eventType in STORE_EVENTS:
+        dispatcher.subscribe(eventType, changed)
+    _subscribed[store] = True
+
+
+def disableResultCache(store):
+    """Stop caching the results of the queries against ``store``."""
+    cache = _caches.pop(store, None)
+    if cache is not None:
+        cache.invalidate()
+
+
+def getResultCache(store):
+    """Return the result cache enabled for ``store``, or None."""
+    if store is None or not _caches:
+        return None
+    return _caches.get(store)
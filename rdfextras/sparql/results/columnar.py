@@ -0,0 +1,167 @@
+"""
+Columnar export of the solutions of a SELECT query.
+
+The solutions are transposed straight from the tuples held by the result
+into one column per selected variable, without building a binding
+dictionary per row:
+
+* columns holding only IRIs and blank nodes are dictionary encoded as a
+  :class:`CategoricalColumn`,
+* columns holding only numeric literals are converted to numbers, in a
+  NumPy array when NumPy is installed (``float64`` with NaN for unbound
+  values, ``int64`` for fully bound integer columns, ``object`` for those
+  outside its range), unless one of them is ill-typed (such as
+  ``"abc"^^xsd:integer``),
+* any other column is a list of terms.
+
+Unbound values are None (or NaN, or the code -1).
+
+>>> from rdflib import Literal, URIRef, Variable
+>>> from rdfextras.sparql.query import SPARQLQueryResult
+>>> a, b = URIRef('urn:a'), URIRef('urn:b')
+>>> r = SPARQLQueryResult(([(a, Literal(2)), (b, Literal(3)), (a, None)],
+...     [Variable('x'), Variable('n')], [], None, False, []))
+>>> columns = toColumns(r)
+>>> columns['x'].categories
+[rdflib.term.URIRef(u'urn:a'), rdflib.term.URIRef(u'urn:b')]
+>>> list(columns['x'].codes)
+[0, 1, 0]
+"""
+
+from rdflib.namespace import XSD
+from rdflib.term import BNode, Literal, URIRef
+
+__all__ = ['CategoricalColumn', 'toColumns', 'toDataFrame']
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INTEGER_TYPES = set([XSD.integer, XSD.int, XSD.long, XSD.short, XSD.byte,
+                     XSD.nonNegativeInteger, XSD.nonPositiveInteger,
+                     XSD.positiveInteger, XSD.negativeInteger,
+                     XSD.unsignedLong, XSD.unsignedInt, XSD.unsignedShort,
+                     XSD.unsignedByte])
+
+REAL_TYPES = set([XSD.decimal, XSD.double, XSD.float])
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+
+class CategoricalColumn(object):
+    """
+    A dictionary encoded column: ``codes`` holds, for each row, the index
+    of its term in ``categories`` (-1 when unbound).
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        categories = self.categories
+        for code in self.codes:
+            if code < 0:
+                yield None
+            else:
+                yield categories[code]
+
+    def __repr__(self):
+        return "<CategoricalColumn: %s rows, %s categories>" % (
+            len(self.codes), len(self.categories))
+
+
+def _categorical(values):
+    index = {}
+    codes = [value is None and -1 or index.setdefault(value, len(index))
+             for value in values]
+    categories = [None] * len(index)
+    for value, code in index.iteritems():
+        categories[code] = value
+    if numpy is not None:
+        codes = numpy.array(codes, dtype='int32')
+    return CategoricalColumn(codes, categories)
+
+
+def _numeric(values, integral):
+    # None if a lexical form is not a number of its datatype (ill-typed
+    # literals are valid RDF), the column then keeping its terms
+    if integral:
+        convert = int
+    else:
+        convert = float
+    numbers = []
+    try:
+        for value in values:
+            if value is not None:
+                value = convert(value)
+            numbers.append(value)
+    except ValueError:
+        return None
+    if numpy is None:
+        return numbers
+    if integral and None not in numbers:
+        if INT64_MIN <= min(numbers) and max(numbers) <= INT64_MAX:
+            return numpy.array(numbers, dtype='int64')
+        # a column of Python integers
+        return numpy.array(numbers, dtype=object)
+    nan = numpy.nan
+    try:
+        return numpy.array(
+            [number is None and nan or float(number) for number in numbers],
+            dtype='float64')
+    except OverflowError:
+        # an integer too large for a float
+        return numpy.array(numbers, dtype=object)
+
+
+def _column(values):
+    kinds = set([value.__class__ for value in values])
+    kinds.discard(None.__class__)
+    if not kinds:
+        return list(values)
+    if kinds.issubset((URIRef, BNode)):
+        return _categorical(values)
+    if kinds == set([Literal]):
+        datatypes = set([value.datatype for value in values
+                         if value is not None])
+        if datatypes.issubset(INTEGER_TYPES | REAL_TYPES):
+            column = _numeric(values, datatypes.issubset(INTEGER_TYPES))
+            if column is not None:
+                return column
+    return list(values)
+
+
+def toColumns(result):
+    """
+    Return the solutions of the SELECT ``result`` as a dictionary mapping
+    the name of each selected variable to its column.
+    """
+    names = [unicode(var) for var in result.vars]
+    solutions = list(result)
+    if solutions:
+        columns = zip(*solutions)
+    else:
+        columns = [()] * len(names)
+    return dict(zip(names, [_column(values) for values in columns]))
+
+
+def toDataFrame(result):
+    """
+    Return the solutions of the SELECT ``result`` as a pandas ``DataFrame``
+    (dictionary encoded columns become ``Categorical`` columns). Requires
+    pandas.
+    """
+    import pandas
+    names = [unicode(var) for var in result.vars]
+    columns = toColumns(result)
+    for name, column in columns.items():
+        if isinstance(column, CategoricalColumn):
+            columns[name] = pandas.Categorical.from_codes(
+                column.codes, column.categories)
+    return pandas.DataFrame(columns, columns=names)
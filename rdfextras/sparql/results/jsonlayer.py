@@ -34,15 +34,21 @@
 and encoding JSON data.
 
 This module currently supports the following JSON modules:
+ - ``ujson``: http://pypi.python.org/pypi/ujson
  - ``simplejson``: http://code.google.com/p/simplejson/
  - ``cjson``: http://pypi.python.org/pypi/python-cjson
  - ``json``: This is the version of ``simplejson`` that is bundled with the
    Python standard library since version 2.6
    (see http://docs.python.org/library/json.html)
 
-The default behavior is to use ``simplejson`` if installed, and otherwise
-fallback to the standard library module. To explicitly tell SPARQLWrapper
-which module to use, invoke the `use()` function with the module name::
+The default behavior is to use the fastest of the installed modules, trying
+them in the order given by ``AUTO_ORDER`` (``ujson``, then ``simplejson``,
+then the standard library module). ``cjson`` is quick too but is only used
+on request, as it mishandles some unicode escapes. ``ujson`` is set up to
+write what the others do (no escaped slashes, a ValueError for NaN and
+Infinity), but with at most 15 decimals per float. To explicitly tell
+SPARQLWrapper which module to use, invoke the `use()` function with the
+module name::
 
     import jsonlayer
     jsonlayer.use('cjson')
@@ -55,12 +61,17 @@ SPARQLWrapper to use custom decoding and encoding functions::
 
 """
 
-__all__ = ['decode', 'encode', 'use']
+__all__ = ['decode', 'encode', 'dump', 'use']
+
+# Modules tried when none was chosen with use(), fastest first (as measured
+# encoding SPARQL JSON results)
+AUTO_ORDER = ('ujson', 'simplejson', 'json')
 
 _initialized = False
 _using = None
 _decode = None
 _encode = None
+_dump = None
 
 
 def decode(string):
@@ -89,18 +100,59 @@ def encode(obj):
     return _encode(obj)
 
 
+def dump(obj, fp, encoding=None):
+    """Encode the given object as JSON, writing it to a file-like object.
+
+    For an ASCII compatible ``encoding`` the document is produced with
+    non-ASCII characters escaped, which both lets the C encoders of the
+    standard library module and ``simplejson`` run and gives bytes that can
+    be written as they are; ``ujson`` output is written as is for UTF-8. In
+    these cases the document is not encoded a second time.
+
+    :param obj: the Python data structure to encode
+    :type obj: object
+    :param fp: the stream to write to
+    :type fp: file-like object
+    :param encoding: the encoding of the bytes written to ``fp``, or None to
+                     write a unicode string
+    :type encoding: str
+    """
+    if not _initialized:
+        _initialize()
+    if _dump is not None:
+        _dump(obj, fp, encoding)
+    elif encoding is None:
+        fp.write(_encode(obj))
+    else:
+        fp.write(_encode(obj).encode(encoding))
+
+
+def _isUTF8(encoding):
+    return encoding.lower().replace('_', '-') in ('utf-8', 'utf8')
+
+
+def _isASCIICompatible(encoding):
+    try:
+        return u'{"\\}'.encode(encoding) == '{"\\}'
+    except LookupError:
+        return False
+
+
 def use(module=None, decode=None, encode=None):
     """Set the JSON library that should be used, either by specifying a known
     module name, or by providing a decode and encode function.
    
-    The modules "simplejson", "cjson", and "json" are currently supported for
-    the ``module`` parameter.
+    The modules "ujson", "simplejson", "cjson", and "json" are currently
+    supported for the ``module`` parameter.
    
     If provided, the ``decode`` parameter must be a callable that accepts a
     JSON string and returns a corresponding Python data structure. The
     ``encode`` callable must accept a Python data structure and return the
     corresponding JSON string. Exceptions raised by decoding and encoding
     should be propagated up unaltered.
+
+    Called without any argument, it restores the automatic selection of
+    the module.
    
     :param module: the name of the JSON library module to use, or the module object itself
     :type module: str or module
@@ -109,56 +161,118 @@ def use(module=None, decode=None, encode=None):
     :param encode: a function for encoding objects as JSON strings
     :type encode: callable
     """
-    global _decode, _encode, _initialized, _using
+    global _decode, _encode, _dump, _initialized, _using
     if module is not None:
         if not isinstance(module, basestring):
             module = module.__name__
-        if module not in ('cjson', 'json', 'simplejson'):
+        if module not in ('cjson', 'json', 'simplejson', 'ujson'):
             raise ValueError('Unsupported JSON module %s' % module)
         _using = module
         _initialized = False
+    elif decode is None and encode is None:
+        _using = None
+        _initialized = False
     else:
         assert decode is not None and encode is not None
         _using = 'custom'
         _decode = decode
         _encode = encode
+        _dump = None
         _initialized = True
 
 
 def _initialize():
     global _initialized
 
+    def _asciiDump(module):
+        def _dump(obj, fp, encoding, dumps=module.dumps):
+            if encoding is None:
+                fp.write(dumps(obj, allow_nan=False, ensure_ascii=False))
+            elif _isASCIICompatible(encoding):
+                fp.write(dumps(obj, allow_nan=False))
+            else:
+                fp.write(dumps(obj, allow_nan=False,
+                               ensure_ascii=False).encode(encoding))
+        return _dump
+
+    def _init_ujson():
+        global _decode, _encode, _dump
+        import ujson
+        # the output of the other modules: full float precision, no
+        # escaped slashes and no NaN or Infinity (ujson 1.x, which has no
+        # allow_nan, refuses them with an OverflowError)
+        options = {'double_precision': 15, 'escape_forward_slashes': False}
+        try:
+            ujson.dumps(0, allow_nan=False)
+            options['allow_nan'] = False
+        except TypeError:
+            pass
+
+        def dumps(obj, ensure_ascii=True):
+            try:
+                return ujson.dumps(obj, ensure_ascii=ensure_ascii, **options)
+            except OverflowError, e:
+                raise ValueError(str(e))
+
+        def _encode(obj):
+            s = dumps(obj, ensure_ascii=False)
+            if isinstance(s, unicode):
+                return s
+            return s.decode('utf-8')
+
+        def _dump(obj, fp, encoding):
+            if encoding is not None and not _isUTF8(encoding) \
+                    and _isASCIICompatible(encoding):
+                fp.write(dumps(obj))
+                return
+            s = dumps(obj, ensure_ascii=False)
+            if isinstance(s, unicode):
+                if encoding is not None:
+                    s = s.encode(encoding)
+            elif encoding is None:
+                s = s.decode('utf-8')
+            elif not _isUTF8(encoding):
+                s = s.decode('utf-8').encode(encoding)
+            fp.write(s)
+
+        _decode = lambda string, loads=ujson.loads: loads(string)
+
     def _init_simplejson():
-        global _decode, _encode
+        global _decode, _encode, _dump
         import simplejson
         _decode = lambda string, loads=simplejson.loads: loads(string)
         _encode = lambda obj, dumps=simplejson.dumps: \
             dumps(obj, allow_nan=False, ensure_ascii=False)
+        _dump = _asciiDump(simplejson)
 
     def _init_cjson():
-        global _decode, _encode
+        global _decode, _encode, _dump
         import cjson
         _decode = lambda string, decode=cjson.decode: decode(string)
         _encode = lambda obj, encode=cjson.encode: encode(obj)
+        _dump = None
 
     def _init_stdlib():
-        global _decode, _encode
+        global _decode, _encode, _dump
         json = __import__('json', {}, {})
         _decode = lambda string, loads=json.loads: loads(string)
         _encode = lambda obj, dumps=json.dumps: \
             dumps(obj, allow_nan=False, ensure_ascii=False)
+        _dump = _asciiDump(json)
 
-    if _using == 'simplejson':
-        _init_simplejson()
-    elif _using == 'cjson':
-        _init_cjson()
-    elif _using == 'json':
-        _init_stdlib()
+    inits = {'ujson': _init_ujson, 'simplejson': _init_simplejson,
+             'cjson': _init_cjson, 'json': _init_stdlib}
+    if _using in inits:
+        inits[_using]()
     elif _using != 'custom':
-        try:
-            _init_simplejson()
-        except ImportError:
-            _init_stdlib()
+        for module in AUTO_ORDER[:-1]:
+            try:
+                inits[module]()
+                break
+            except ImportError:
+                pass
+        else:
+            inits[AUTO_ORDER[-1]]()
     _initialized = True
 
 
@@ -2,6 +2,7 @@ from rdflib.query import Result, ResultException, ResultSerializer, ResultParser
 from rdflib import Literal, URIRef, BNode, Variable
 
 import jsonlayer
+from rdfextras.utils.lrucache import LRUCache
 
 """A Serializer for SPARQL results in JSON: 
 
@@ -14,6 +15,10 @@ Authors: Drew Perttula, Gunnar Aastrand Grimnes
 
 """
 
+# Maximum number of distinct terms interned while parsing a single result
+# document
+TERM_CACHE_SIZE = 10000
+
 class JSONResultParser(ResultParser): 
     
     def parse(self, source): 
@@ -34,22 +39,26 @@ class JSONResultSerializer(ResultSerializer):
             # select
             res["results"]={}
             res["head"]={}
-            res["head"]["vars"]=self.result.vars
-            res["results"]["bindings"]=[self._bindingToJSON(x) for x in self.result.bindings]
+            vars=self.result.vars
+            res["head"]["vars"]=vars
+            res["results"]["bindings"]=[self._rowToJSON(vars, row) for row in self.result]
 
 
-        r=jsonlayer.encode(res)
-        if encoding!=None:
-            stream.write(r.encode(encoding))
-        else:
-            stream.write(r)
+        jsonlayer.dump(res, stream, encoding)
 
     def _bindingToJSON(self, b):
         res={}
         for var in b: 
             j=termToJSON(self,b[var])
             if j!=None:
-                res[var]=termToJSON(self,b[var])
+                res[var]=j
+        return res
+
+    def _rowToJSON(self, vars, row):
+        res={}
+        for var, term in zip(vars, row):
+            if term is not None:
+                res[var]=termToJSON(self,term)
         return res
 
 
@@ -74,22 +83,38 @@ class JSONResult(Result):
             self.vars=[Variable(x) for x in json["head"]["vars"]]
 
     def _get_bindings(self):
+        # Repeated terms and variable names share a single instance
+        termCache = LRUCache(TERM_CACHE_SIZE)
+        variables = {}
         ret = []
         for row in self.json['results']['bindings']:
             outRow = {}
             for k, v in row.items():
-                outRow[Variable(k)] = parseJsonTerm(v)
+                var = variables.get(k)
+                if var is None:
+                    var = variables[k] = Variable(k)
+                outRow[var] = parseJsonTerm(v, termCache)
             ret.append(outRow)
         return ret
 
-def parseJsonTerm(d):
+def parseJsonTerm(d, cache=None):
     """rdflib object (Literal, URIRef, BNode) for the given json-format dict.
     
     input is like:
       { 'type': 'uri', 'value': 'http://famegame.com/2006/01/username' }
       { 'type': 'literal', 'value': 'drewp' }
+
+    If a cache (a dictionary-like object such as an
+    :class:`~rdfextras.utils.lrucache.LRUCache`) is given, terms are looked
+    up in it first and newly created ones are added to it.
     """
     
+    if cache is not None:
+        key = (d['type'], d['value'], d.get('xml:lang'), d.get('datatype'))
+        ret = cache.get(key)
+        if ret is None:
+            ret = cache[key] = parseJsonTerm(d)
+        return ret
     t = d['type']
     if t == 'uri':
         return URIRef(d['value'])
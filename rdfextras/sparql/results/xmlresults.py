@@ -15,10 +15,15 @@ from rdflib.query import (
     ResultSerializer,
     ResultException
     )
+from rdfextras.utils.lrucache import LRUCache
 
 SPARQL_XML_NAMESPACE = u'http://www.w3.org/2005/sparql-results#'
 RESULTS_NS_ET = '{%s}' % SPARQL_XML_NAMESPACE
 
+# Maximum number of distinct terms interned while parsing a single result
+# document
+TERM_CACHE_SIZE = 10000
+
 
 """A Parser for SPARQL results in XML:
 
@@ -72,16 +77,28 @@ class XMLResult(Result):
 
         Result.__init__(self, type_)
         if type_ == 'SELECT':
+            # Repeated terms and variable names share a single instance
+            termCache = LRUCache(TERM_CACHE_SIZE)
+            variables = {}
             self.bindings = []
             for result in results:
                 r = {}
                 for binding in result:
-                    r[Variable(binding.get('name'))] = parseTerm(binding[0])
+                    name = binding.get('name')
+                    var = variables.get(name)
+                    if var is None:
+                        var = variables[name] = Variable(name)
+                    r[var] = parseTerm(binding[0], termCache)
                 self.bindings.append(r)
 
-            self.vars = [Variable(x.get("name"))
-                for x in tree.findall(
-                    './%shead/%svariable' % (RESULTS_NS_ET, RESULTS_NS_ET))]
+            self.vars = []
+            for x in tree.findall(
+                    './%shead/%svariable' % (RESULTS_NS_ET, RESULTS_NS_ET)):
+                name = x.get("name")
+                var = variables.get(name)
+                if var is None:
+                    var = variables[name] = Variable(name)
+                self.vars.append(var)
 
         elif type_ == 'ASK':
             self.askAnswer = boolean.text.lower().strip() == "true"
@@ -89,10 +106,21 @@ class XMLResult(Result):
             self.graph=g
 
 
-def parseTerm(element):
+def parseTerm(element, cache=None):
     """rdflib object (Literal, URIRef, BNode) for the given
-    elementtree element"""
+    elementtree element
+
+    If a cache (a dictionary-like object such as an
+    :class:`~rdfextras.utils.lrucache.LRUCache`) is given, terms are looked
+    up in it first and newly created ones are added to it."""
     tag, text = element.tag, element.text
+    if cache is not None:
+        key = (tag, text, element.get('datatype', None),
+               element.get("{%s}lang"%XML_NAMESPACE, None))
+        ret = cache.get(key)
+        if ret is None:
+            ret = cache[key] = parseTerm(element)
+        return ret
     if tag == RESULTS_NS_ET + 'literal':
         if text is None:
             text = ''
@@ -127,12 +155,16 @@ class XMLResultSerializer(ResultSerializer):
             writer.write_header([])
             writer.write_ask(self.result.askAnswer)
         else:
-            writer.write_header(self.result.vars)
+            vars = self.result.vars
+            writer.write_header(vars)
             writer.write_results_header()
-            for b in self.result.bindings:
+            # iterating the result gives the solutions as tuples in vars
+            # order, without building a binding dictionary per row
+            for row in self.result:
                 writer.write_start_result()
-                for key, val in b.iteritems():
-                    writer.write_binding(key, val)
+                for key, val in zip(vars, row):
+                    if val is not None:
+                        writer.write_binding(key, val)
 
                 writer.write_end_result()
 
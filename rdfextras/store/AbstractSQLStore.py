@@ -1,12 +1,20 @@
-from rdflib.term import BNode, URIRef, Literal
+import os
+import re
+import tempfile
+import threading
+import time
+from rdflib.term import BNode, URIRef, Literal, Variable
 from rdflib.namespace import RDF
 try:
     from hashlib import sha1
 except ImportError:
     from sha import sha as sha1
+from rdfextras.utils.termutils import CONTEXT
 from rdfextras.utils.termutils import REVERSE_TERM_COMBINATIONS
+from rdfextras.utils.termutils import TERM_COMBINATIONS
 from rdfextras.utils.termutils import TERM_INSTANTIATION_DICT
 from rdfextras.utils.termutils import constructGraph
+from rdfextras.utils.termutils import normalizeGraph
 from rdfextras.utils.termutils import type2TermCombination
 from rdfextras.utils.termutils import statement2TermCombination
 from rdfextras.utils.termutils import escape_quotes
@@ -15,7 +23,11 @@ from rdfextras.store.REGEXMatching import REGEXTerm
 from rdflib.graph import Graph
 from rdflib.graph import QuotedGraph
 from rdflib.store import Store
+from rdflib.store import TripleAddedEvent
+from rdflib.store import TripleRemovedEvent
+from rdflib.parser import create_input_source
 from rdflib.py3compat import PY3
+from rdfextras.utils.lrucache import LRUCache
 def bb(u): return u.encode('utf-8')
 Any = None
 
@@ -33,6 +45,31 @@ FULL_TRIPLE_PARTITIONS = [QUOTED_PARTITION,ASSERTED_LITERAL_PARTITION]
 
 INTERNED_PREFIX = 'kb_'
 
+# Default memory budget (in bytes) of the term cache of a store
+TERM_CACHE_BYTES = 16 * 1024 * 1024
+
+# Rough size of a term object and its cache entry, besides its strings
+TERM_OVERHEAD = 160
+
+# Number of distinct statement shapes kept rewritten for the driver
+STATEMENT_CACHE_SIZE = 1000
+
+# Kinds of rows of the statistics table: the number of asserted statements
+# in the store, in a context (quoted statements included), with a predicate
+# and in the extension of a class
+TOTAL_STATISTIC     = 'T'
+CONTEXT_STATISTIC   = 'C'
+PREDICATE_STATISTIC = 'P'
+CLASS_STATISTIC     = 'K'
+
+STATISTICS_TABLE = '%s_statistics'
+
+CREATE_STATISTICS_TABLE = """
+CREATE TABLE %s_statistics (
+    kind        char(1) not NULL,
+    term        text not NULL,
+    total       bigint not NULL)"""
+
 # Stolen from Will Waites' py4s
 
 def skolemise(statement):
@@ -51,25 +88,133 @@ def deskolemise(statement):
     return tuple(map(_dst, statement))
 
 
-def queryAnalysis(query, store, cursor):
+def patternShape(subject, predicate, obj, context=None):
     """
-    Helper function for executing EXPLAIN on all dispatched SQL statements -
-    for the pupose of analyzing index usage
+    The shape of a triple pattern, as far as buildClause is concerned: for
+    each of its slots (subject, predicate, object and context), whether it
+    is bound to a term ('s', 'p', 'o' or 'c'), to a regular expression
+    ('~') or to a list of terms ('*'), or unbound ('?', as are variables).
+
+    >>> patternShape(URIRef('urn:a'), None, REGEXTerm('x'), None)
+    's?~?'
     """
-    cursor.execute(store._normalizeSQLCmd('explain ' + query))
-    rt = cursor.fetchall()[0]
-    table, joinType, posKeys, _key, key_len, comparedCol, rowsExamined, extra = rt
-    if not _key:
-        assert joinType == 'ALL'
-        if not hasattr(store, 'queryOptMarks'):
-            store.queryOptMarks = {}
-        hits = store.queryOptMarks.get(('FULL SCAN', table), 0)
-        store.queryOptMarks[('FULL SCAN', table)] = hits + 1
+    shape = []
+    for term, bound in [(subject, 's'), (predicate, 'p'), (obj, 'o'),
+                        (context, 'c')]:
+        if term is None or isinstance(term, Variable):
+            shape.append('?')
+        elif isinstance(term, REGEXTerm):
+            shape.append('~')
+        elif isinstance(term, list):
+            shape.append('*')
+        else:
+            shape.append(bound)
+    return ''.join(shape)
 
+
+def contextTermCombination(letter, column='termComb'):
+    """
+    A SQL expression of the term combination (see TERM_COMBINATIONS) of the
+    rows of ``column`` moved to a context of the ``letter`` term type
+
+    >>> contextTermCombination('U')[:40]
+    'CASE termComb WHEN 1 THEN 0 WHEN 2 THEN '
+    """
+    cases = []
+    for combination, index in sorted(TERM_COMBINATIONS.items(),
+                                     key=lambda item: item[1]):
+        moved = TERM_COMBINATIONS[combination[:CONTEXT] + letter]
+        if moved != index:
+            cases.append('WHEN %s THEN %s' % (index, moved))
+    return 'CASE %s %s ELSE %s END' % (column, ' '.join(cases), column)
+
+
+def queryAnalysis(query, store, cursor, params=None, shape=None):
+    """
+    Helper function for capturing the plan of a dispatched SQL statement
+    (with the ``explainQuery`` method of the store) - for the purpose of
+    analyzing index usage. Each table access of the plan is counted in
+    ``store.queryOptMarks``, by index (and as a 'FULL SCAN' of the table if
+    the whole table or index is read), and the plan is recorded in
+    ``store.queryPlans`` under the ``shape`` of the triple pattern (see
+    patternShape). Returns the plan.
+    """
+    plan = store.explainQuery(cursor, query, params)
     if not hasattr(store, 'queryOptMarks'):
         store.queryOptMarks = {}
-    hits = store.queryOptMarks.get((_key,table), 0)
-    store.queryOptMarks[(_key, table)] = hits + 1
+    marks = store.queryOptMarks
+    for table, index, fullScan in plan:
+        if fullScan:
+            marks[('FULL SCAN', table)] = \
+                marks.get(('FULL SCAN', table), 0) + 1
+        marks[(index, table)] = marks.get((index, table), 0) + 1
+    store.queryPlans.record(shape, plan)
+    return plan
+
+
+class QueryPlans(object):
+    """
+    The plans captured by queryAnalysis, aggregated by the shape of the
+    triple patterns they resolve: the number of queries of each shape
+    analyzed (``queries``) and, for each shape, the number of times each
+    (table, index, fullScan) access was in their plans (``accesses``).
+    """
+
+    def __init__(self):
+        self.queries = {}
+        self.accesses = {}
+
+    def record(self, shape, plan):
+        self.queries[shape] = self.queries.get(shape, 0) + 1
+        accesses = self.accesses.setdefault(shape, {})
+        for access in plan:
+            accesses[access] = accesses.get(access, 0) + 1
+
+    def fullScans(self):
+        """
+        (shape, table, count) triples: how many times the queries of a
+        shape read the whole of a table (or of one of its indexes), the
+        most frequent first
+        """
+        scans = []
+        for shape, accesses in self.accesses.items():
+            for (table, index, fullScan), count in accesses.items():
+                if fullScan:
+                    scans.append((shape, table, count))
+        scans.sort(key=lambda scan: (-scan[2], scan[0], scan[1]))
+        return scans
+
+    def report(self):
+        """
+        A report of the table accesses of the queries of each shape, the
+        shapes causing the most full scans first
+        """
+        scanned = {}
+        for shape, table, count in self.fullScans():
+            scanned[shape] = scanned.get(shape, 0) + count
+        shapes = self.queries.keys()
+        shapes.sort(key=lambda shape: (
+            -scanned.get(shape, 0), -self.queries[shape], shape))
+        lines = []
+        for shape in shapes:
+            lines.append("%s: %s queries, %s full scans" % (
+                shape, self.queries[shape], scanned.get(shape, 0)))
+            accesses = self.accesses[shape].items()
+            accesses.sort(key=lambda item: (not item[0][2], -item[1],
+                                            item[0][0]))
+            for (table, index, fullScan), count in accesses:
+                if fullScan:
+                    how = 'FULL SCAN'
+                    if index:
+                        how += ' of index %s' % index
+                else:
+                    how = 'index %s' % index
+                lines.append("    %s: %s (%s)" % (table, how, count))
+        return '\n'.join(lines)
+
+    def clear(self):
+        self.queries.clear()
+        self.accesses.clear()
 
 
 def unionSELECT(selectComponents, distinct=False, selectType=TRIPLE_SELECT):
@@ -82,6 +227,9 @@ def unionSELECT(selectComponents, distinct=False, selectType=TRIPLE_SELECT):
      - table alias
      - table type (literal, type, asserted, quoted)
      - where clause string
+
+    TRIPLE_SELECT orders the rows by triple, TRIPLE_SELECT_NO_ORDER returns
+    the same rows unsorted.
     """
     selects = []
     for tableName,tableAlias,whereClause,tableType in selectComponents:
@@ -90,7 +238,8 @@ def unionSELECT(selectComponents, distinct=False, selectType=TRIPLE_SELECT):
             selectString = "select count(*)"
             tableSource = " from %s " % tableName
         elif selectType == CONTEXT_SELECT:
-            selectString = "select %s.context" % tableAlias
+            selectString = "select %s.context, %s.termComb" % (
+                tableAlias, tableAlias)
             tableSource = " from %s as %s " % (tableName,tableAlias)
         elif tableType in FULL_TRIPLE_PARTITIONS:
             selectString = "select *"#%(tableAlias)
@@ -126,7 +275,7 @@ def extractTriple(tupleRt, store, hardCodedContext=None):
         termCombString = REVERSE_TERM_COMBINATIONS[termComb]
         subjTerm, predTerm, objTerm, ctxTerm = termCombString
     except ValueError:
-        subject, subjTerm, predicate, predTerm, obj, objTerm, rtContext, ctxTerm, objLanguage, objDatatype = tupleRt
+        subject, subjTerm, predicate, predTerm, obj, objTerm, rtContext, ctxTerm, objDatatype, objLanguage = tupleRt
     context = rtContext is not None and rtContext or hardCodedContext.identifier
     s = createTerm(subject, subjTerm, store)
     p = createTerm(predicate, predTerm, store)
@@ -137,96 +286,197 @@ def extractTriple(tupleRt, store, hardCodedContext=None):
 
 def createTerm(termString, termType, store, objLanguage=None, objDatatype=None):
     """
-    #TODO: Stuff
     Takes a term value, term type, and store intsance
     and creates a term object.
 
+    Terms are interned in the (bounded) ``termCache`` of the store, keyed
+    on all four arguments, so repeated values decode to the same object.
+
     QuotedGraphs are instantiated differently
     """
+    key = (termType, termString, objLanguage, objDatatype)
+    rt = store.termCache.get(key)
+    if rt is not None:
+        return rt
     if termType == 'L':
-        cache = store.literalCache.get((termString, objLanguage, objDatatype))
-        if cache is not None:
-            #store.cacheHits += 1
-            return cache
+        if objDatatype:
+            rt = Literal(termString, datatype=objDatatype)
+        elif objLanguage:
+            rt = Literal(termString, lang=objLanguage)
         else:
-            #store.cacheMisses += 1
-            # rt = Literal(termString, objLanguage, objDatatype)
-            # store.literalCache[((termString, objLanguage, objDatatype))] = rt
-            if objLanguage and not objDatatype:
-                rt = Literal(termString, lang=objLanguage)
-                store.literalCache[((termString, objLanguage))] = rt
-            elif objDatatype and not objLanguage:
-                rt = Literal(termString, datatype=objDatatype)
-                store.literalCache[((termString, objDatatype))] = rt
-            elif not objLanguage and not objDatatype:
-                rt = Literal(termString)
-                store.literalCache[((termString))] = rt
-            else:
-                rt = Literal(termString, datatype=objDatatype)
-                store.literalCache[((termString, objDatatype))] = rt
-            return rt
+            rt = Literal(termString)
     elif termType == 'F':
-        cache = store.otherCache.get((termType, termString))
-        if cache is not None:
-            #store.cacheHits += 1
-            return cache
-        else:
-            #store.cacheMisses += 1
-            rt = QuotedGraph(store, URIRef(termString))
-            store.otherCache[(termType, termString)] = rt
-            return rt
-    elif termType == 'B':
-        cache = store.bnodeCache.get((termString))
-        if cache is not None:
-            #store.cacheHits += 1
-            return cache
-        else:
-            #store.cacheMisses += 1
-            rt = TERM_INSTANTIATION_DICT[termType](termString)
-            store.bnodeCache[(termString)] = rt
-            return rt
+        rt = QuotedGraph(store, URIRef(termString))
     elif termType == 'U':
-        cache = store.uriCache.get((termString))
-        if cache is not None:
-            #store.cacheHits += 1
-            return cache
-        else:
-            #store.cacheMisses += 1
-            rt = URIRef(termString)
-            store.uriCache[(termString)] = rt
-            return rt
+        rt = URIRef(termString)
     else:
-        cache = store.otherCache.get((termType, termString))
-        if cache is not None:
-            #store.cacheHits += 1
-            return cache
-        else:
-            #store.cacheMisses += 1
-            rt = TERM_INSTANTIATION_DICT[termType](termString)
-            store.otherCache[(termType, termString)] = rt
-            return rt
+        rt = TERM_INSTANTIATION_DICT[termType](termString)
+    store.termCache[key] = rt
+    return rt
 
+def termSize(key, term):
+    """
+    Rough number of bytes held by an entry of a term cache (the
+    ``(termType, termString, objLanguage, objDatatype)`` key and its term).
+    """
+    termType, termString, objLanguage, objDatatype = key
+    size = TERM_OVERHEAD + 2 * len(termString)
+    if objLanguage:
+        size += len(objLanguage)
+    if objDatatype:
+        size += len(objDatatype)
+    return size
+
+
+def convertParamstyle(qStr, paramstyle):
+    """
+    Rewrites the ``%s`` parameter markers of a SQL statement for a DB-API
+    driver with the given (positional) ``paramstyle``
+
+    >>> convertParamstyle('a=%s and b=%s', 'qmark')
+    'a=? and b=?'
+    >>> convertParamstyle('a=%s and b=%s', 'numeric')
+    'a=:1 and b=:2'
+    """
+    if paramstyle in ('format', 'pyformat'):
+        return qStr
+    parts = qStr.split('%s')
+    if paramstyle == 'qmark':
+        return '?'.join(parts)
+    elif paramstyle == 'numeric':
+        converted = [parts[0]]
+        for index in range(1, len(parts)):
+            converted.append(':%s' % index)
+            converted.append(parts[index])
+        return ''.join(converted)
+    raise ValueError("Unsupported paramstyle: %s" % paramstyle)
+
+_INSERT_COMMAND = re.compile(
+    r'^\s*(INSERT\s+(?:\w+\s+)*?INTO)\s*(\S+)\s*\(([^)]*)\)\s*VALUES\s*'
+    r'(\(.*\))\s*$',
+    re.I | re.S)
+
+def parseInsert(insertCmd):
+    """
+    Returns the table, the column list and the VALUES tuple of a single row
+    INSERT statement (as built by the build*SQLCommand methods)
+
+    >>> parseInsert('INSERT INTO t (a,b) VALUES (%s, %s)')
+    ('t', 'a,b', '(%s, %s)')
+    """
+    match = _INSERT_COMMAND.match(insertCmd)
+    if match is None:
+        raise ValueError("Not a single row INSERT statement: %s" % insertCmd)
+    return match.groups()[1:]
+
+def multiRowInsert(insertCmd, rowCount):
+    """
+    Turns a single row INSERT statement into one inserting ``rowCount``
+    rows at once (its parameters are those of the rows, concatenated)
+
+    >>> multiRowInsert('INSERT INTO t (a,b) VALUES (%s, %s)', 2)
+    'INSERT INTO t (a,b) VALUES (%s, %s),(%s, %s)'
+    >>> multiRowInsert('INSERT IGNORE INTO t (a) VALUES (%s)', 2)
+    'INSERT IGNORE INTO t (a) VALUES (%s),(%s)'
+    """
+    match = _INSERT_COMMAND.match(insertCmd)
+    if match is None:
+        raise ValueError("Not a single row INSERT statement: %s" % insertCmd)
+    command, table, columns, values = match.groups()
+    return "%s %s (%s) VALUES %s" % (
+        command, table, columns, ','.join([values] * rowCount))
+
+def _delimitedField(value):
+    if value is None:
+        return '\\N'
+    elif isinstance(value, (int, long)):
+        return str(value)
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value.replace('\\', '\\\\').replace('\t', '\\t'
+               ).replace('\n', '\\n').replace('\r', '\\r')
+
+def writeDelimitedRows(rows, stream):
+    """
+    Writes rows of parameters as tab separated (utf-8) lines, in the text
+    format read by default by MySQL's ``LOAD DATA INFILE`` and PostgreSQL's
+    ``COPY``: NULL is written ``\\N``, backslashes, tabs and line breaks
+    are escaped with a backslash
+
+    >>> from StringIO import StringIO
+    >>> stream = StringIO()
+    >>> writeDelimitedRows([('a\\tb', 1, None)], stream)
+    >>> stream.getvalue()
+    'a\\\\tb\\t1\\t\\\\N\\n'
+    """
+    write = stream.write
+    for row in rows:
+        write('\t'.join([_delimitedField(value) for value in row]))
+        write('\n')
 
 class SQLGenerator:
+    # The DB-API paramstyle of the driver ('format', 'pyformat', 'qmark'
+    # or 'numeric') parameters are bound with. If None, they are instead
+    # filled in the statements, quoted.
+    paramstyle = 'format'
+
     def executeSQL(self, cursor, qStr, params=None, paramList=False):
         """
         This takes the query string and parameters and (depending on the
         SQL implementation) either fill in the parameter in-place or pass
         it on to the Python DB impl (if it supports this). The default
-        (here) is to fill the parameters in-place surrounding each param
-        with quote characters
+        (here) is to bind them with the driver, rewriting the ``%s`` markers
+        for its ``paramstyle``, and to use ``executemany`` for a list of
+        parameter sequences (``paramList``). Setting ``paramstyle`` to None
+        fills the parameters in-place surrounding each param with quote
+        characters.
+
+        Statements are rewritten once per shape (the statement text, as
+        produced by buildClause and the build*Command methods): the same
+        text is then handed to the driver for each execution, which lets
+        drivers keeping a statement cache per connection (such as sqlite3)
+        skip parsing and planning it again.
+        """
+        if self.paramstyle is None:
+            self._executeInPlace(cursor, qStr, params, paramList)
+        elif paramList:
+            if params:
+                cursor.executemany(self._statement(qStr),
+                                   [tuple(item) for item in params])
+        elif not params:
+            cursor.execute(unicode(qStr))
+        else:
+            cursor.execute(self._statement(qStr), tuple(params))
+
+    def _statement(self, qStr):
         """
-        # print("SQLGenerator", qStr,params)
+        The statement to hand to the driver for a parameterized ``qStr``.
+        """
+        statement = self._statements.get(qStr)
+        if statement is None:
+            statement = convertParamstyle(
+                unicode(qStr).replace('"', "'"), self.paramstyle)
+            self._statements[qStr] = statement
+        return statement
+
+    def _executeInPlace(self, cursor, qStr, params, paramList):
         if not params:
             cursor.execute(unicode(qStr))
         elif paramList:
-            raise Exception("Not supported!")
+            for item in params:
+                self._executeInPlace(cursor, qStr, item, False)
         else:
-            params = tuple([not isinstance(item,int) and u"'%s'" % item or item
-                                for item in params])
+            params = tuple([self._quote(item) for item in params])
             querystr = unicode(qStr).replace('"',"'")
             cursor.execute(querystr%params)
 
+    def _quote(self, item):
+        if item is None:
+            return u'NULL'
+        elif isinstance(item, (int, long)):
+            return item
+        return u"'%s'" % item
+
     # FIXME:  This *may* prove to be a performance bottleneck and should
     # perhaps be implemented in C (as it was in 4Suite RDF)
     def EscapeQuotes(self,qstr):
@@ -255,7 +505,9 @@ class SQLGenerator:
         if isinstance(term, (QuotedGraph, Graph)):
             return term.identifier.encode('utf-8')
         elif isinstance(term, Literal):
-            return self.EscapeQuotes(term).encode('utf-8')
+            if self.paramstyle is None:
+                return self.EscapeQuotes(term).encode('utf-8')
+            return term.encode('utf-8')
         elif term is None or isinstance(term, (tuple, list, REGEXTerm)):
             return term
         else:
@@ -266,7 +518,7 @@ class SQLGenerator:
         Builds an insert command for a type table
         """
         #columns: member,klass,context
-        rt = "INSERT INTO %s_type_statements" % storeId + " (member,klass,context,termComb) VALUES (%s, %s, %s,%s)"
+        rt = "%s %s_type_statements" % (self.insertCommand, storeId) + " (member,klass,context,termComb) VALUES (%s, %s, %s,%s)"
         return rt,[
             self.normalizeTerm(member),
             self.normalizeTerm(klass),
@@ -280,15 +532,15 @@ class SQLGenerator:
         """
         triplePattern = int(statement2TermCombination(subject, predicate, obj, context))
         literal_table = "%s_literal_statements" % storeId
-        command = "INSERT INTO %s " % literal_table +" (subject,predicate,object,context,termComb,objLanguage,objDatatype) VALUES (%s, %s, %s, %s, %s,%s,%s)"
+        command = "%s %s " % (self.insertCommand, literal_table) +" (subject,predicate,object,context,termComb,objLanguage,objDatatype) VALUES (%s, %s, %s, %s, %s,%s,%s)"
         return command, [
             self.normalizeTerm(subject),
             self.normalizeTerm(predicate),
             self.normalizeTerm(obj),
             self.normalizeTerm(context.identifier),
             triplePattern,
-            isinstance(obj, Literal) and obj.language or 'NULL',
-            isinstance(obj, Literal) and obj.datatype or 'NULL']
+            isinstance(obj, Literal) and obj.language or None,
+            isinstance(obj, Literal) and obj.datatype or None]
 
     def buildTripleSQLCommand(self, subject, predicate, obj, context, storeId, quoted):
         """
@@ -297,17 +549,17 @@ class SQLGenerator:
         stmt_table = quoted and "%s_quoted_statements" % storeId or "%s_asserted_statements" % storeId
         triplePattern = statement2TermCombination(subject, predicate, obj, context)
         if quoted:
-            command = "INSERT INTO %s" % stmt_table +" (subject,predicate,object,context,termComb,objLanguage,objDatatype) VALUES (%s, %s, %s, %s, %s,%s,%s)"
+            command = "%s %s" % (self.insertCommand, stmt_table) +" (subject,predicate,object,context,termComb,objLanguage,objDatatype) VALUES (%s, %s, %s, %s, %s,%s,%s)"
             params = [
                 self.normalizeTerm(subject),
                 self.normalizeTerm(predicate),
                 self.normalizeTerm(obj),
                 self.normalizeTerm(context.identifier),
                 triplePattern,
-                isinstance(obj, Literal) and  obj.language or 'NULL',
-                isinstance(obj, Literal) and obj.datatype or 'NULL']
+                isinstance(obj, Literal) and  obj.language or None,
+                isinstance(obj, Literal) and obj.datatype or None]
         else:
-            command = "INSERT INTO %s" % stmt_table + " (subject,predicate,object,context,termComb) VALUES (%s, %s, %s, %s, %s)"
+            command = "%s %s" % (self.insertCommand, stmt_table) + " (subject,predicate,object,context,termComb) VALUES (%s, %s, %s, %s, %s)"
             params = [
                 self.normalizeTerm(subject),
                 self.normalizeTerm(predicate),
@@ -322,16 +574,18 @@ class SQLGenerator:
         """
         parameters = []
         if typeTable:
-            rdf_type_memberClause = rdf_type_contextClause = rdf_type_contextClause = None
+            rdf_type_memberClause = rdf_type_klassClause = rdf_type_contextClause = None
 
 
-            clauseParts = self.buildTypeMemberClause(self.normalizeTerm(subject), tableName)
+            clauseParts = self.buildInClause('member', subject, tableName) or \
+                self.buildTypeMemberClause(self.normalizeTerm(subject), tableName)
             if clauseParts is not None:
                 rdf_type_memberClause = clauseParts[0]
                 parameters.extend([param for param in clauseParts[-1] if param is not None])
 
 
-            clauseParts = self.buildTypeClassClause(self.normalizeTerm(obj), tableName)
+            clauseParts = self.buildInClause('klass', obj, tableName) or \
+                self.buildTypeClassClause(self.normalizeTerm(obj), tableName)
             if clauseParts is not None:
                 rdf_type_klassClause = clauseParts[0]
                 parameters.extend(clauseParts[-1])
@@ -350,19 +604,22 @@ class SQLGenerator:
             subjClause = predClause = objClause = contextClause = litDTypeClause = litLanguageClause = None
 
 
-            clauseParts = self.buildSubjClause(self.normalizeTerm(subject), tableName)
+            clauseParts = self.buildInClause('subject', subject, tableName) or \
+                self.buildSubjClause(self.normalizeTerm(subject), tableName)
             if clauseParts is not None:
                 subjClause = clauseParts[0]
                 parameters.extend([param for param in clauseParts[-1] if param is not None])
 
 
-            clauseParts = self.buildPredClause(self.normalizeTerm(predicate), tableName)
+            clauseParts = self.buildInClause('predicate', predicate, tableName) or \
+                self.buildPredClause(self.normalizeTerm(predicate), tableName)
             if clauseParts is not None:
                 predClause = clauseParts[0]
                 parameters.extend([param for param in clauseParts[-1] if param is not None])
 
 
-            clauseParts = self.buildObjClause(self.normalizeTerm(obj), tableName)
+            clauseParts = self.buildInClause('object', obj, tableName) or \
+                self.buildObjClause(self.normalizeTerm(obj), tableName)
             if clauseParts is not None:
                 objClause = clauseParts[0]
                 parameters.extend([param for param in clauseParts[-1] if param is not None])
@@ -393,6 +650,21 @@ class SQLGenerator:
 
         return clauseString, [p for p in parameters if p is not None]
 
+    def buildInClause(self, column, terms, tableName):
+        """
+        Builds a 'column in (...)' clause for a list of terms (as passed
+        to triples_choices), or returns None if ``terms`` is not a list or
+        has to be handled by the backend (a list with regular expressions)
+        """
+        if not isinstance(terms, list) or not terms:
+            return None
+        for term in terms:
+            if isinstance(term, REGEXTerm):
+                return None
+        return ("%s.%s in (" % (tableName, column) +
+                ", ".join(["%s"] * len(terms)) + ")",
+                [self.normalizeTerm(term) for term in terms])
+
     def buildLitDTypeClause(self, obj, tableName):
         if isinstance(obj,Literal):
             return obj.datatype is not None and (
@@ -451,6 +723,46 @@ class AbstractSQLStore(Store, SQLGenerator):
     transaction_aware = True
     regex_matching = PYTHON_REGEX
     autocommit_default = True
+    # Memory budget (in bytes) of the cache of terms decoded from rows
+    termCacheBytes = TERM_CACHE_BYTES
+    # Number of rows fetched at once when reading triples
+    fetchSize = 1000
+    # Whether triple scans should use server side cursors (see
+    # serverSideCursor)
+    serverSideCursors = False
+    # Number of terms at most in the 'in' list of a triples_choices query
+    choicesChunkSize = 500
+    # Number of quads normalized and inserted at once by a bulk load
+    bulkChunkSize = 10000
+    # Number of rows inserted by each multi-row INSERT of a bulk load
+    bulkInsertRows = 500
+    # Whether statement counts are kept in the statistics table (which the
+    # backend creates, see CREATE_STATISTICS_TABLE) and used by __len__
+    statistics = False
+    # Statement loading a file written by writeDelimitedRows into a table,
+    # with %(file)s, %(table)s and %(columns)s fill-ins (see loadRows). If
+    # None, bulk loads use multi-row INSERTs
+    loadDataCommand = None
+    # Verb of the statements adding rows to the partitions (backends whose
+    # tables have unique keys can skip the duplicates with their variant of
+    # INSERT IGNORE)
+    insertCommand = 'INSERT INTO'
+    # If true, the plan of each triple pattern query is captured (see
+    # queryAnalysis and explainQuery) before it is run
+    analyzeQueries = False
+    # Number of statements add keeps in a buffer (of the calling thread, if
+    # the store has a pool) rather than writing them one by one, 0 to write
+    # each at once. The buffer is written with addN (see flush) once it
+    # holds writeBehindSize statements or its oldest is writeBehindAge
+    # seconds old (as checked by add), and before commits, closes, removals
+    # and reads. The TripleAddedEvents are dispatched by add all the same.
+    writeBehindSize = 0
+    writeBehindAge = 1.0
+    # Whether the SQL text of the triple pattern queries is generated once
+    # per shape of pattern (see _queryShape) rather than for every pattern:
+    # backends whose build*Clause methods bind the terms otherwise than with
+    # a parameter per term (as SQLite's do) should turn it off
+    templateQueries = True
 
     # Stubs to be overidden as required
 
@@ -460,6 +772,8 @@ class AbstractSQLStore(Store, SQLGenerator):
         configuration: string containing infomation open can use to
         connect to datastore.
         """
+        # the node pickler (and the dispatcher) of Store
+        super(AbstractSQLStore, self).__init__()
         self.identifier = identifier and identifier or 'hardcoded'
         # Use only the first 10 bytes of the digest
         self._internedId = INTERNED_PREFIX + \
@@ -476,26 +790,114 @@ class AbstractSQLStore(Store, SQLGenerator):
         # regardless of what the object of the triple pattern is
         self.STRONGLY_TYPED_TERMS = False
 
+        self.termCache = LRUCache(self.termCacheBytes, sizeof=termSize)
+        # the plans captured while analyzeQueries is set
+        self.queryPlans = QueryPlans()
+        # parameterized statements, rewritten for the driver's paramstyle
+        self._statements = LRUCache(STATEMENT_CACHE_SIZE)
+        # the SQL text of the triples queries, by shape of pattern
+        self._tripleQueries = LRUCache(STATEMENT_CACHE_SIZE)
+        # the statements buffered by add (see writeBehindSize), per thread
+        # if the store has a pool
+        self._addBuffer = WriteBehindBuffer()
+        self._local = threading.local()
+        # a ConnectionPool (see _db), to be set before the store is shared
+        # by several threads
+        self.pool = None
+        self._db = None
+        # the connection autocommit was last turned off for
+        self._autocommitOff = None
+
         if configuration is not None:
             self.open(configuration)
 
-        self.cacheHits = 0
-        self.cacheMisses = 0
+    def _get_db(self):
+        if self.pool is not None:
+            return self.pool.connection()
+        return self._connection
+
+    def _set_db(self, connection):
+        self._connection = connection
+
+    _db = property(_get_db, _set_db, doc="""
+        The connection of the store or, if the store has a ``pool``, the
+        connection of the calling thread""")
+
+    def _get_readDb(self):
+        if self.pool is not None:
+            return self.pool.readConnection()
+        return self._connection
+
+    _readDb = property(_get_readDb, doc="""
+        The connection for read-only queries: a replica connection if the
+        store's ``pool`` has replicas, as _db otherwise""")
+
+    def _get_writeBuffer(self):
+        if self.pool is None:
+            return self._addBuffer
+        buffer = getattr(self._local, 'addBuffer', None)
+        if buffer is None:
+            buffer = self._local.addBuffer = WriteBehindBuffer()
+        return buffer
+
+    _writeBuffer = property(_get_writeBuffer, doc="""
+        The buffer of the statements added by the calling thread (see
+        writeBehindSize)""")
+
+    def _get_cacheHits(self):
+        return self.termCache.hits
+    cacheHits = property(_get_cacheHits,
+                         doc="number of terms found in the term cache")
+
+    def _get_cacheMisses(self):
+        return self.termCache.misses
+    cacheMisses = property(_get_cacheMisses,
+                           doc="number of terms missing from the term cache")
+
+    def scanCursor(self):
+        """
+        Return a cursor for reading the rows of a triple pattern scan: the
+        serverSideCursor of the read connection if ``serverSideCursors`` is
+        set, a plain cursor of it otherwise.
+        """
+        if self.serverSideCursors:
+            return self.serverSideCursor(self._readDb)
+        return self._readDb.cursor()
 
-        self.literalCache = {}
-        self.uriCache = {}
-        self.bnodeCache = {}
-        self.otherCache = {}
-        self._db = None
+    def serverSideCursor(self, connection):
+        """
+        Return a server side (streaming) cursor of ``connection``, so the
+        rows of a scan are not all transferred before the first one is
+        decoded. Backends whose driver supports them override this, e.g.
+        with ``connection.cursor(MySQLdb.cursors.SSCursor)`` or a named
+        psycopg2 cursor; the default is a plain cursor (which drivers
+        stepping through the rows as they are fetched, such as sqlite3,
+        already give). With some drivers the connection cannot run another
+        statement until such a cursor has been read to the end, hence
+        ``serverSideCursors`` is off by default.
+        """
+        return connection.cursor()
 
-        self.__node_pickler = None
+    def _beginWrite(self, cursor):
+        """
+        Turns autocommit off before the first write on a connection (if
+        ``autocommit_default`` is set), rather than before every write
+        """
+        if self.autocommit_default and self._autocommitOff is not self._db:
+            cursor.execute("""SET AUTOCOMMIT=0""")
+            self._autocommitOff = self._db
 
     def close(self, commit_pending_transaction=False):
         """
         FIXME:  Add documentation!!
         """
+        self.flush()
         if commit_pending_transaction:
             self._db.commit()
+        if self.pool is not None:
+            self.pool.releaseConnection()
+            self.pool.close()
+            return
         try:
             self._db.close()
         except:
@@ -504,9 +906,10 @@ class AbstractSQLStore(Store, SQLGenerator):
     # Triple Methods
     def add(self, (subject, predicate, obj), context=None, quoted=False):
         """ Add a triple to the store of triples. """
+        if self._buffered((subject, predicate, obj, context)):
+            return
         c = self._db.cursor()
-        if self.autocommit_default:
-            c.execute("""SET AUTOCOMMIT=0""")
+        self._beginWrite(c)
         if quoted or predicate != RDF.type:
             # Quoted statement or non rdf:type predicate
             # check if object is a literal
@@ -521,65 +924,241 @@ class AbstractSQLStore(Store, SQLGenerator):
             addCmd, params = self.buildTypeSQLCommand(
                 subject, obj, context, self._internedId)
         self.executeSQL(c, addCmd, params)
+        # (a rowcount of 0: the insertCommand skipped a duplicate)
+        if self.statistics and c.rowcount != 0:
+            deltas = {}
+            self._countStatement(deltas, predicate, obj, context, quoted)
+            self._updateStatistics(c, deltas)
         c.close()
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(subject, predicate, obj), context=context))
+
+    def _buffered(self, quad):
+        """
+        Keeps a quad given to add in the buffer of the calling thread if
+        ``writeBehindSize`` is set (and writes the buffer if it is full or
+        old enough). Returns whether the quad was buffered.
+
+        The TripleAddedEvent of a buffered quad is dispatched at once, so
+        that the listeners (such as a result cache) do not wait for the
+        flush to learn of the change.
+        """
+        if not self.writeBehindSize:
+            return False
+        buffer = self._writeBuffer
+        now = time.time()
+        if not buffer.quads:
+            buffer.since = now
+        buffer.quads.append(quad)
+        subject, predicate, obj, context = quad
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(subject, predicate, obj), context=context))
+        if len(buffer.quads) >= self.writeBehindSize or \
+                now - buffer.since >= self.writeBehindAge:
+            self.flush()
+        return True
+
+    def flush(self):
+        """
+        Writes the statements buffered by add (see ``writeBehindSize``)
+        with addN, an executemany per partition (their TripleAddedEvents
+        were dispatched by add). Nothing is committed.
+        """
+        buffer = self._writeBuffer
+        if buffer.quads:
+            quads, buffer.quads = buffer.quads, []
+            self.addN(quads, dispatch=False)
 
-    def addN(self,quads):
+    def addN(self, quads, dispatch=True):
         c = self._db.cursor()
-        if self.autocommit_default:
-            c.execute("""SET AUTOCOMMIT=0""")
-        literalTriples = []
-        typeTriples = []
-        otherTriples = []
-        literalTripleInsertCmd = None
-        typeTripleInsertCmd = None
-        otherTripleInsertCmd = None
+        self._beginWrite(c)
+        deltas = self._newDeltas()
+        for cmd, rows, statements in self._groupQuads(quads, dispatch):
+            if deltas is None:
+                self.executeSQL(c, cmd, rows, paramList=True)
+            else:
+                self._insertCounted(c, cmd, rows, statements, deltas)
+        self._updateStatistics(c, deltas)
+        c.close()
+
+    def _groupQuads(self, quads, dispatch=True):
+        """
+        Normalizes the terms of the quads and groups the resulting rows by
+        insert command (i.e., by partition). Returns a list of (command,
+        rows, statements) tuples, the statements being the (predicate,
+        obj, context, quoted) of each row (see _countStatement), and
+        dispatches a TripleAddedEvent for each quad unless ``dispatch`` is
+        false.
+        """
+        commands = []
+        partitions = {}
         for subject, predicate, obj, context in quads:
-            if isinstance(context, QuotedGraph) or predicate != RDF.type:
+            quoted = isinstance(context, QuotedGraph)
+            if quoted or predicate != RDF.type:
                 # Quoted statement or non rdf:type predicate
                 # check if object is a literal
-                if isinstance(obj,Literal):
+                if isinstance(obj, Literal):
                     cmd, params = self.buildLiteralTripleSQLCommand(
                         subject, predicate, obj, context, self._internedId)
-                    literalTripleInsertCmd = literalTripleInsertCmd is not None and literalTripleInsertCmd or cmd
-                    literalTriples.append(params)
                 else:
                     cmd, params = self.buildTripleSQLCommand(
-                        subject, predicate, obj, context, self._internedId, isinstance(context, QuotedGraph))
-                    otherTripleInsertCmd = otherTripleInsertCmd is not None and otherTripleInsertCmd or cmd
-                    otherTriples.append(params)
-            elif predicate == RDF.type:
+                        subject, predicate, obj, context, self._internedId,
+                        quoted)
+            else:
                 #asserted rdf:type statement
                 cmd, params = self.buildTypeSQLCommand(
                     subject, obj, context, self._internedId)
-                typeTripleInsertCmd = typeTripleInsertCmd is not None and typeTripleInsertCmd or cmd
-                typeTriples.append(params)
+            group = partitions.get(cmd)
+            if group is None:
+                group = partitions[cmd] = ([], [])
+                commands.append(cmd)
+            group[0].append(params)
+            group[1].append((predicate, obj, context, quoted))
+            if dispatch:
+                self.dispatcher.dispatch(TripleAddedEvent(
+                    triple=(subject, predicate, obj), context=context))
+        return [(cmd,) + partitions[cmd] for cmd in commands]
+
+    def _insertCounted(self, cursor, cmd, rows, statements, deltas):
+        """
+        Inserts the rows one by one, counting in ``deltas`` the statements
+        of those actually inserted: those whose duplicates the
+        insertCommand skips (a rowcount of 0) are not
+        """
+        for params, statement in zip(rows, statements):
+            self.executeSQL(cursor, cmd, params)
+            if cursor.rowcount != 0:
+                self._countStatement(deltas, *statement)
 
-        if literalTriples:
-            self.executeSQL(
-                c, literalTripleInsertCmd, literalTriples, paramList=True)
-        if typeTriples:
-            self.executeSQL(
-                c, typeTripleInsertCmd, typeTriples, paramList=True)
-        if otherTriples:
-            self.executeSQL(
-                c, otherTripleInsertCmd, otherTriples, paramList=True)
+    # Bulk loading
+    def indexingStatements(self):
+        """
+        The statements (re)creating the indexes of the store's tables, run
+        at the end of a bulk load. None by default: backends which create
+        indexes list them here (those built on the FOPLRelationalModel can
+        return the indexingStatements of their partitions and hashes)
+        """
+        return []
+
+    def removeIndexingStatements(self):
+        """
+        The statements dropping the indexes listed by indexingStatements,
+        run at the beginning of a bulk load
+        """
+        return []
 
+    def loadRows(self, cursor, insertCmd, rows):
+        """
+        Inserts rows (lists of parameters for the single row ``insertCmd``)
+        by the fastest means available: a local file written with
+        writeDelimitedRows and loaded with ``loadDataCommand`` if set, or
+        else multi-row INSERTs of ``bulkInsertRows`` rows each. Backends
+        with a driver specific path (such as psycopg2's ``copy_from``)
+        can override this.
+        """
+        if self.loadDataCommand is not None:
+            table, columns, values = parseInsert(insertCmd)
+            fd, path = tempfile.mkstemp(suffix='.tsv')
+            try:
+                stream = os.fdopen(fd, 'wb')
+                try:
+                    writeDelimitedRows(rows, stream)
+                finally:
+                    stream.close()
+                cursor.execute(self.loadDataCommand % {
+                    'file': path, 'table': table, 'columns': columns})
+            finally:
+                os.remove(path)
+            return
+        size = self.bulkInsertRows
+        for start in xrange(0, len(rows), size):
+            chunk = rows[start:start + size]
+            params = []
+            for row in chunk:
+                params.extend(row)
+            self.executeSQL(
+                cursor, multiRowInsert(insertCmd, len(chunk)), params)
+
+    def _loadQuads(self, cursor, quads):
+        # with statistics, the rows are inserted one by one (loadRows could
+        # not tell which of them the insertCommand skipped)
+        deltas = self._newDeltas()
+        for cmd, rows, statements in self._groupQuads(quads):
+            if deltas is None:
+                self.loadRows(cursor, cmd, rows)
+            else:
+                self._insertCounted(cursor, cmd, rows, statements, deltas)
+        self._updateStatistics(cursor, deltas)
 
+    def bulkAdd(self, quads):
+        """
+        Adds the quads of an iterable of any length (which is read in
+        chunks of ``bulkChunkSize`` quads) using loadRows. Nothing is
+        committed.
+        """
+        c = self._db.cursor()
+        self._beginWrite(c)
+        chunk = []
+        for quad in quads:
+            chunk.append(quad)
+            if len(chunk) >= self.bulkChunkSize:
+                self._loadQuads(c, chunk)
+                chunk = []
+        if chunk:
+            self._loadQuads(c, chunk)
         c.close()
 
+    def load(self, source=None, publicID=None, format="xml",
+             location=None, file=None, data=None, context=None,
+             deferIndexes=True, **args):
+        """
+        Bulk loads an RDF document (see :meth:`rdflib.graph.Graph.parse`
+        for the arguments) into the ``context`` graph (an identifier, the
+        document's public ID by default) and commits. The statements are
+        streamed from the parser and added with bulkAdd, so the document is
+        never held in memory. With ``deferIndexes``, the indexes are
+        dropped before the load and rebuilt once all the statements are in.
+        Returns the number of statements loaded.
+        """
+        source = create_input_source(source=source, publicID=publicID,
+                                     location=location, file=file,
+                                     data=data, format=format)
+        if context is None:
+            context = URIRef(publicID or source.getPublicId())
+        c = self._db.cursor()
+        self._beginWrite(c)
+        if deferIndexes:
+            for statement in self.removeIndexingStatements():
+                c.execute(statement)
+        sink = BulkLoadSink(self, c)
+        try:
+            Graph(sink, identifier=context).parse(
+                source, publicID=publicID, format=format, **args)
+            sink.flush()
+        finally:
+            if deferIndexes:
+                for statement in self.indexingStatements():
+                    c.execute(statement)
+            c.close()
+        self.commit()
+        return sink.count
+
     def remove(self, (subject, predicate, obj), context):
         """ Remove a triple from the store """
+        self.flush()
         if context is not None:
-            if subject is None and predicate is None and object is None:
+            if subject is None and predicate is None and obj is None:
                 self._remove_context(context)
+                self.dispatcher.dispatch(TripleRemovedEvent(
+                    triple=(subject, predicate, obj), context=context))
                 return
         c = self._db.cursor()
-        if self.autocommit_default:
-            c.execute("""SET AUTOCOMMIT=0""")
+        self._beginWrite(c)
         quoted_table = "%s_quoted_statements" % self._internedId
         asserted_table = "%s_asserted_statements" % self._internedId
         asserted_type_table = "%s_type_statements" % self._internedId
         literal_table = "%s_literal_statements" % self._internedId
+        deltas = self._newDeltas()
         if not predicate or predicate != RDF.type:
             #Need to remove predicates other than rdf:type
 
@@ -588,13 +1167,12 @@ class AbstractSQLStore(Store, SQLGenerator):
                 #remove literal triple
                 clauseString,params = self.buildClause(
                     literal_table, subject, predicate, obj, context)
-                if clauseString:
-                    cmd ="DELETE FROM " + " ".join([literal_table, clauseString])
-                else:
-                    cmd ="DELETE FROM " + literal_table
-                self.executeSQL(c, self._normalizeSQLCmd(cmd), params)
+                self._delete(c, literal_table, ASSERTED_LITERAL_PARTITION,
+                             clauseString, params, deltas)
 
-            for table in [quoted_table, asserted_table]:
+            for table, partition in [
+                    (quoted_table, QUOTED_PARTITION),
+                    (asserted_table, ASSERTED_NON_TYPE_PARTITION)]:
                 # If asserted non rdf:type table and obj is Literal, don't do
                 # anything (already taken care of)
                 if table == asserted_table and isinstance(obj, Literal):
@@ -602,37 +1180,25 @@ class AbstractSQLStore(Store, SQLGenerator):
                 else:
                     clauseString, params = self.buildClause(
                         table, subject, predicate, obj, context)
-                    if clauseString:
-                        cmd="DELETE FROM " + " ".join([table, clauseString])
-                    else:
-                        cmd = "DELETE FROM " + table
-
-
-                    self.executeSQL(c,self._normalizeSQLCmd(cmd), params)
+                    self._delete(c, table, partition, clauseString, params,
+                                 deltas)
 
 
         if predicate == RDF.type or not predicate:
             # Need to check rdf:type and quoted partitions (in addition perhaps)
             clauseString,params = self.buildClause(
                 asserted_type_table, subject, RDF.type, obj, context, True)
-            if clauseString:
-                cmd="DELETE FROM " + " ".join([asserted_type_table, clauseString])
-            else:
-                cmd='DELETE FROM '+asserted_type_table
-
-
-            self.executeSQL(c, self._normalizeSQLCmd(cmd), params)
+            self._delete(c, asserted_type_table, ASSERTED_TYPE_PARTITION,
+                         clauseString, params, deltas)
 
             clauseString, params = self.buildClause(
                 quoted_table, subject, predicate, obj, context)
-            if clauseString:
-                cmd=clauseString and "DELETE FROM " + " ".join([quoted_table, clauseString])
-            else:
-                cmd = "DELETE FROM " + quoted_table
-
-
-            self.executeSQL(c, self._normalizeSQLCmd(cmd), params)
+            self._delete(c, quoted_table, QUOTED_PARTITION, clauseString,
+                         params, deltas)
+        self._updateStatistics(c, deltas)
         c.close()
+        self.dispatcher.dispatch(TripleRemovedEvent(
+            triple=(subject, predicate, obj), context=context))
 
     def triples(self, (subject, predicate, obj), context=None):
         """
@@ -649,14 +1215,38 @@ class AbstractSQLStore(Store, SQLGenerator):
 
         FIXME:  These union all selects *may* be further optimized by joins
 
+        """
+        self.flush()
+        template = None
+        if self.templateQueries:
+            key, slots = self._queryShape(subject, predicate, obj, context)
+            template = self._tripleQueries.get(key)
+        if template is None:
+            q, parameters, aliases = self._triplesQuery(
+                subject, predicate, obj, context)
+            if self.templateQueries:
+                self._tripleQueries[key] = q, aliases
+        else:
+            q, aliases = template
+            parameters = self._queryParameters(aliases, slots)
+        c = self.scanCursor()
+        if self.analyzeQueries:
+            self._analyzeQuery(q, parameters,
+                               patternShape(subject, predicate, obj, context))
+        self.executeSQL(c, q, parameters)
+        for triple, contexts in self._decodeRows(c, context):
+            yield triple, iter(contexts)
+        c.close()
+
+    def _triplesQuery(self, subject, predicate, obj, context):
+        """
+        The UNION query of triples for a pattern: the query, its parameters
+        and the aliases of the partitions it selects from (in order)
         """
         quoted_table = "%s_quoted_statements" % self._internedId
         asserted_table = "%s_asserted_statements" % self._internedId
         asserted_type_table = "%s_type_statements" % self._internedId
         literal_table = "%s_literal_statements" % self._internedId
-        c = self._db.cursor()
-
-
         parameters = []
 
         if predicate == RDF.type:
@@ -770,23 +1360,170 @@ class AbstractSQLStore(Store, SQLGenerator):
 
 
 
-        q = self._normalizeSQLCmd(unionSELECT(selects))
-        self.executeSQL(c, q, parameters)
-        rt = c.fetchone()
-        while rt:
-            s, p, o, (graphKlass, idKlass, graphId) = extractTriple(rt, self, context)
-            currentContext=graphKlass(self, idKlass(graphId))
-            contexts = [currentContext]
-            rt = next = c.fetchone()
-            sameTriple = next and extractTriple(next, self,context)[:3] == (s, p, o)
-            while sameTriple:
-                s2, p2, o2, (graphKlass, idKlass, graphId) = extractTriple(next, self, context)
-                c2 = graphKlass(self, idKlass(graphId))
-                contexts.append(c2)
-                rt = next = c.fetchone()
-                sameTriple = next and extractTriple(next,self,context)[:3] == (s, p, o)
-
-            yield (s, p, o), (c for c in contexts)
+        if context is None:
+            # The same triple may be found in several contexts, the database
+            # has to sort the rows so that they come together.
+            selectType = TRIPLE_SELECT
+        else:
+            # Otherwise the rows are streamed in whatever order they are
+            # produced
+            selectType = TRIPLE_SELECT_NO_ORDER
+        q = self._normalizeSQLCmd(unionSELECT(selects, selectType=selectType))
+        return q, parameters, [alias for table, alias, clause, partition
+                               in selects]
+
+    def _queryShape(self, subject, predicate, obj, context):
+        """
+        The shape of the query of triples for a pattern (the key of its
+        SQL text in the cache of ``templateQueries``) and the parameters of
+        its clauses slot by slot (see _queryParameters). The SQL text only
+        depends on which slots are bound to a term, a regular expression or
+        a list, on the kind of predicate and object and on the options of
+        the store: the terms themselves are all bound as parameters.
+        """
+        key = []
+        slots = []
+        if context is not None:
+            context = context.identifier
+        for term in [subject, predicate, obj, context]:
+            if isinstance(term, list):
+                params = [self.normalizeTerm(item) for item in term]
+                key.append(tuple([isinstance(item, REGEXTerm)
+                                  for item in term]))
+            elif isinstance(term, REGEXTerm):
+                params = [term]
+                key.append('~')
+            else:
+                # terms with an empty lexical form make no clause
+                term = self.normalizeTerm(term)
+                params = term and [term] or []
+                key.append(bool(params))
+            slots.append([param for param in params if param is not None])
+        datatypes = []
+        languages = []
+        if isinstance(obj, Literal):
+            if obj.datatype is not None:
+                datatypes.append(obj.datatype.encode('utf-8'))
+            if obj.language is not None:
+                languages.append(obj.language.encode('utf-8'))
+        slots.extend([datatypes, languages])
+        key.extend([
+            predicate == RDF.type,
+            isinstance(predicate, REGEXTerm) \
+                and bool(predicate.compiledExpr.match(RDF.type)),
+            isinstance(obj, Literal), not obj, bool(datatypes),
+            bool(languages), self.STRONGLY_TYPED_TERMS])
+        return tuple(key), slots
+
+    def _queryParameters(self, aliases, slots):
+        """
+        The parameters of the query of triples selecting from the
+        partitions of ``aliases``, given the parameters of each slot of the
+        pattern (see _queryShape), in the order buildClause binds them
+        """
+        subjects, predicates, objects, contexts, datatypes, languages = slots
+        parameters = []
+        for alias in aliases:
+            if alias == 'typeTable':
+                parameters.extend(subjects + objects + contexts)
+            else:
+                parameters.extend(subjects + predicates + objects + contexts +
+                                  datatypes + languages)
+        return parameters
+
+    def explainQuery(self, cursor, query, params=None):
+        """
+        The plan of ``query``: a list of (table, index, fullScan) triples,
+        one per table access (``table`` is the name or alias the database
+        reports, ``index`` None if no index is used and ``fullScan`` true
+        if the whole table or index is read). This default reads MySQL's
+        EXPLAIN rows: backends with other plan formats override it.
+        """
+        self.executeSQL(cursor, 'explain ' + query, params)
+        rows = cursor.fetchall()
+        names = [column[0].lower() for column in cursor.description or []]
+        if 'table' in names:
+            tableCol = names.index('table')
+            typeCol = names.index('type')
+            keyCol = names.index('key')
+        else:
+            # the 8 columns of the EXPLAIN rows of early MySQL versions
+            tableCol, typeCol, keyCol = 0, 1, 3
+        plan = []
+        for row in rows:
+            table = row[tableCol]
+            if table is None or table.startswith('<'):
+                # the temporary table of a UNION or a derived table
+                continue
+            plan.append((table, row[keyCol], row[typeCol] in ('ALL', 'index')))
+        return plan
+
+    def _analyzeQuery(self, query, params, shape):
+        c = self._readDb.cursor()
+        try:
+            queryAnalysis(query, self, c, params, shape)
+        finally:
+            c.close()
+
+    def _decodeBatch(self, rows):
+        """
+        The triple, context term type and context (None for the hardcoded
+        context) of each row of a batch of a TRIPLE_SELECT
+        """
+        termCombinations = REVERSE_TERM_COMBINATIONS
+        decoded = []
+        for row in rows:
+            if len(row) == 7:
+                subject, predicate, obj, rtContext, termComb, \
+                    objLanguage, objDatatype = row
+                subjTerm, predTerm, objTerm, ctxTerm = \
+                    termCombinations[termComb]
+            else:
+                subject, subjTerm, predicate, predTerm, obj, objTerm, \
+                    rtContext, ctxTerm, objDatatype, objLanguage = row
+            decoded.append(((createTerm(subject, subjTerm, self),
+                             createTerm(predicate, predTerm, self),
+                             createTerm(obj, objTerm, self,
+                                        objLanguage, objDatatype)),
+                            ctxTerm, rtContext))
+        return decoded
+
+    def _decodeRows(self, cursor, hardCodedContext=None, decodeBatch=None):
+        """
+        A generator over the triples in the (ordered) result set of a
+        TRIPLE_SELECT, each with the list of its contexts.
+
+        Rows are fetched in batches of ``fetchSize`` and each of them is
+        decoded once (by ``decodeBatch``, _decodeBatch by default); the
+        graphs wrapping the contexts are shared by all the rows in the same
+        context.
+        """
+        fetchSize = self.fetchSize
+        if decodeBatch is None:
+            decodeBatch = self._decodeBatch
+        graphs = {}
+        current = None
+        currentContexts = None
+        rows = cursor.fetchmany(fetchSize)
+        while rows:
+            for triple, ctxTerm, rtContext in decodeBatch(rows):
+                if rtContext is None:
+                    rtContext = hardCodedContext.identifier
+                graph = graphs.get((ctxTerm, rtContext))
+                if graph is None:
+                    graphKlass, idKlass = constructGraph(ctxTerm)
+                    graph = graphKlass(self, idKlass(rtContext))
+                    graphs[(ctxTerm, rtContext)] = graph
+                if triple == current:
+                    currentContexts.append(graph)
+                else:
+                    if current is not None:
+                        yield current, currentContexts
+                    current = triple
+                    currentContexts = [graph]
+            rows = cursor.fetchmany(fetchSize)
+        if current is not None:
+            yield current, currentContexts
 
     def triples_choices(self, (subject, predicate, object_),context=None):
         """
@@ -794,36 +1531,48 @@ class AbstractSQLStore(Store, SQLGenerator):
         term in any slot.  Stores can implement this to optimize the response time
         from the import default 'fallback' implementation, which will iterate
         over each term in the list and dispatch to tripless
+
+        The terms are matched with a single 'in (...)' query per partition
+        (for every ``choicesChunkSize`` terms). An empty list matches
+        nothing.
         """
         if isinstance(object_, list):
             assert not isinstance(subject, list), "object_ / subject are both lists"
             assert not isinstance(predicate, list), "object_ / predicate are both lists"
-            if not object_:
-                object_ = None
-            for (s1, p1, o1), cg in self.triples(
-                    (subject, predicate, object_), context):
-                yield (s1, p1, o1), cg
-
-
+            slot, choices = 2, object_
         elif isinstance(subject, list):
             assert not isinstance(predicate, list), "subject / predicate are both lists"
-            if not subject:
-                subject = None
-            for (s1, p1, o1), cg in self.triples(
-                    (subject, predicate, object_) ,context):
-                yield (s1, p1, o1), cg
-
-
+            slot, choices = 0, subject
         elif isinstance(predicate, list):
             assert not isinstance(subject, list), "predicate / subject are both lists"
-            if not predicate:
-                predicate = None
-            for (s1, p1, o1), cg in self.triples(
-                    (subject, predicate, object_) ,context):
-                yield (s1, p1, o1), cg
+            slot, choices = 1, predicate
+        else:
+            for triple, cg in self.triples(
+                    (subject, predicate, object_), context):
+                yield triple, cg
+            return
+
+        pattern = [subject, predicate, object_]
+        if slot == 1 and RDF.type in choices:
+            # rdf:type statements are kept in their own partition, which
+            # triples only searches for that predicate
+            choices = [term for term in choices if term != RDF.type]
+            for triple, cg in self.triples(
+                    (subject, RDF.type, object_), context):
+                yield triple, cg
+        chunkSize = self.choicesChunkSize
+        for start in xrange(0, len(choices), chunkSize):
+            chunk = choices[start:start + chunkSize]
+            pattern[slot] = chunk
+            # the lexical forms alone may match other terms (a literal with
+            # another datatype, a BNode instead of a URI, ...)
+            chunk = set(chunk)
+            for triple, cg in self.triples(tuple(pattern), context):
+                if triple[slot] in chunk:
+                    yield triple, cg
 
     def __repr__(self):
-        c = self._db.cursor()
+        c = self._readDb.cursor()
         quoted_table = "%s_quoted_statements" % self._internedId
         asserted_table = "%s_asserted_statements" % self._internedId
         asserted_type_table = "%s_type_statements" % self._internedId
@@ -866,9 +1615,163 @@ class AbstractSQLStore(Store, SQLGenerator):
         except Exception:
             return "<Partitioned MySQL N3 Store>"
 
+    # Statistics
+    def _newDeltas(self):
+        if self.statistics:
+            return {}
+        return None
+
+    def _countStatement(self, deltas, predicate, obj, context, quoted):
+        """
+        Counts a statement in the changes to apply to the statistics table,
+        a dictionary mapping (kind, term) keys to a difference
+        """
+        klass = None
+        if predicate == RDF.type and not quoted:
+            klass = self.normalizeTerm(obj)
+        # quoted statements with a literal object are kept in the literal
+        # partition, and counted as such
+        quoted = quoted and not isinstance(obj, Literal)
+        self._count(deltas, self.normalizeTerm(context.identifier),
+                    self.normalizeTerm(predicate), klass, quoted, 1)
+
+    def _count(self, deltas, context, predicate, klass, quoted, count):
+        key = (CONTEXT_STATISTIC, context)
+        deltas[key] = deltas.get(key, 0) + count
+        if quoted:
+            return
+        for key in [(TOTAL_STATISTIC, ''), (PREDICATE_STATISTIC, predicate)]:
+            deltas[key] = deltas.get(key, 0) + count
+        if klass is not None:
+            key = (CLASS_STATISTIC, klass)
+            deltas[key] = deltas.get(key, 0) + count
+
+    def _countRows(self, cursor, table, partition, clauseString, params,
+                   deltas, sign=1):
+        """
+        Counts (into ``deltas``) the rows of a partition matched by
+        ``clauseString``, grouped by context and predicate (or class)
+        """
+        if partition == ASSERTED_TYPE_PARTITION:
+            columns = 'context, klass'
+        elif partition == QUOTED_PARTITION:
+            columns = 'context'
+        else:
+            columns = 'context, predicate'
+        q = "SELECT %s, count(*) FROM %s %s GROUP BY %s" % (
+            columns, table, clauseString, columns)
+        self.executeSQL(cursor, self._normalizeSQLCmd(q), params)
+        if partition == ASSERTED_TYPE_PARTITION:
+            rdfType = self.normalizeTerm(RDF.type)
+            for context, klass, count in cursor.fetchall():
+                self._count(deltas, context, rdfType, klass, False,
+                            sign * int(count))
+        elif partition == QUOTED_PARTITION:
+            for context, count in cursor.fetchall():
+                self._count(deltas, context, None, None, True,
+                            sign * int(count))
+        else:
+            for context, predicate, count in cursor.fetchall():
+                self._count(deltas, context, predicate, None, False,
+                            sign * int(count))
+
+    def _delete(self, cursor, table, partition, clauseString, params,
+                deltas):
+        """
+        Deletes the rows of a partition matched by ``clauseString``, after
+        counting them if ``deltas`` is given
+        """
+        if clauseString:
+            cmd = "DELETE FROM " + " ".join([table, clauseString])
+        else:
+            cmd = "DELETE FROM " + table
+            clauseString = ''
+        if deltas is not None:
+            self._countRows(cursor, table, partition, clauseString, params,
+                            deltas, -1)
+        self.executeSQL(cursor, self._normalizeSQLCmd(cmd), params)
+
+    def _updateStatistics(self, cursor, deltas):
+        """
+        Applies the changes accumulated in ``deltas`` to the statistics
+        table
+        """
+        if not deltas:
+            return
+        table = STATISTICS_TABLE % self._internedId
+        update = "UPDATE %s SET total = total + %%s " % table + \
+                 "WHERE kind = %s AND term = %s"
+        insert = "INSERT INTO %s (kind, term, total) " % table + \
+                 "VALUES (%s, %s, %s)"
+        for (kind, term), delta in deltas.items():
+            if not delta:
+                continue
+            self.executeSQL(cursor, update, [delta, kind, term])
+            if cursor.rowcount == 0:
+                self.executeSQL(cursor, insert, [kind, term, delta])
+
+    def rebuildStatistics(self):
+        """
+        Recomputes the statistics table from the partitions (after it is
+        created, or if it got out of sync with them) and commits
+        """
+        self.flush()
+        c = self._db.cursor()
+        self._beginWrite(c)
+        deltas = {}
+        for table, partition in [
+                ("%s_quoted_statements", QUOTED_PARTITION),
+                ("%s_asserted_statements", ASSERTED_NON_TYPE_PARTITION),
+                ("%s_type_statements", ASSERTED_TYPE_PARTITION),
+                ("%s_literal_statements", ASSERTED_LITERAL_PARTITION)]:
+            self._countRows(c, table % self._internedId, partition, '', None,
+                            deltas)
+        table = STATISTICS_TABLE % self._internedId
+        self.executeSQL(c, "DELETE FROM %s" % table)
+        self.executeSQL(
+            c, "INSERT INTO %s (kind, term, total) " % table + \
+               "VALUES (%s, %s, %s)",
+            [[kind, term, total]
+             for (kind, term), total in deltas.items() if total],
+            paramList=True)
+        c.close()
+        self.commit()
+
+    def statementCount(self, context=None, predicate=None, klass=None):
+        """
+        The number of asserted statements with the given predicate, in
+        the extension of the given class, or in the given context (quoted
+        ones included), or in the whole store, from the statistics table
+        (for selectivity estimates). None if the store keeps no statistics.
+        """
+        if not self.statistics:
+            return None
+        self.flush()
+        if predicate is not None:
+            key = (PREDICATE_STATISTIC, self.normalizeTerm(predicate))
+        elif klass is not None:
+            key = (CLASS_STATISTIC, self.normalizeTerm(klass))
+        elif context is not None:
+            key = (CONTEXT_STATISTIC, self.normalizeTerm(context.identifier))
+        else:
+            key = (TOTAL_STATISTIC, '')
+        c = self._readDb.cursor()
+        self.executeSQL(
+            c, "SELECT total FROM %s " % (STATISTICS_TABLE % self._internedId) + \
+               "WHERE kind = %s AND term = %s",
+            list(key))
+        rt = c.fetchall()
+        c.close()
+        if rt:
+            return int(rt[0][0])
+        return 0
+
     def __len__(self, context=None):
         """ Number of statements in the store. """
-        c = self._db.cursor()
+        if self.statistics:
+            return self.statementCount(context)
+        self.flush()
+        c = self._readDb.cursor()
         quoted_table = "%s_quoted_statements" % self._internedId
         asserted_table = "%s_asserted_statements" % self._internedId
         asserted_type_table = "%s_type_statements" % self._internedId
@@ -929,7 +1832,7 @@ class AbstractSQLStore(Store, SQLGenerator):
                   ASSERTED_LITERAL_PARTITION
                 ),
             ]
-            q = unionSELECT(selects, distinct=True, selectType=COUNT_SELECT)
+            q = unionSELECT(selects, distinct=False, selectType=COUNT_SELECT)
         else:
             selects = [
                 (
@@ -959,7 +1862,8 @@ class AbstractSQLStore(Store, SQLGenerator):
         return reduce(lambda x,y: x + y,  [rtTuple[0] for rtTuple in rt])
 
     def contexts(self, triple=None):
-        c = self._db.cursor()
+        self.flush()
+        c = self._readDb.cursor()
         quoted_table = "%s_quoted_statements" % self._internedId
         asserted_table = "%s_asserted_statements" % self._internedId
         asserted_type_table = "%s_type_statements" % self._internedId
@@ -1107,30 +2011,126 @@ class AbstractSQLStore(Store, SQLGenerator):
 
         self.executeSQL(c, self._normalizeSQLCmd(q), parameters)
         rt=c.fetchall()
-        for context in [rtTuple[0] for rtTuple in rt]:
-            yield context
         c.close()
+        # a context comes with the term combination of each of its rows: the
+        # combinations tell the type of the context's identifier
+        seen = set()
+        for context, termComb in rt:
+            if context in seen:
+                continue
+            seen.add(context)
+            ctxTerm = REVERSE_TERM_COMBINATIONS[termComb][CONTEXT]
+            graphKlass, idKlass = constructGraph(ctxTerm)
+            yield idKlass(context)
+
+    def _contextTables(self):
+        """
+        The partitions of the store, as (table, partition, columns) triples
+        where columns lists the columns of the rows of the table but their
+        context and termComb
+        """
+        literalColumns = 'subject, predicate, object, objLanguage, objDatatype'
+        return [
+            ("%s_quoted_statements" % self._internedId, QUOTED_PARTITION,
+             literalColumns),
+            ("%s_asserted_statements" % self._internedId,
+             ASSERTED_NON_TYPE_PARTITION, 'subject, predicate, object'),
+            ("%s_type_statements" % self._internedId,
+             ASSERTED_TYPE_PARTITION, 'member, klass'),
+            ("%s_literal_statements" % self._internedId,
+             ASSERTED_LITERAL_PARTITION, literalColumns)]
+
+    def _contextClause(self, context, table):
+        clauseString, params = self.buildContextClause(context, table)
+        return 'WHERE ' + clauseString, [p for p in params if p]
 
     def _remove_context(self, identifier):
-        """ """
-        assert identifier
+        """
+        Removes the statements of the ``identifier`` graph by a DELETE per
+        partition
+        """
+        assert identifier is not None
         c = self._db.cursor()
-        if self.autocommit_default:
-            c.execute("""SET AUTOCOMMIT=0""")
-        quoted_table = "%s_quoted_statements" % self._internedId
-        asserted_table = "%s_asserted_statements" % self._internedId
-        asserted_type_table = "%s_type_statements" % self._internedId
-        literal_table = "%s_literal_statements" % self._internedId
-        for table in [quoted_table, asserted_table,
-                      asserted_type_table, literal_table]:
-            clauseString, params = self.buildContextClause(identifier, table)
-            self.executeSQL(
-                c,
-                self._normalizeSQLCmd("DELETE from %s WHERE %s" % (table, clauseString)),
-                [p for p in params if p]
-            )
+        self._beginWrite(c)
+        deltas = self._newDeltas()
+        for table, partition, columns in self._contextTables():
+            clauseString, params = self._contextClause(identifier, table)
+            self._delete(c, table, partition, clauseString, params, deltas)
+        self._updateStatistics(c, deltas)
         c.close()
 
+    def copyContext(self, source, target):
+        """
+        Adds the statements of the ``source`` graph to the ``target`` graph
+        by an INSERT ... SELECT per partition (the statements target already
+        has are skipped if the ``insertCommand`` ignores duplicates). Nothing
+        is committed. A TripleAddedEvent of the (None, None, None) triple is
+        dispatched for target.
+        """
+        if source.identifier == target.identifier:
+            raise ValueError("Cannot copy a context into itself")
+        self.flush()
+        c = self._db.cursor()
+        self._beginWrite(c)
+        deltas = self._newDeltas()
+        termComb = contextTermCombination(normalizeGraph(target)[-1])
+        for table, partition, columns in self._contextTables():
+            clauseString, params = self._contextClause(source, table)
+            targetClause, targetParams = self._contextClause(target, table)
+            if deltas is not None:
+                self._countRows(c, table, partition, targetClause,
+                                targetParams, deltas, -1)
+            self.executeSQL(c, self._normalizeSQLCmd(
+                "%s %s (%s, context, termComb) SELECT %s, %%s, %s FROM %s %s"
+                % (self.insertCommand, table, columns, columns, termComb,
+                   table, clauseString)),
+                [self.normalizeTerm(target)] + params)
+            if deltas is not None:
+                self._countRows(c, table, partition, targetClause,
+                                targetParams, deltas)
+        self._updateStatistics(c, deltas)
+        c.close()
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(None, None, None), context=target))
+
+    def replaceContext(self, context, staging):
+        """
+        Replaces the statements of the ``context`` graph by those of the
+        ``staging`` graph (which is left empty), by a DELETE and an UPDATE
+        per partition. Nothing is committed: a graph loaded into a staging
+        context is swapped in at once when the transaction is.
+        TripleRemovedEvents of the (None, None, None) triple are dispatched
+        for both graphs, then a TripleAddedEvent for context.
+        """
+        if context.identifier == staging.identifier:
+            raise ValueError("Cannot replace a context by itself")
+        self.flush()
+        c = self._db.cursor()
+        self._beginWrite(c)
+        deltas = self._newDeltas()
+        termComb = contextTermCombination(normalizeGraph(context)[-1])
+        for table, partition, columns in self._contextTables():
+            clauseString, params = self._contextClause(context, table)
+            stagingClause, stagingParams = self._contextClause(staging, table)
+            self._delete(c, table, partition, clauseString, params, deltas)
+            if deltas is not None:
+                self._countRows(c, table, partition, stagingClause,
+                                stagingParams, deltas, -1)
+            self.executeSQL(c, self._normalizeSQLCmd(
+                "UPDATE %s SET context = %%s, termComb = %s %s" % (
+                    table, termComb, stagingClause)),
+                [self.normalizeTerm(context)] + stagingParams)
+            if deltas is not None:
+                self._countRows(c, table, partition, clauseString, params,
+                                deltas)
+        self._updateStatistics(c, deltas)
+        c.close()
+        for graph in (context, staging):
+            self.dispatcher.dispatch(TripleRemovedEvent(
+                triple=(None, None, None), context=graph))
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(None, None, None), context=context))
+
     # Optional Namespace methods
     # Placeholder optimized interfaces (those needed in order to port Versa)
     def subjects(self, predicate=None, obj=None):
@@ -1188,11 +2188,10 @@ class AbstractSQLStore(Store, SQLGenerator):
         """ """
         c = self._db.cursor()
         try:
-            c.execute("INSERT INTO %s_namespace_binds (prefix,uri) VALUES ('%s', '%s')" % (
-                self._internedId,
-                prefix,
-                namespace)
-            )
+            self.executeSQL(c,
+                "INSERT INTO %s_namespace_binds (prefix,uri) VALUES (%%s, %%s)" % (
+                self._internedId),
+                [prefix, namespace])
         except:
             pass
         c.close()
@@ -1200,10 +2199,10 @@ class AbstractSQLStore(Store, SQLGenerator):
     def prefix(self, namespace):
         """ """
         c = self._db.cursor()
-        c.execute("SELECT prefix FROM %s_namespace_binds WHERE uri = '%s'"%(
-            self._internedId,
-            namespace)
-        )
+        self.executeSQL(c,
+            "SELECT prefix FROM %s_namespace_binds WHERE uri = %%s" % (
+            self._internedId),
+            [namespace])
         rt = [rtTuple[0] for rtTuple in c.fetchall()]
         c.close()
         return rt and rt[0] or None
@@ -1212,10 +2211,10 @@ class AbstractSQLStore(Store, SQLGenerator):
         """ """
         c = self._db.cursor()
         try:
-            c.execute("SELECT uri FROM %s_namespace_binds WHERE prefix = '%s'"%(
-                self._internedId,
-                prefix)
-                      )
+            self.executeSQL(c,
+                "SELECT uri FROM %s_namespace_binds WHERE prefix = %%s" % (
+                self._internedId),
+                [prefix])
         except:
             return None
         rt = [rtTuple[0] for rtTuple in c.fetchall()]
@@ -1237,12 +2236,72 @@ class AbstractSQLStore(Store, SQLGenerator):
     # Transactional interfaces
     def commit(self):
         """ """
+        self.flush()
         self._db.commit()
 
     def rollback(self):
         """ """
+        self._writeBuffer.quads = []
         self._db.rollback()
 
+
+class WriteBehindBuffer(object):
+    """
+    The statements added to a store but not written yet (see
+    AbstractSQLStore.writeBehindSize), as quads, and the time the oldest
+    was added
+    """
+
+    def __init__(self):
+        self.quads = []
+        self.since = None
+
+class BulkLoadSink(Store):
+    """
+    The store a parser adds statements to during a bulk load: they are
+    handed over to the SQL store in chunks of its ``bulkChunkSize``, with
+    their contexts as graphs of the SQL store. Namespace bindings go
+    straight to the SQL store.
+    """
+    context_aware = True
+    formula_aware = True
+
+    def __init__(self, store, cursor):
+        super(BulkLoadSink, self).__init__()
+        self.store = store
+        self.cursor = cursor
+        self.count = 0
+        self._pending = []
+        self._graphs = {}
+
+    def add(self, (subject, predicate, obj), context, quoted=False):
+        key = (context.__class__, context.identifier)
+        graph = self._graphs.get(key)
+        if graph is None:
+            graph = self._graphs[key] = context.__class__(
+                self.store, context.identifier)
+        self._pending.append((subject, predicate, obj, graph))
+        if len(self._pending) >= self.store.bulkChunkSize:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.store._loadQuads(self.cursor, self._pending)
+            self.count += len(self._pending)
+            self._pending = []
+
+    def bind(self, prefix, namespace):
+        self.store.bind(prefix, namespace)
+
+    def prefix(self, namespace):
+        return self.store.prefix(namespace)
+
+    def namespace(self, prefix):
+        return self.store.namespace(prefix)
+
+    def namespaces(self):
+        return self.store.namespaces()
+
 table_name_prefixes = [
     '%s_asserted_statements',
     '%s_type_statements',
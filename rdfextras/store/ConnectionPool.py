@@ -0,0 +1,238 @@
+"""
+A pool of DB-API connections for the SQL stores, so that a store can be
+shared by the threads of an application (a multi-threaded SPARQL service,
+for instance): each thread works with its own connection, taken from the
+pool the first time the thread uses the store and handed back with
+:meth:`ConnectionPool.releaseConnection` (typically at the end of each
+request).
+
+Idle connections are checked before they are reused (if they have been
+idle for more than ``checkInterval`` seconds), and replaced if the check
+fails. Read-only queries can be routed to replicas, each with a pool of
+its own.
+
+>>> import sqlite3
+>>> pool = ConnectionPool(lambda: sqlite3.connect(':memory:'), size=2)
+>>> connection = pool.connection()
+>>> connection is pool.connection()
+True
+>>> pool.releaseConnection()
+>>> pool.idle
+1
+>>> pool.connection() is connection
+True
+"""
+
+import threading
+import time
+
+__all__ = ['ConnectionPool', 'PoolError', 'checkConnection']
+
+
+class PoolError(Exception):
+    """
+    Raised when no connection becomes available within the timeout of a
+    pool, or when the pool is closed
+    """
+
+
+def checkConnection(connection):
+    """
+    The default health check: whether ``connection`` can still run a
+    trivial query
+    """
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class ConnectionPool(object):
+    """
+    Connections made by calling ``connect`` (with no arguments).
+
+    At most ``size`` idle connections are kept for reuse, and at most
+    ``maxConnections`` (if given) are open at once: :meth:`acquire` then
+    waits up to ``timeout`` seconds (forever if None) for one to be
+    released. ``healthCheck`` is called with each connection idle for more
+    than ``checkInterval`` seconds before it is reused, and the connection
+    is replaced if the check returns false. ``replicas`` is a list of
+    ``connect`` callables for read-only replicas of the database, used by
+    :meth:`readConnection`.
+    """
+
+    def __init__(self, connect, size=5, maxConnections=None, timeout=None,
+                 healthCheck=checkConnection, checkInterval=30,
+                 replicas=()):
+        self._connect = connect
+        self.size = size
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.healthCheck = healthCheck
+        self.checkInterval = checkInterval
+        self.replicas = [
+            ConnectionPool(replica, size, maxConnections, timeout,
+                           healthCheck, checkInterval)
+            for replica in replicas]
+        self.closed = False
+        # number of connections currently open (idle or in use)
+        self.opened = 0
+        # (connection, time it was released) pairs, most recent last
+        self._idle = []
+        self._available = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._nextReplica = 0
+
+    def _get_idle(self):
+        return len(self._idle)
+    idle = property(_get_idle, doc="number of idle connections")
+
+    def acquire(self):
+        """
+        Return a connection for the exclusive use of the caller, who must
+        :meth:`release` it
+        """
+        self._available.acquire()
+        try:
+            deadline = None
+            while True:
+                if self.closed:
+                    raise PoolError("The connection pool is closed")
+                if self._idle:
+                    connection, released = self._idle.pop()
+                    break
+                if self.maxConnections is None or \
+                        self.opened < self.maxConnections:
+                    connection = released = None
+                    self.opened += 1
+                    break
+                if self.timeout is None:
+                    self._available.wait()
+                    continue
+                now = time.time()
+                if deadline is None:
+                    deadline = now + self.timeout
+                elif now >= deadline:
+                    raise PoolError(
+                        "No connection available after %s seconds" %
+                        self.timeout)
+                self._available.wait(deadline - now)
+        finally:
+            self._available.release()
+        if connection is not None:
+            if self.healthCheck is None or \
+                    time.time() - released <= self.checkInterval or \
+                    self.healthCheck(connection):
+                return connection
+            self._discard(connection)
+            self._available.acquire()
+            self.opened += 1
+            self._available.release()
+        try:
+            return self._connect()
+        except:
+            self._closed(None)
+            raise
+
+    def release(self, connection, broken=False):
+        """
+        Hand back a connection obtained from :meth:`acquire`. It is closed
+        (rather than kept for reuse) if ``broken`` is set or if the pool
+        already has ``size`` idle connections.
+        """
+        self._available.acquire()
+        try:
+            if not broken and not self.closed and len(self._idle) < self.size:
+                self._idle.append((connection, time.time()))
+                self._available.notify()
+                return
+        finally:
+            self._available.release()
+        self._discard(connection)
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._closed(connection)
+
+    def _closed(self, connection):
+        self._available.acquire()
+        try:
+            self.opened -= 1
+            self._available.notify()
+        finally:
+            self._available.release()
+
+    def connection(self):
+        """
+        The connection of the calling thread (acquired on first use)
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self.acquire()
+        return connection
+
+    def readConnection(self):
+        """
+        The connection the calling thread should use for read-only queries:
+        a connection to one of the replicas (the threads are spread over
+        them), or its connection if there are none. Replicas lag behind the
+        writes, including those of the thread's pending transaction.
+        """
+        if not self.replicas:
+            return self.connection()
+        replica = getattr(self._local, 'replica', None)
+        if replica is None:
+            self._available.acquire()
+            try:
+                replica = self.replicas[self._nextReplica]
+                self._nextReplica = \
+                    (self._nextReplica + 1) % len(self.replicas)
+            finally:
+                self._available.release()
+            self._local.replica = replica
+        return replica.connection()
+
+    def releaseConnection(self, broken=False):
+        """
+        Hand back the connections of the calling thread (the next call to
+        :meth:`connection` acquires one again). Pending transactions should
+        be committed or rolled back first.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            del self._local.connection
+            self.release(connection, broken)
+        replica = getattr(self._local, 'replica', None)
+        if replica is not None:
+            del self._local.replica
+            replica.releaseConnection(broken)
+
+    def close(self):
+        """
+        Close the idle connections and refuse to hand out new ones (the
+        connections in use are closed as they are released)
+        """
+        self._available.acquire()
+        try:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._available.notifyAll()
+        finally:
+            self._available.release()
+        for connection, released in idle:
+            self._discard(connection)
+        for replica in self.replicas:
+            replica.close()
+
+    def __repr__(self):
+        return "<ConnectionPool: %s open, %s idle, %s replicas>" % (
+            self.opened, len(self._idle), len(self.replicas))
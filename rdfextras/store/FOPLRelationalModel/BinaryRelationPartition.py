@@ -14,6 +14,10 @@ particular resource using cascade on delete (currently not used)
 
 see: http://dev.mysql.com/doc/refman/5.0/en/ansi-diff-foreign-keys.html
 """
+import heapq
+import sys
+import threading
+import Queue
 from rdflib.graph import Graph
 from rdflib.term import BNode
 from rdflib.term import Literal
@@ -78,12 +82,27 @@ class BinaryRelationPartition(Table):
     """
     assertedColumnName = 'asserted'
     indexSuffix = 'Index'
+    # Whether the members of a UNION are wrapped in parentheses (see
+    # PatternResolutionQuery), and how the nullable columns of the unique
+    # index over the quads are indexed (SQL has NULLs distinct in unique
+    # indexes, so a dialect may index an expression instead, such as
+    # 'coalesce(%s, 0)')
+    unionParentheses = True
+    nullableKeyColumnSQL = '%s'
+    # Number of rows whose presence in the partition is checked by each
+    # query of flushInsertions
+    existenceCheckRows = 100
     literalTable = False
     objectPropertyTable = False
+    # The predicate the partition is dedicated to (see VerticalPartitions),
+    # None if it holds the statements of all the predicates which have no
+    # partition of their own
+    predicate = None
     def __init__(
                  self, identifier, idHash, valueHash, store,
                  useSignedInts=False, hashFieldType='BIGINT unsigned',
-                 engine='ENGINE=InnoDB', declareEnums=False):
+                 engine='ENGINE=InnoDB', declareEnums=False,
+                 predicate=None):
         self.store = store
         self.identifier = identifier
         self.idHash    = idHash
@@ -93,6 +112,11 @@ class BinaryRelationPartition(Table):
         self.declareEnums = declareEnums
         self._engine = engine
         self._repr = self.identifier+'_'+self.nameSuffix
+        if predicate is not None:
+            self.predicate = predicate
+            # named after (the lower bits of) the hash of the predicate
+            self._repr += '_%08x' % (
+                normalizeValue(predicate, 'U') & 0xffffffffL)
         self.singularInsertionSQLCmd = self.insertRelationsSQLCMD()
         self._resetPendingInsertions()
         self._intersectionSQL = self.generateHashIntersections()
@@ -101,6 +125,8 @@ class BinaryRelationPartition(Table):
                      'NULL as ' + SlotPrefixes[LANGUAGE_INDEX]]
         self._selectFieldsNonLeading = self._selectFields(False) + \
                     ['NULL','NULL']
+        self._idFieldsLeading    = self._selectIdFields(True)
+        self._idFieldsNonLeading = self._selectIdFields(False)
         
         self._cacheStatements()
         
@@ -129,11 +155,17 @@ class BinaryRelationPartition(Table):
                   (self, self,
                    self.columnNames[slot])))
     
-    def indexingStatements(self):
-        return [pair[0] for pair in self._indexing]
+    def indexingStatements(self, unique=True):
+        rt = [pair[0] for pair in self._indexing]
+        if unique:
+            rt.append(self._uniqueIndexing[0])
+        return rt
     
-    def removeIndexingStatements(self):
-        return [pair[1] for pair in self._indexing]
+    def removeIndexingStatements(self, unique=True):
+        rt = [pair[1] for pair in self._indexing]
+        if unique:
+            rt.append(self._uniqueIndexing[1])
+        return rt
     
     def foreignKeyStatements(self):
         return [pair[0] for pair in self._foreign]
@@ -168,9 +200,9 @@ class BinaryRelationPartition(Table):
                        (self.get_name(), self.columnNames[slot],
                         self.indexSuffix, self.get_name(),
                         self.columnNames[slot]),
-                     "DROP INDEX %s_%s%s ON %s" %
+                     self._dropIndexSQL("%s_%s%s" %
                        (self.get_name(), self.columnNames[slot],
-                        self.indexSuffix, self.get_name())))
+                        self.indexSuffix))))
                 
                 if self.termEnumerations[slot]:
                     self._indexing.append(
@@ -178,9 +210,9 @@ class BinaryRelationPartition(Table):
                            (self.get_name(), self.columnNames[slot],
                             self.indexSuffix, self.get_name(),
                             self.columnNames[slot]),
-                         "DROP INDEX %s_%s_term%s ON %s" %
+                         self._dropIndexSQL("%s_%s_term%s" %
                            (self.get_name(), self.columnNames[slot],
-                            self.indexSuffix, self.get_name())))
+                            self.indexSuffix))))
                 
                 self.foreignKeySQL(slot)
         
@@ -193,27 +225,32 @@ class BinaryRelationPartition(Table):
                         ("CREATE INDEX %s_%s%s ON %s (%s)" %
                            (self.get_name(), colName, self.indexSuffix,
                             self.get_name(), indexStr % colName),
-                         "DROP INDEX %s_%s%s ON %s" %
-                           (self.get_name(), colName, self.indexSuffix,
-                            self.get_name())))
+                         self._dropIndexSQL("%s_%s%s" %
+                           (self.get_name(), colName, self.indexSuffix))))
                 else:
                     self._indexing.append(
                         ("CREATE INDEX %s_%s%s ON %s (%s)" %
                            (self.get_name(), colMD, self.indexSuffix,
                             self.get_name(), colMD),
-                         "DROP INDEX %s_%s%s ON %s" %
-                           (self.get_name(), colMD, self.indexSuffix,
-                            self.get_name())))
+                         self._dropIndexSQL("%s_%s%s" %
+                           (self.get_name(), colMD, self.indexSuffix))))
                     self.foreignKeySQL(otherSlot)
         
-        self._indexing.append(
-          ('CREATE UNIQUE INDEX %s_posc%s ON %s (%s)' %
+        keyColumns = self.order_column_names(
+                (PREDICATE, OBJECT, SUBJECT, CONTEXT))
+        keyColumns.extend([self.nullableKeyColumnSQL % colName
+                           for colName in self.order_column_names(
+                                (DATATYPE_INDEX, LANGUAGE_INDEX))])
+        self._uniqueIndexing = (
+           'CREATE UNIQUE INDEX %s_posc%s ON %s (%s)' %
              (self.get_name(), self.indexSuffix, self.get_name(),
-              ', '.join(self.order_column_names(
-                (PREDICATE, OBJECT, SUBJECT, CONTEXT, DATATYPE_INDEX,
-                 LANGUAGE_INDEX)))),
-           'DROP INDEX %s_posc%s ON %s' %
-             (self.get_name(), self.indexSuffix, self.get_name())))
+              ', '.join(keyColumns)),
+           self._dropIndexSQL('%s_posc%s' %
+             (self.get_name(), self.indexSuffix)))
+    
+    def _dropIndexSQL(self, indexName):
+        return self.dropIndexSQL % {'index': indexName,
+                                    'table': self.get_name()}
     
     def createStatements(self):
         """
@@ -267,29 +304,31 @@ class BinaryRelationPartition(Table):
         """
         self.pendingInsertions = []
     
-    def insertRelationsSQLCMD(self):
+    def insertColumns(self):
         """
-        Generates a SQL command with parameter references (%s) in order to
-        facilitate efficient batch insertion of multiple assertions by Python
-        DB implementations (such as MySQLdb)
+        The names of the columns given by compileQuadToParams (in order)
         """
-        vals = 0
         insertColNames = []
         for colName in self.columnNames:
             colIdx = self.columnNames.index(colName)
             if colName:
                 insertColNames.append(colName)
-                vals += 1
             if colIdx < len(self.termEnumerations) \
                         and self.termEnumerations[colIdx]:
                 insertColNames.append(colName+'_term')
-                vals += 1
-        insertColsExpr = "(%s)" % \
-                (','.join([isinstance(i,tuple) and i[0] or i 
-                        for i in insertColNames]))
-        return "INSERT INTO %s %s VALUES " % \
-                (self,insertColsExpr)+"(%s)" % \
-                    (','.join(['%s' for i in range(vals)]))
+        return [isinstance(i,tuple) and i[0] or i for i in insertColNames]
+    
+    def insertRelationsSQLCMD(self):
+        """
+        Generates a SQL command with parameter references (%s) in order to
+        facilitate efficient batch insertion of multiple assertions by Python
+        DB implementations (such as MySQLdb)
+        """
+        insertColNames = self.insertColumns()
+        insertColsExpr = "(%s)" % (','.join(insertColNames))
+        return "%s %s %s VALUES " % \
+                (self.insertCommand,self,insertColsExpr)+"(%s)" % \
+                    (','.join(['%s' for i in insertColNames]))
     
     def insertRelations(self,quadSlots):
         """
@@ -304,15 +343,202 @@ class BinaryRelationPartition(Table):
     def flushInsertions(self,db):
         """
         Adds the pending identifiers / values and assertions (using 
-        executemany for maximum efficiency), and resets the queue.
+        executemany for maximum efficiency), and resets the queue. Only the
+        assertions not in the partition yet are inserted (and add to the
+        reference counts of their terms).
         """
         self.idHash.insertIdentifiers(db)
         self.valueHash.insertIdentifiers(db)
         cursor = db.cursor()
-        cursor.executemany(self.singularInsertionSQLCmd,self.pendingInsertions)
+        columns = self.insertColumns()
+        rows = self._newRows(cursor, columns, self.pendingInsertions)
+        if rows:
+            cursor.executemany(self.singularInsertionSQLCmd, rows)
+            self.updateReferences(cursor, columns, rows, 1)
         cursor.close()
         self._resetPendingInsertions()
     
+    def _newRows(self, cursor, columns, rows, nullColumns=()):
+        """
+        The distinct rows among ``rows`` (values of ``columns``, the columns
+        in ``nullColumns`` being NULL) which are not in the partition yet,
+        checked ``existenceCheckRows`` at a time
+        """
+        unique = []
+        seen = set()
+        for row in rows:
+            if row not in seen:
+                seen.add(row)
+                unique.append(row)
+        condition = '(%s)' % ' AND '.join(
+            ['%s = %%s' % column for column in columns] +
+            ['%s IS NULL' % column for column in nullColumns])
+        existing = set()
+        for start in range(0, len(unique), self.existenceCheckRows):
+            chunk = unique[start:start + self.existenceCheckRows]
+            params = []
+            for row in chunk:
+                params.extend(row)
+            cursor.execute("SELECT %s FROM %s WHERE %s" % (
+                ', '.join(columns), self,
+                ' OR '.join([condition] * len(chunk))), params)
+            existing.update([tuple(row) for row in cursor.fetchall()])
+        return [row for row in unique if row not in existing]
+    
+    def referenceColumns(self):
+        """
+        The columns of the partition referring to the rows of the hashes, as
+        (column name, hash) pairs
+        """
+        rt = []
+        for slot in POSITION_LIST:
+            if self.columnNames[slot]:
+                if self.literalTable and slot == OBJECT:
+                    rt.append((self.columnNames[slot], self.valueHash))
+                else:
+                    rt.append((self.columnNames[slot], self.idHash))
+        if self.literalTable:
+            rt.append((self.columnNames[DATATYPE_INDEX][0], self.idHash))
+        return rt
+    
+    def updateReferences(self, cursor, columns, rows, delta):
+        """
+        Adds ``delta`` to the reference counts of the hashed terms each of
+        ``rows`` (values of ``columns``) refers to, purging the terms left
+        unreferenced. This is how the hashes are garbage collected, in
+        proportion to the number of assertions added or removed.
+        """
+        counts = {}
+        for column, hash in self.referenceColumns():
+            if column not in columns:
+                continue
+            idx = columns.index(column)
+            hashCounts = counts.setdefault(hash, {})
+            for row in rows:
+                key = row[idx]
+                if key is not None:
+                    hashCounts[key] = hashCounts.get(key, 0) + delta
+        for hash, hashCounts in counts.items():
+            hash.updateReferences(cursor, hashCounts)
+    
+    def rowColumns(self):
+        """
+        All the columns of the rows of the partition
+        """
+        return self.insertColumns()
+    
+    def _contextValues(self, context):
+        # the values of the context columns of the assertions of the
+        # ``context`` graph, as (column, value) pairs
+        values = [(self.columnNames[CONTEXT], normalizeValue(
+            context, term2Letter(context), self.useSignedInts))]
+        if self.termEnumerations[CONTEXT]:
+            values.append((self.columnNames[CONTEXT] + '_term',
+                           term2Letter(context)))
+        return values
+    
+    def referenceCounts(self, cursor, whereClause, params):
+        """
+        The number of references to each hashed term from the assertions
+        matched by ``whereClause`` (with its ``params``), as counted by the
+        database: a dictionary of counts by id, for each hash
+        """
+        counts = {}
+        for column, hash in self.referenceColumns():
+            cursor.execute(
+                "SELECT %s.%s, count(*) FROM %s WHERE %s GROUP BY %s.%s" % (
+                    self, column, self, whereClause, self, column), params)
+            hashCounts = counts.setdefault(hash, {})
+            for key, count in cursor.fetchall():
+                if key is not None:
+                    hashCounts[key] = hashCounts.get(key, 0) + int(count)
+        return counts
+    
+    def deleteContext(self, cursor, context):
+        """
+        Deletes the assertions of the ``context`` graph by a single DELETE,
+        releasing their references to the hashes
+        """
+        whereClause, params = self.generateWhereClause(
+            (None, None, None, context))
+        counts = self.referenceCounts(cursor, whereClause, params)
+        cursor.execute("DELETE FROM %s WHERE %s" % (self, whereClause),
+                       params)
+        for hash, hashCounts in counts.items():
+            hash.updateReferences(cursor, dict(
+                [(key, -count) for key, count in hashCounts.items()]))
+    
+    def copyContext(self, cursor, source, target):
+        """
+        Copies the assertions of the ``source`` graph into the ``target``
+        graph (whose identifier must be in the identifier hash) by a single
+        INSERT ... SELECT, skipping those target already has, and adds the
+        references of the copies to the hashes
+        """
+        whereClause, params = self.generateWhereClause(
+            (None, None, None, source))
+        targetClause, targetParams = self.generateWhereClause(
+            (None, None, None, target))
+        contextValues = dict(self._contextValues(target))
+        columns = self.rowColumns()
+        selected = []
+        selectParams = []
+        for column in columns:
+            if column in contextValues:
+                selected.append('%s')
+                selectParams.append(contextValues[column])
+            else:
+                selected.append('%s.%s' % (self, column))
+        if not self.insertIgnoresDuplicates:
+            # the columns past the quad (datatype and language) are NULL
+            # for some assertions
+            nullable = [column[0] for column in
+                        self.columnNames[len(POSITION_LIST):]]
+            conditions = []
+            for column in columns:
+                if column in contextValues:
+                    conditions.append('copied.%s = %%s' % column)
+                    params.append(contextValues[column])
+                elif column in nullable:
+                    conditions.append(
+                        '(copied.%s = %s.%s OR copied.%s IS NULL AND '
+                        '%s.%s IS NULL)' % (column, self, column, column,
+                                            self, column))
+                else:
+                    conditions.append('copied.%s = %s.%s' % (
+                        column, self, column))
+            whereClause += ' AND NOT EXISTS (SELECT 1 FROM %s copied ' \
+                           'WHERE %s)' % (self, ' AND '.join(conditions))
+        before = self.referenceCounts(cursor, targetClause, targetParams)
+        cursor.execute("%s %s (%s) SELECT %s FROM %s WHERE %s" % (
+            self.insertCommand, self, ', '.join(columns),
+            ', '.join(selected), self, whereClause), selectParams + params)
+        after = self.referenceCounts(cursor, targetClause, targetParams)
+        for hash, hashCounts in after.items():
+            previous = before.get(hash, {})
+            hash.updateReferences(cursor, dict(
+                [(key, count - previous.get(key, 0))
+                 for key, count in hashCounts.items()]))
+    
+    def renameContext(self, cursor, source, target):
+        """
+        Moves the assertions of the ``source`` graph into the ``target``
+        graph (which must have none in the partition, and whose identifier
+        must be in the identifier hash) by a single UPDATE, moving their
+        references to the context identifiers along
+        """
+        whereClause, params = self.generateWhereClause(
+            (None, None, None, source))
+        values = self._contextValues(target)
+        cursor.execute("UPDATE %s SET %s WHERE %s" % (
+            self, ', '.join(['%s = %%s' % column for column, value in values]),
+            whereClause), [value for column, value in values] + params)
+        moved = cursor.rowcount
+        if moved > 0:
+            sourceId = self._contextValues(source)[0][1]
+            self.idHash.updateReferences(
+                cursor, {values[0][1]: moved, sourceId: -moved})
+    
     def viewUnionSelectExpression(self,relations_only=False):
         """
         Return a SQL statement which creates a view of all the RDF statements
@@ -395,12 +621,12 @@ class BinaryRelationPartition(Table):
         idHashTermTypeCol = self.idHash.columns[-2][0]
         for idx in range(len(POSITION_LIST)):
             termNameAlias = first and ' as %s'%SlotPrefixes[idx] or ''
+            termTypeAlias = first \
+                    and ' as %sTermType'%SlotPrefixes[idx] \
+                    or ''
             if idx < len(self.columnNames) and self.columnNames[idx]:
                 rt.append('rt_' + SlotPrefixes[idx] + '.' + \
                                 idHashLexicalCol + termNameAlias)
-                termTypeAlias = first \
-                        and ' as %sTermType'%SlotPrefixes[idx] \
-                        or ''
                 if self.termEnumerations[idx]:
                     rt.append('rt_' + SlotPrefixes[idx]+ '.' + \
                               idHashTermTypeCol + termTypeAlias)
@@ -426,6 +652,47 @@ class BinaryRelationPartition(Table):
             and self._selectFieldsLeading \
             or self._selectFieldsNonLeading
     
+    def _selectIdFields(self,first):
+        rt = []
+        for idx in range(len(POSITION_LIST)):
+            termNameAlias = first and ' as %s'%SlotPrefixes[idx] or ''
+            termTypeAlias = first \
+                    and ' as %sTermType'%SlotPrefixes[idx] \
+                    or ''
+            if idx < len(self.columnNames) and self.columnNames[idx]:
+                rt.append('%s.%s' % (self,self.columnNames[idx]) + \
+                                termNameAlias)
+                if self.termEnumerations[idx]:
+                    rt.append('%s.%s_term' % (self,self.columnNames[idx]) + \
+                                termTypeAlias)
+                else:
+                    rt.append("'%s'" % \
+                        self.hardCodedResultTermsTypes[idx]+termTypeAlias)
+            else:
+                rt.append(str(normalizeValue(self.hardCodedResultFields[idx],
+                                             'U', self.useSignedInts)) + \
+                          termNameAlias)
+                rt.append("'%s'" % \
+                    self.hardCodedResultTermsTypes[idx]+termTypeAlias)
+        for idx in (DATATYPE_INDEX, LANGUAGE_INDEX):
+            alias = first and ' as %s'%SlotPrefixes[idx] or ''
+            if len(self.columnNames) > len(POSITION_LIST):
+                rt.append('%s.%s' % (self,self.columnNames[idx][0]) + alias)
+            else:
+                rt.append('NULL' + alias)
+        return rt
+    
+    def selectIdFields(self,first=False):
+        """
+        Returns a list of column aliases for the SELECT SQL command used to
+        fetch quads from a partition as the ids of their terms (the
+        datatype included) rather than their lexical forms, so that the
+        partition need not be joined with the hashes
+        """
+        return first \
+            and self._idFieldsLeading \
+            or self._idFieldsNonLeading
+    
     def generateHashIntersections(self):
         """
         Generates the SQL JOINS (INNER and LEFT) used to intersect the
@@ -637,13 +904,14 @@ class NamedLiteralProperties(BinaryRelationPartition):
     def __init__(
                  self, identifier, idHash, valueHash, store,
                  useSignedInts=False, hashFieldType='BIGINT unsigned',
-                 engine='ENGINE=InnoDB', declareEnums=False):
+                 engine='ENGINE=InnoDB', declareEnums=False,
+                 predicate=None):
         self.columnNames = ['subject', 'predicate', 'object', CONTEXT_COLUMN,
                             ('data_type', hashFieldType, '%s'),
                             ('language', 'varchar(3)', '%s')]
         super(NamedLiteralProperties, self).__init__(
           identifier, idHash, valueHash, store, useSignedInts,
-          hashFieldType, engine, declareEnums)
+          hashFieldType, engine, declareEnums, predicate)
         self.insertSQLCmds = {
            (False,False): self.insertRelationsSQLCMD(),
            (False,True) : self.insertRelationsSQLCMD(language=True),
@@ -660,7 +928,7 @@ class NamedLiteralProperties(BinaryRelationPartition):
             str(self)+'.'+self.columnNames[LANGUAGE_INDEX][0]+' as %s' % \
                                                 SlotPrefixes[LANGUAGE_INDEX],
           ]
-        self._selectFields        = self._selectFields(False) + \
+        self._selectFieldsNonLeading = self._selectFields(False) + \
           [
             'rt_%s.%s'%(self.columnNames[DATATYPE_INDEX][0],idHashLexicalCol),
             str(self)+'.'+self.columnNames[LANGUAGE_INDEX][0],
@@ -674,8 +942,7 @@ class NamedLiteralProperties(BinaryRelationPartition):
            (True,True)  : [],
         }
     
-    def insertRelationsSQLCMD(self,dataType=None,language=None):
-        vals = 0
+    def insertColumns(self,dataType=None,language=None):
         insertColNames = []
         for colName in self.columnNames:
             colIdx = self.columnNames.index(colName)
@@ -687,19 +954,22 @@ class NamedLiteralProperties(BinaryRelationPartition):
                             (self.columnNames[LANGUAGE_INDEX][0],language)]:
                         if colName == argColName and arg:
                             insertColNames.append(colName)
-                            vals += 1
                 else:
                     insertColNames.append(colName)
-                    vals += 1
             if colIdx < len(self.termEnumerations) \
                                 and self.termEnumerations[colIdx]:
                 insertColNames.append(colName+'_term')
-                vals += 1
-        
+        return insertColNames
+    
+    def rowColumns(self):
+        return self.insertColumns(True, True)
+    
+    def insertRelationsSQLCMD(self,dataType=None,language=None):
+        insertColNames = self.insertColumns(dataType,language)
         insertColsExpr = "(%s)"%(','.join([i for i in insertColNames]))
-        return "INSERT INTO %s %s VALUES " % \
-                (self,insertColsExpr)+"(%s)" % \
-                        (','.join(['%s' for i in range(vals)]))
+        return "%s %s %s VALUES " % \
+                (self.insertCommand,self,insertColsExpr)+"(%s)" % \
+                        (','.join(['%s' for i in insertColNames]))
     
     def insertRelations(self,quadSlots):
         for quadSlot in quadSlots:
@@ -715,7 +985,16 @@ class NamedLiteralProperties(BinaryRelationPartition):
         cursor = db.cursor()
         for key,paramList in self.pendingInsertions.items():
             if paramList:
-                cursor.executemany(self.insertSQLCmds[key],paramList)
+                dataType, language = key
+                columns = self.insertColumns(dataType,language)
+                nullColumns = [self.columnNames[idx][0]
+                               for idx, present in [(DATATYPE_INDEX, dataType),
+                                                    (LANGUAGE_INDEX, language)]
+                               if not present]
+                rows = self._newRows(cursor, columns, paramList, nullColumns)
+                if rows:
+                    cursor.executemany(self.insertSQLCmds[key],rows)
+                    self.updateReferences(cursor, columns, rows, 1)
         cursor.close()
         self._resetPendingInsertions()
     
@@ -871,9 +1150,20 @@ def BinaryRelationPartitionCoverage((subject,predicate,object_,context),BRPs):
     the literal properties only (for more efficient REGEX evaluation of
     literal values). Given the nature of the REGEX function in SPARQL and the
     way Versa matches by REGEX, this seperation couldn't be done
+    
+    Among the partitions dedicated to a predicate (see VerticalPartitions),
+    only those of the ground predicates of the pattern are searched, and
+    the partitions of the other predicates only if some of the ground
+    predicates have no partition of their own
     """
     if isinstance(predicate,list) and len(predicate) == 1:
         predicate = predicate[0]
+    predicates = None
+    if isinstance(predicate,(URIRef,BNode)):
+        predicates = [predicate]
+    elif isinstance(predicate,list) and predicate and \
+            not [p for p in predicate if not isinstance(p,(URIRef,BNode))]:
+        predicates = predicate
     if isinstance(predicate,REGEXTerm):
         pId = predicate.compiledExpr.match(RDF.type) and 'RT' or 'U_RNT'
     elif isinstance(predicate,(URIRef,BNode)):
@@ -940,21 +1230,54 @@ def BinaryRelationPartitionCoverage((subject,predicate,object_,context),BRPs):
     
     targetBRPs = [brp for brp in BRPs 
                         if isinstance(brp,BRPQueryDecisionMap[pId+oId])]
+    dedicated = [brp.predicate for brp in targetBRPs
+                 if brp.predicate is not None]
+    if dedicated and predicates is not None:
+        shared = [p for p in predicates if p not in dedicated]
+        targetBRPs = [brp for brp in targetBRPs
+                      if brp.predicate in predicates
+                      or brp.predicate is None and shared]
     return targetBRPs
 
-def PatternResolution(
-                      quad, cursor, BRPs, orderByTriple=True, fetchall=True,
-                      fetchContexts=False, select_modifier=''):
+def VerticalPartitions(identifier, idHash, valueHash, store, predicates,
+                       *args, **kwargs):
     """
-    This function implements query pattern resolution against a list of
-    partition objects and 3 parameters specifying whether to sort the result
-    set (in order to group identical triples by the contexts in which they
-    appear), whether to fetch the entire result set or one at a time, and
-    whether to fetch the matching contexts only or the assertions.  This
-    function uses BinaryRelationPartitionCoverage to whittle out the
-    partitions that don't need to be searched, generateHashIntersections /
-    generateWhereClause to generate the SQL query and the parameter fill-ins
-    and creates a single UNION query against the relevant partitions.
+    The partitions dedicated to each of the given (hot) predicates, keyed
+    by predicate: a (NamedLiteralProperties, NamedBinaryRelations) pair of
+    the store's classes for each, so that a pattern on one of them (see
+    BinaryRelationPartitionCoverage) reads tables and indexes holding its
+    statements only. The other statements stay in the shared partitions.
+    The other arguments are those of the partitions.
+    
+    rdf:type has the AssociativeBox, and cannot have partitions of its own.
+    """
+    literalClass = kwargs.pop('literalClass', NamedLiteralProperties)
+    relationsClass = kwargs.pop('relationsClass', NamedBinaryRelations)
+    rt = {}
+    for predicate in predicates:
+        if predicate == RDF.type:
+            raise ValueError("rdf:type cannot have partitions of its own")
+        kwargs['predicate'] = predicate
+        rt[predicate] = (
+            literalClass(identifier, idHash, valueHash, store,
+                         *args, **kwargs),
+            relationsClass(identifier, idHash, valueHash, store,
+                           *args, **kwargs))
+    return rt
+
+def PatternResolutionQuery(
+                      quad, BRPs, orderByTriple=True, fetchContexts=False,
+                      select_modifier='', idsOnly=False):
+    """
+    Builds the query resolving a quad pattern against a list of partition
+    objects, as run by PatternResolution, and returns it with its parameter
+    fill-ins. The query is a single UNION query against the partitions
+    BinaryRelationPartitionCoverage finds relevant, made of the
+    generateHashIntersections / generateWhereClause of each of them.
+    
+    If idsOnly is set, the rows hold the ids of the terms (see
+    selectIdFields) for the caller to decode, and the partitions are only
+    joined with the hashes to match REGEXTerms.
     
     Note the use of UNION syntax requires that the literal properties
     partition is first (since it uses the first select to determine the
@@ -962,18 +1285,66 @@ def PatternResolution(
     
     see: http://dev.mysql.com/doc/refman/5.0/en/union.html
     """
-    subject,predicate,object_,context = quad
-    targetBRPs = BinaryRelationPartitionCoverage(
-                            (subject,predicate,object_,context),BRPs)
-    unionQueries = []
+    targetBRPs = BinaryRelationPartitionCoverage(quad,BRPs)
+    unionQueries,queriesParams = _partitionQueries(
+        quad, targetBRPs, fetchContexts, select_modifier, idsOnly)
     unionQueriesParams = []
+    for whereParameters in queriesParams:
+        unionQueriesParams.extend(whereParameters)
+    
+    if fetchContexts:
+        orderBySuffix = ''
+    else:
+        orderBySuffix = orderByTriple and ORDER_BY_TRIPLE_SQL or ''
+    if len(unionQueries) == 1:
+        query = unionQueries[0] + orderBySuffix
+    elif targetBRPs[0].unionParentheses:
+        query = ' union all '.join(['('+q+')' 
+                        for q in unionQueries]) + orderBySuffix
+    else:
+        query = ' union all '.join(unionQueries) + orderBySuffix
+    return query, unionQueriesParams
+
+def PatternResolutionQueries(
+                      quad, BRPs, orderByTriple=True, select_modifier='',
+                      idsOnly=False):
+    """
+    The members of the UNION query of PatternResolutionQuery as queries of
+    their own (each sorted by triple if orderByTriple is set), for
+    ParallelResolution to run concurrently: a list of (query, parameter
+    fill-ins) pairs, one per relevant partition.
+    """
+    targetBRPs = BinaryRelationPartitionCoverage(quad,BRPs)
+    queries,queriesParams = _partitionQueries(
+        quad, targetBRPs, False, select_modifier, idsOnly, leading=True)
+    orderBySuffix = orderByTriple and ORDER_BY_TRIPLE_SQL or ''
+    return [(queries[idx] + orderBySuffix, queriesParams[idx])
+            for idx in range(len(queries))]
+
+def _partitionQueries(quad, targetBRPs, fetchContexts, select_modifier,
+                      idsOnly, leading=False):
+    # the query against each of the partitions, and its parameters (the
+    # columns are named in the first query only, unless leading is set)
+    subject,predicate,object_,context = quad
+    queries = []
+    queriesParams = []
+    matchesLexically = [term for term in (subject,predicate,object_)
+                        if isinstance(term,REGEXTerm)] \
+            or (isinstance(context,Graph)
+                and isinstance(context.identifier,REGEXTerm))
     for brp in targetBRPs:
-        first = targetBRPs.index(brp) == 0
+        first = leading or targetBRPs.index(brp) == 0
         if fetchContexts:
             query = "SELECT DISTINCT %s FROM %s %s WHERE " % \
                 (','.join(brp.selectContextFields(first)),
                  brp,
                  brp._intersectionSQL)
+        elif idsOnly:
+            query = CROSS_BRP_QUERY_SQL % \
+                (select_modifier,
+                 ','.join(brp.selectIdFields(first)),
+                 brp,
+                 matchesLexically and brp._intersectionSQL or '')
         else:
             query = CROSS_BRP_QUERY_SQL % \
                 (select_modifier,
@@ -982,21 +1353,38 @@ def PatternResolution(
                  brp._intersectionSQL)
         whereClause,whereParameters = brp.generateWhereClause(
                                 (subject,predicate,object_,context))
-        unionQueries.append(query+whereClause)
-        unionQueriesParams.extend(whereParameters)
+        queries.append(query+whereClause)
+        queriesParams.append(whereParameters)
+    return queries,queriesParams
+
+def PatternResolution(
+                      quad, cursor, BRPs, orderByTriple=True, fetchall=True,
+                      fetchContexts=False, select_modifier='', pool=None):
+    """
+    This function implements query pattern resolution against a list of
+    partition objects and 3 parameters specifying whether to sort the result
+    set (in order to group identical triples by the contexts in which they
+    appear), whether to fetch the entire result set or one at a time, and
+    whether to fetch the matching contexts only or the assertions.  This
+    function uses PatternResolutionQuery to build the query (a single UNION
+    query against the relevant partitions) and runs it.
     
-    if fetchContexts:
-        orderBySuffix = ''
-    else:
-        orderBySuffix = orderByTriple and ' ORDER BY %s,%s,%s' % \
-                (SlotPrefixes[SUBJECT], 
-                 SlotPrefixes[PREDICATE],
-                 SlotPrefixes[OBJECT]) or ''
-    if len(unionQueries) == 1:
-        query = unionQueries[0] + orderBySuffix
-    else:
-        query = ' union all '.join(['('+q+')' 
-                        for q in unionQueries]) + orderBySuffix
+    If a ConnectionPool is given, the assertions are rather fetched by the
+    concurrent queries of a ParallelResolution (on connections of the pool,
+    which only see committed statements).
+    """
+    if pool is not None and not fetchContexts:
+        cursor = ParallelResolution(
+            PatternResolutionQueries(quad, BRPs, orderByTriple,
+                                     select_modifier),
+            pool, orderByTriple)
+        if fetchall:
+            return cursor.fetchall()
+        qRT = cursor.fetchmany(1)
+        cursor.close()
+        return qRT and qRT[0] or None
+    query, unionQueriesParams = PatternResolutionQuery(
+        quad, BRPs, orderByTriple, fetchContexts, select_modifier)
     try:
         if EXPLAIN_INFO:
             cursor.execute("EXPLAIN "+query,tuple(unionQueriesParams))
@@ -1014,6 +1402,469 @@ def PatternResolution(
         qRT = cursor.fetchone()
     return qRT
 
+# The position of the subject, predicate and object in the rows of the
+# triple pattern queries (which sort them in this order)
+TRIPLE_COLUMNS = (0, 2, 4)
+
+def _streamRows(state, index, pool, query, params, execute, fetchSize):
+    # runs one of the queries of a ParallelResolution and queues its rows
+    # by batches, then None (with the exception info if the query fails)
+    queue, closed = state
+    try:
+        connection = pool.acquire()
+        try:
+            c = connection.cursor()
+            execute(c, query, params)
+            rows = c.fetchmany(fetchSize)
+            while rows and not closed:
+                queue.put((index, rows, None))
+                rows = c.fetchmany(fetchSize)
+            c.close()
+        finally:
+            pool.release(connection)
+    except:
+        queue.put((index, None, sys.exc_info()))
+        return
+    queue.put((index, None, None))
+
+class _Streams(object):
+    # the rows queued by the threads of a ParallelResolution, in a queue of
+    # their own per query or in a queue they share
+    def __init__(self, queues, closed):
+        self.queues = queues
+        self.closed = closed
+        self.ended = set()
+    
+    def _nextBatch(self, queue):
+        # the index of a query and the next batch of its rows in ``queue``
+        # (None once the query is read to the end)
+        index, rows, error = queue.get()
+        if rows is None:
+            self.ended.add(index)
+            if error is not None:
+                self.close()
+                raise error[0], error[1], error[2]
+        return index, rows
+    
+    def streamRows(self, index):
+        # the rows of the query ``index`` (which has a queue of its own),
+        # in order
+        queue = self.queues[index]
+        while index not in self.ended:
+            other, rows = self._nextBatch(queue)
+            if rows is not None:
+                for row in rows:
+                    yield row
+    
+    def concatenatedRows(self):
+        # the rows of the queries (which share a queue), batches as they come
+        while len(self.ended) < len(self.queues):
+            index, rows = self._nextBatch(self.queues[0])
+            if rows is not None:
+                for row in rows:
+                    yield row
+    
+    def mergedRows(self):
+        # a k-way merge of the sorted rows of the queries, the ties going
+        # to the first query
+        streams = []
+        heap = []
+        for index in range(len(self.queues)):
+            streams.append(self.streamRows(index))
+            for row in streams[index]:
+                heap.append(
+                    ([row[col] for col in TRIPLE_COLUMNS], index, row))
+                break
+        heapq.heapify(heap)
+        while heap:
+            key, index, row = heap[0]
+            yield row
+            for row in streams[index]:
+                heapq.heapreplace(heap, (
+                    [row[col] for col in TRIPLE_COLUMNS], index, row))
+                break
+            else:
+                heapq.heappop(heap)
+    
+    def close(self):
+        # the threads stop at their next batch: the queues are read until
+        # each has queued its end
+        if not self.closed:
+            self.closed.append(True)
+        for index in range(len(self.queues)):
+            while index not in self.ended:
+                other, rows, error = self.queues[index].get()
+                if rows is None:
+                    self.ended.add(other)
+
+class ParallelResolution(object):
+    """
+    Runs queries (such as those of PatternResolutionQueries) concurrently,
+    each in a thread of its own on a connection of ``pool`` (or of its
+    replicas, in turn), and reads their rows through the fetchmany /
+    fetchall of a cursor: merged in the order of their triples if
+    ``orderByTriple`` is set (which each query must sort them in), or
+    concatenated by batches as they come otherwise.
+    
+    ``execute`` runs a query on a cursor (cursor.execute by default), and
+    at most ``queueSize`` batches of ``fetchSize`` rows are read ahead (in
+    queues of ``queueSize`` / len(queries) batches per query for a merge,
+    the threads ahead of it waiting until their rows are read).
+    """
+    def __init__(self, queries, pool, orderByTriple=True, execute=None,
+                 fetchSize=1000, queueSize=8):
+        if execute is None:
+            execute = lambda cursor, query, params: \
+                cursor.execute(query, tuple(params))
+        if orderByTriple:
+            # a queue per query, so that the merge waiting for the rows of
+            # one query does not read ahead those of the others
+            size = max(1, queueSize // max(1, len(queries)))
+            queues = [Queue.Queue(size) for query in queries]
+        else:
+            queues = [Queue.Queue(max(queueSize, len(queries)))] * \
+                len(queries)
+        closed = []
+        self._streams = _Streams(queues, closed)
+        if orderByTriple:
+            self._rows = self._streams.mergedRows()
+        else:
+            self._rows = self._streams.concatenatedRows()
+        pools = pool.replicas or [pool]
+        for index in range(len(queries)):
+            query, params = queries[index]
+            thread = threading.Thread(
+                target=_streamRows,
+                args=((queues[index], closed), index,
+                      pools[index % len(pools)],
+                      query, params, execute, fetchSize))
+            thread.setDaemon(True)
+            thread.start()
+    
+    def fetchmany(self, size=1):
+        rt = []
+        if size > 0:
+            for row in self._rows:
+                rt.append(row)
+                if len(rt) >= size:
+                    break
+        return rt
+    
+    def fetchall(self):
+        return list(self._rows)
+    
+    def close(self):
+        """
+        Stops the queries still running (the rows left are discarded)
+        """
+        self._streams.close()
+    
+    def __del__(self):
+        self.close()
+
+# The columns of the derived UNION standing for a pattern covered by several
+# partitions in BGPResolutionQuery
+BGP_COLUMNS = ['subject', 'subject_term', 'predicate', 'predicate_term',
+               'object', 'object_term', 'context', 'context_term',
+               'data_type', 'language']
+
+def _quadExpressions(brp, alias):
+    """
+    The SQL expressions for the id and the term type of each quad slot of
+    the rows of ``brp`` (as ``alias``), followed by those for the datatype
+    and the language of their object
+    """
+    rt = []
+    for slot in POSITION_LIST:
+        column = brp.columnNames[slot]
+        if column:
+            rt.append('%s.%s' % (alias, column))
+        else:
+            rt.append(str(normalizeValue(brp.hardCodedResultFields[slot],
+                                         brp.hardCodedResultTermsTypes[slot],
+                                         brp.useSignedInts)))
+        if brp.termEnumerations[slot]:
+            rt.append('%s.%s_term' % (alias, column))
+        else:
+            rt.append("'%s'" % brp.hardCodedResultTermsTypes[slot])
+    if brp.literalTable:
+        rt.extend(['%s.%s' % (alias, brp.columnNames[DATATYPE_INDEX][0]),
+                   '%s.%s' % (alias, brp.columnNames[LANGUAGE_INDEX][0])])
+    else:
+        rt.extend(['NULL', 'NULL'])
+    return rt
+
+def _groundConditions(quad, expressions, useSignedInts):
+    """
+    The conditions (and their parameters) on the rows described by
+    ``expressions`` (see _quadExpressions) for the ground terms of ``quad``.
+    Only asserted statements match a quad with no (or a variable) context.
+    The term types are left out: they are part of what the ids hash.
+    """
+    conditions = []
+    params = []
+    for slot in POSITION_LIST:
+        term = quad[slot]
+        if term is None or isinstance(term, Variable):
+            if slot == CONTEXT:
+                conditions.append("%s != 'F'" % expressions[2 * slot + 1])
+            continue
+        termType = term2Letter(term)
+        conditions.append('%s = %%s' % expressions[2 * slot])
+        params.append(normalizeValue(term, termType, useSignedInts))
+        if termType == 'L':
+            if term.datatype:
+                conditions.append('%s = %%s' % expressions[8])
+                params.append(
+                    normalizeValue(term.datatype, 'U', useSignedInts))
+            else:
+                conditions.append('%s IS NULL' % expressions[8])
+            if term.language:
+                conditions.append('%s = %%s' % expressions[9])
+                params.append(term.language)
+            else:
+                conditions.append('%s IS NULL' % expressions[9])
+    return conditions, params
+
+def _sameTermConditions(expressions, slot, otherExpressions, otherSlot,
+                        literals):
+    conditions = [
+        '%s = %s' % (expressions[2 * slot], otherExpressions[2 * otherSlot])]
+    if literals:
+        # both are objects which may be literals
+        for idx in (8, 9):
+            conditions.append('(%s = %s OR %s IS NULL AND %s IS NULL)' % (
+                expressions[idx], otherExpressions[idx],
+                expressions[idx], otherExpressions[idx]))
+    return conditions
+
+def _filterSQL(expr, occurrences, useSignedInts):
+    """
+    The SQL condition (and its parameters) for a filter in the simpleFilter
+    form (see rdfextras.sparql.evaluate), or None if one of its variables is
+    not in ``occurrences``
+    """
+    operator = expr[0]
+    if operator in ('and', 'or'):
+        conditions = []
+        params = []
+        for operand in expr[1]:
+            rt = _filterSQL(operand, occurrences, useSignedInts)
+            if rt is None:
+                return None
+            conditions.append(rt[0])
+            params.extend(rt[1])
+        return '(%s)' % (' %s ' % operator.upper()).join(conditions), params
+    elif operator == 'not':
+        rt = _filterSQL(expr[1], occurrences, useSignedInts)
+        if rt is None:
+            return None
+        return 'NOT %s' % rt[0], rt[1]
+    elif expr[1] not in occurrences:
+        return None
+    expressions, slot, termTypes = occurrences[expr[1]]
+    if operator == 'sameTerm':
+        return '%s = %%s' % expressions[2 * slot], \
+            [normalizeValue(expr[2], term2Letter(expr[2]), useSignedInts)]
+    termType = {'isIRI': 'U', 'isBlank': 'B', 'isLiteral': 'L'}[operator]
+    return "(%s = '%s')" % (expressions[2 * slot + 1], termType), []
+
+def _bgpQuery(patterns, coverages, variables, filters):
+    """
+    The SELECT joining one row of the partitions in ``coverages`` (a list of
+    partitions per pattern) for each pattern, through the variables they
+    share, or None if the term types of the partitions rule out a solution.
+    A pattern covered by a single partition joins it directly, by several a
+    derived UNION of them.
+    """
+    firstBRP = coverages[0][0]
+    idHash = firstBRP.idHash
+    valueHash = firstBRP.valueHash
+    useSignedInts = firstBRP.useSignedInts
+    # variable -> (expressions, slot, possible term types) of its first
+    # occurrence
+    occurrences = {}
+    sources = []
+    for idx in range(len(patterns)):
+        quad = patterns[idx]
+        partitions = coverages[idx]
+        alias = 'q%s' % idx
+        if len(partitions) == 1:
+            expressions = _quadExpressions(partitions[0], alias)
+            source = '%s %s' % (partitions[0], alias)
+            sourceParams = []
+            conditions, params = _groundConditions(quad, expressions,
+                                                   useSignedInts)
+        else:
+            members = []
+            sourceParams = []
+            for brp in partitions:
+                memberExpressions = _quadExpressions(brp, str(brp))
+                memberConditions, memberParams = _groundConditions(
+                    quad, memberExpressions, useSignedInts)
+                member = 'SELECT %s FROM %s' % (
+                    ', '.join(['%s AS %s' % (expression, column)
+                               for expression, column in zip(
+                                   memberExpressions, BGP_COLUMNS)]), brp)
+                if memberConditions:
+                    member += ' WHERE ' + ' AND '.join(memberConditions)
+                members.append(member)
+                sourceParams.extend(memberParams)
+            if firstBRP.unionParentheses:
+                members = ['(%s)' % member for member in members]
+            source = '(%s) %s' % (' UNION ALL '.join(members), alias)
+            expressions = ['%s.%s' % (alias, column)
+                           for column in BGP_COLUMNS]
+            conditions, params = [], []
+        for slot in POSITION_LIST:
+            variable = quad[slot]
+            if not isinstance(variable, Variable):
+                continue
+            termTypes = []
+            for brp in partitions:
+                for termType in brp.termEnumerations[slot] or \
+                        [brp.hardCodedResultTermsTypes[slot]]:
+                    if termType not in termTypes and \
+                            (slot != CONTEXT or termType != 'F'):
+                        termTypes.append(termType)
+            if variable not in occurrences:
+                occurrences[variable] = (expressions, slot, termTypes)
+                continue
+            firstExpressions, firstSlot, firstTermTypes = \
+                occurrences[variable]
+            termTypes = [termType for termType in firstTermTypes
+                         if termType in termTypes]
+            if not termTypes:
+                return None
+            occurrences[variable] = (firstExpressions, firstSlot, termTypes)
+            conditions.extend(_sameTermConditions(
+                expressions, slot, firstExpressions, firstSlot,
+                'L' in termTypes))
+        sources.append((source, sourceParams, conditions, params))
+
+    filterConditions = []
+    filterParams = []
+    for expr in filters:
+        rt = _filterSQL(expr, occurrences, useSignedInts)
+        if rt is not None:
+            filterConditions.append(rt[0])
+            filterParams.extend(rt[1])
+
+    idColumn = idHash.columns[0][0]
+    termColumn = idHash.columns[1][0]
+    lexicalColumn = idHash.columns[-1][0]
+    valueIdColumn = valueHash.columns[0][0]
+    valueLexicalColumn = valueHash.columns[-1][0]
+    columns = []
+    lookups = []
+    for idx in range(len(variables)):
+        expressions, slot, termTypes = occurrences[variables[idx]]
+        idExpr = expressions[2 * slot]
+        termExpr = expressions[2 * slot + 1]
+        alias = 'v%s' % idx
+        if 'L' not in termTypes:
+            lookups.append(LOOKUP_INTERSECTION_SQL % (
+                idHash, alias, '%s.%s = %s AND %s.%s = %s' % (
+                    alias, idColumn, idExpr, alias, termColumn, termExpr)))
+            columns.extend(['%s.%s' % (alias, lexicalColumn), termExpr,
+                            'NULL', 'NULL'])
+            continue
+        if termTypes == ['L']:
+            lookups.append(LOOKUP_INTERSECTION_SQL % (
+                valueHash, alias, '%s.%s = %s' % (
+                    alias, valueIdColumn, idExpr)))
+            lexical = '%s.%s' % (alias, valueLexicalColumn)
+        else:
+            lookups.append(LOOKUP_UNION_SQL % (
+                idHash, alias + '_i', '%s_i.%s = %s AND %s_i.%s = %s' % (
+                    alias, idColumn, idExpr, alias, termColumn, termExpr)))
+            lookups.append(LOOKUP_UNION_SQL % (
+                valueHash, alias + '_l', "%s_l.%s = %s AND %s = 'L'" % (
+                    alias, valueIdColumn, idExpr, termExpr)))
+            lexical = 'coalesce(%s_i.%s, %s_l.%s)' % (
+                alias, lexicalColumn, alias, valueLexicalColumn)
+        lookups.append(LOOKUP_UNION_SQL % (
+            idHash, alias + '_dt', '%s_dt.%s = %s' % (
+                alias, idColumn, expressions[8])))
+        columns.extend([lexical, termExpr,
+                        '%s_dt.%s' % (alias, lexicalColumn), expressions[9]])
+
+    source, sourceParams, whereConditions, params = sources[0]
+    query = ['SELECT DISTINCT %s FROM %s' % (', '.join(columns or ['1']),
+                                             source)]
+    queryParams = list(sourceParams)
+    for source, sourceParams, conditions, conditionParams in sources[1:]:
+        query.append('INNER JOIN %s ON (%s)' % (
+            source, ' AND '.join(conditions or ['1 = 1'])))
+        queryParams.extend(sourceParams)
+        queryParams.extend(conditionParams)
+    query.extend(lookups)
+    whereConditions = whereConditions + filterConditions
+    if whereConditions:
+        query.append('WHERE ' + ' AND '.join(whereConditions))
+    return ' '.join(query), queryParams + params + filterParams
+
+def BGPResolutionQuery(patterns, BRPs, filters=(), maxUnionMembers=16):
+    """
+    Compiles a basic graph pattern - a list of quad patterns whose terms are
+    ground or variables (the context may also be None: any asserted
+    context) - into a single query joining a row of the partitions for each
+    pattern, on the hashes of the terms shared through its variables. Each
+    filter (in the simpleFilter form of rdfextras.sparql.evaluate) whose
+    variables all occur in the patterns is compiled into the WHERE clause.
+
+    The patterns covered by several partitions (see
+    BinaryRelationPartitionCoverage) are resolved by a UNION of the joins
+    over each combination of their partitions, skipping the combinations
+    which give a variable incompatible term types, or - beyond
+    ``maxUnionMembers`` combinations - by joining derived UNIONs of the
+    partitions instead.
+
+    Returns the query (None if the patterns cannot match), its parameters
+    and the variables of the patterns: the rows have 4 columns for each
+    variable (its lexical form, term type, datatype and language)
+    """
+    variables = []
+    coverages = []
+    combinations = 1
+    for quad in patterns:
+        coverageQuad = []
+        for term in quad:
+            if isinstance(term, Variable):
+                # a variable ranges over any term (the decision map takes
+                # a variable object to be a resource)
+                term = None
+            coverageQuad.append(term)
+        for term in quad:
+            if isinstance(term, Variable) and term not in variables:
+                variables.append(term)
+        coverage = BinaryRelationPartitionCoverage(tuple(coverageQuad), BRPs)
+        if not coverage:
+            return None, [], variables
+        coverages.append(coverage)
+        combinations *= len(coverage)
+    if combinations > maxUnionMembers:
+        choices = [coverages]
+    else:
+        choices = [[]]
+        for coverage in coverages:
+            choices = [choice + [[brp]]
+                       for choice in choices for brp in coverage]
+    queries = []
+    params = []
+    for choice in choices:
+        rt = _bgpQuery(patterns, choice, variables, filters)
+        if rt is not None:
+            queries.append(rt[0])
+            params.extend(rt[1])
+    if not queries:
+        return None, [], variables
+    elif len(queries) == 1:
+        return queries[0], params, variables
+    elif BRPs[0].unionParentheses:
+        queries = ['(%s)' % query for query in queries]
+    return ' UNION '.join(queries), params, variables
+
 CREATE_RESULT_TABLE = \
 """
 CREATE TEMPORARY TABLE result (
@@ -1031,6 +1882,8 @@ CREATE TEMPORARY TABLE result (
 )
 """
 CROSS_BRP_QUERY_SQL="SELECT %s %s FROM %s %s WHERE "
+ORDER_BY_TRIPLE_SQL=' ORDER BY %s,%s,%s' % \
+    (SlotPrefixes[SUBJECT],SlotPrefixes[PREDICATE],SlotPrefixes[OBJECT])
 CROSS_BRP_RESULT_QUERY_SQL="SELECT * FROM result ORDER BY context"
 DROP_RESULT_TABLE_SQL = "DROP result"
 
@@ -1045,6 +1898,7 @@ BRPQueryDecisionMap = {
     'RTU':(NamedBinaryRelations,AssociativeBox),
     'RTR':(NamedLiteralProperties,AssociativeBox,NamedBinaryRelations), # here
     'TU':(AssociativeBox),
+    'TL':(NamedLiteralProperties),
     'TW':(AssociativeBox),
     'TR':(AssociativeBox),
     'U_RNTL':(NamedLiteralProperties),
@@ -1083,6 +1937,8 @@ if __name__ == '__main__':
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import NamedLiteralProperties
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import NamedBinaryRelations
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import BinaryRelationPartitionCoverage
+# from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import VerticalPartitions
+# from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import PatternResolutionQuery
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import PatternResolution
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import CREATE_RESULT_TABLE
 # from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import CROSS_BRP_QUERY_SQL
@@ -22,6 +22,12 @@ from rdfextras.utils.termutils import escape_quotes
 
 Any = None
 
+# Number of entries at most in the memo of normalizeValue: a plain
+# dictionary, emptied when it is full (which is cheaper to consult than an
+# LRU cache, and safe to share between threads)
+HASH_CACHE_SIZE = 100000
+_hashes = {}
+
 DATATYPE_INDEX = CONTEXT + 1
 LANGUAGE_INDEX = CONTEXT + 2
 
@@ -54,7 +60,65 @@ def genQuadSlots(quads, useSignedInts=False):
     return [QuadSlot(index, quads[index], useSignedInts)
             for index in POSITION_LIST]
 
+def genQuadSlotsN(quads, useSignedInts=False):
+    """
+    The quad slots (see genQuadSlots) of each of a batch of quads, each
+    distinct term of the batch being hashed once (bypassing the memo of
+    normalizeValue, which the terms of bulk loads would only churn)
+    
+    >>> from rdflib.term import URIRef
+    >>> p = URIRef('urn:p')
+    >>> slots = genQuadSlotsN([(URIRef('urn:a'), p, Literal(1), p),
+    ...                        (URIRef('urn:b'), p, Literal('1'), p)])
+    >>> hashes = [slot.md5Int for slot in genQuadSlots(
+    ...     (URIRef('urn:a'), p, Literal(1), p))]
+    >>> [slot.md5Int for slot in slots[0]] == hashes
+    True
+    >>> slots[0][2].md5Int == slots[1][2].md5Int, slots[1][2].term.datatype
+    (True, None)
+    """
+    hashes = {}
+    rt = []
+    for quad in quads:
+        slots = []
+        for index in POSITION_LIST:
+            term = quad[index]
+            termType = term2Letter(term)
+            key = (_lexical(term), termType)
+            md5Int = hashes.get(key)
+            if md5Int is None:
+                md5Int = hashes[key] = _hashValue(term, termType,
+                                                  useSignedInts)
+            slots.append(QuadSlot(index, term, useSignedInts,
+                                  termType, md5Int))
+        rt.append(slots)
+    return rt
+
+def _lexical(value):
+    # the text a term is hashed by, as a plain string: literals which are
+    # equal to each other (such as 1 and 01) may differ lexically, and
+    # strings hash faster than terms
+    if isinstance(value, Graph):
+        return unicode(value.identifier)
+    elif value is None:
+        return None
+    return unicode(value)
+
 def normalizeValue(value, termType, useSignedInts=False):
+    """
+    The integer half-md5-hash of a term (of the given term type),
+    memoized for the HASH_CACHE_SIZE terms hashed last
+    """
+    key = (_lexical(value), termType, useSignedInts)
+    md5Int = _hashes.get(key)
+    if md5Int is None:
+        md5Int = _hashValue(value, termType, useSignedInts)
+        if len(_hashes) >= HASH_CACHE_SIZE:
+            _hashes.clear()
+        _hashes[key] = md5Int
+    return md5Int
+
+def _hashValue(value, termType, useSignedInts):
     if value is None:
         value = u'http://www.w3.org/2002/07/owl#NothingU'
     else:
@@ -86,23 +150,27 @@ class QuadSlot(object):
         return "QuadSlot(%s,%s,%s)" % \
                 (SlotPrefixes[self.position],self.term,self.md5Int)
     
-    def __init__(self, position, term, useSignedInts=False):
+    def __init__(self, position, term, useSignedInts=False,
+                 termType=None, md5Int=None):
         assert position in POSITION_LIST, "Unknown quad position: %s" % \
             position
         self.position = position
         self.term = term
-        self.termType = term2Letter(term)
+        if termType is None:
+            termType = term2Letter(term)
+        self.termType = termType
         self.useSignedInts = useSignedInts
-        self.md5Int = normalizeValue(term, term2Letter(term), useSignedInts)
+        if md5Int is None:
+            md5Int = normalizeValue(term, termType, useSignedInts)
+        self.md5Int = md5Int
     
     def EscapeQuotes(self,qstr):
         return escape_quotes(qstr)
 
     def normalizeTerm(self):
+        # the lexical forms are bound as parameters: literals are not escaped
         if isinstance(self.term, (QuotedGraph, Graph)):
             return self.term.identifier.encode('utf-8')
-        elif isinstance(self.term,Literal):
-            return self.EscapeQuotes(self.term).encode('utf-8')
         elif self.term is None or isinstance(self.term,(list,REGEXTerm)):
             return self.term
         else:
@@ -123,6 +191,7 @@ class QuadSlot(object):
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import bigint_signed_max 
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import dereferenceQuad
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import genQuadSlots
+# from rdfextras.store.FOPLRelationalModel.QuadSlot import genQuadSlotsN
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import normalizeValue
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import makeSigned
 # from rdfextras.store.FOPLRelationalModel.QuadSlot import normalizeNode
@@ -14,10 +14,16 @@ the identifier's full lexical representation (for partial matching by REGEX)
 These classes are meant to automate the creation, management, linking,
 insertion of these hashes (by SQL) automatically
 
+Each row of the hashes keeps count of the references to it from the
+partitions (see BinaryRelationPartition.updateReferences), so that the terms
+no longer referred to are purged as the assertions referring to them are
+removed. GarbageCollectionQUERY (a full sweep of the hashes) and
+ReferenceCountQUERY (a full recount) are left for offline consistency checks.
+
 see: http://en.wikipedia.org/wiki/Birthday_Paradox
 """
 
-from rdflib.term import Literal
+import threading
 from rdflib.namespace import RDF
 from rdflib.graph import QuotedGraph
 from rdflib.graph import Graph
@@ -25,6 +31,8 @@ from rdfextras.utils.termutils import OBJECT
 from rdfextras.utils.termutils import escape_quotes
 from rdfextras.store.REGEXMatching import REGEXTerm
 from rdfextras.store.FOPLRelationalModel.QuadSlot import normalizeValue
+from rdfextras.store.AbstractSQLStore import createTerm
+from rdfextras.utils.lrucache import LRUCache
 Any = None
 
 COLLISION_DETECTION = False
@@ -42,16 +50,12 @@ CREATE TEMPORARY TABLE danglingIds SELECT %s.%s FROM %s %s where %s"""
 PURGE_KEY_SQL="""\
 DELETE %s FROM %s INNER JOIN danglingIds on danglingIds.%s = %s.%s;"""
 
-# IDEA: Could we store a refcount in the DB instead of doing this GC?  That
-# might also allow for some interesting statistical queries.  -
-# clarkj@ccf.org, 2008-02-18
-
 def GarbageCollectionQUERY(idHash,valueHash,aBoxPart,binRelPart,litPart):
     """
     Performs garbage collection on interned identifiers and their references.
     Joins the given KB partitions against the identifiers and values and
-    removes the 'danglers'. This must be performed after every removal of an
-    assertion and so becomes a primary bottleneck
+    removes the 'danglers'. The reference counts of the hashes make this
+    unnecessary after removals: it is only an (offline) consistency check
     """
     purgeQueries = ["drop temporary table if exists danglingIds"]
     rdfTypeInt = normalizeValue(RDF.type,'U')
@@ -121,7 +125,51 @@ def GarbageCollectionQUERY(idHash,valueHash,aBoxPart,binRelPart,litPart):
     purgeQueries.append(valuePurgeQuery)
     return purgeQueries
 
+def ReferenceCountQUERY(idHash, valueHash, partitions):
+    """
+    The statements recounting the references to each row of the hashes from
+    the given partitions (rdf:type, which the AssociativeBox refers to
+    implicitly, keeps an extra one) and purging the rows left unreferenced:
+    a full scan of the partitions, to check (and repair) the reference
+    counts offline
+    """
+    rdfTypeInt = normalizeValue(RDF.type, 'U', idHash.useSignedInts)
+    statements = []
+    for hash in [idHash, valueHash]:
+        keyColumn = hash.columns[0][0]
+        counts = []
+        for partition in partitions:
+            for column, referred in partition.referenceColumns():
+                if referred is hash:
+                    counts.append(
+                        "(SELECT count(*) FROM %s WHERE %s.%s = %s.%s)" % (
+                            partition, partition, column, hash, keyColumn))
+        if hash is idHash:
+            counts.append("CASE WHEN %s = %s THEN 1 ELSE 0 END" % (
+                keyColumn, rdfTypeInt))
+        statements.append("UPDATE %s SET %s = %s" % (
+            hash, hash.referenceCountColumn, ' + '.join(counts or ['0'])))
+        statements.append("DELETE FROM %s WHERE %s <= 0" % (
+            hash, hash.referenceCountColumn))
+    return statements
+
+def _text(values):
+    # the values of a row, the strings as unicode
+    return tuple([isinstance(value, str) and value.decode('utf-8') or value
+                  for value in values])
+
 class Table(object):
+    # The dialect of the SQL generated for the table, MySQL's by default:
+    # the command inserting its rows (and whether it skips the rows already
+    # in the table), and the statements dropping one of its indexes and
+    # adding or dropping its primary key (with %(table)s, %(index)s and
+    # %(columns)s fill-ins)
+    insertCommand = 'INSERT INTO'
+    insertIgnoresDuplicates = False
+    dropIndexSQL = 'DROP INDEX %(index)s ON %(table)s'
+    addPrimaryKeySQL = 'ALTER TABLE %(table)s ADD PRIMARY KEY (%(columns)s)'
+    dropPrimaryKeySQL = 'ALTER TABLE %(table)s DROP PRIMARY KEY'
+
     def get_name(self):
         '''
         Returns the name of this table in the backing SQL database.
@@ -142,14 +190,15 @@ class Table(object):
         '''
         return []
     
-    def indexingStatements(self):
+    def indexingStatements(self, unique=True):
         '''
         Returns a list of SQL statements that, when executed, will create
-        appropriate indices for this table.
+        appropriate indices for this table (leaving out the unique ones, such
+        as the primary key, if `unique` is false).
         '''
         return []
     
-    def removeIndexingStatements(self):
+    def removeIndexingStatements(self, unique=True):
         '''
         Returns a list of SQL statements that, when executed, will remove all of
         the indices corresponding to `indexingStatements`.
@@ -172,6 +221,10 @@ class Table(object):
     
 
 class RelationalHash(Table):
+    # The column counting the references to each row from the partitions
+    referenceCountColumn = 'ref_count'
+    # Number of hashes looked up by each query of insertIdentifiers
+    existenceCheckRows = 500
     def __init__(
                  self, identifier,
                  useSignedInts=False, hashFieldType='BIGINT unsigned',
@@ -187,10 +240,9 @@ class RelationalHash(Table):
         return escape_quotes(qstr)
 
     def normalizeTerm(self,term):
+        # the lexical forms are bound as parameters: literals are not escaped
         if isinstance(term,(QuotedGraph, Graph)):
             return term.identifier.encode('utf-8')
-        elif isinstance(term,Literal):
-            return self.EscapeQuotes(term).encode('utf-8')
         elif term is None or isinstance(term,(tuple,list,REGEXTerm)):
             return term
         else:
@@ -202,7 +254,7 @@ class RelationalHash(Table):
     def get_name(self):
         return "%s_%s"%(self.identifier,self.tableNameSuffix)
     
-    def indexingStatements(self):
+    def indexingStatements(self, unique=True):
         idxSQLStmts = []
         for colName, colType, indexMD in self.columns:
             if indexMD:
@@ -210,23 +262,22 @@ class RelationalHash(Table):
                 if indexName:
                     idxSQLStmts.append("CREATE INDEX %s_%s ON %s (%s)" %
                                        (self, indexName, self, indexCol))
-                else:
-                    idxSQLStmts.append(
-                      "ALTER TABLE %s ADD PRIMARY KEY (%s)" %
-                      (self, indexCol))
+                elif unique:
+                    idxSQLStmts.append(self.addPrimaryKeySQL % {
+                        'table': self, 'columns': indexCol})
         return idxSQLStmts
     
-    def removeIndexingStatements(self):
+    def removeIndexingStatements(self, unique=True):
         idxSQLStmts = []
         for colName, colType, indexMD in self.columns:
             if indexMD:
                 indexName, indexCol = indexMD
                 if indexName:
-                    idxSQLStmts.append("DROP INDEX %s_%s ON %s" %
-                                       (self, indexName, self))
-                else:
-                    idxSQLStmts.append("ALTER TABLE %s DROP PRIMARY KEY" %
-                                       (self,))
+                    idxSQLStmts.append(self.dropIndexSQL % {
+                        'index': '%s_%s' % (self, indexName), 'table': self})
+                elif unique:
+                    idxSQLStmts.append(self.dropPrimaryKeySQL % {
+                        'table': self})
         return idxSQLStmts
     
     def createStatements(self):
@@ -252,6 +303,8 @@ class RelationalHash(Table):
             else:
                 columnSQLStmts.append("\t%s\t%s not NULL" %
                                         (colName, colType))
+        columnSQLStmts.append("\t%s\tBIGINT not NULL" %
+                              self.referenceCountColumn)
         
         statements.append(CREATE_HASH_TABLE % (
             self,
@@ -262,9 +315,101 @@ class RelationalHash(Table):
     def getRowsByHash(self, db, hash):
         c = db.cursor()
         keyCol = self.columns[0][0]
-        c.execute('SELECT * FROM %s WHERE %s = %s' % (self, keyCol, hash))
+        c.execute('SELECT %s FROM %s WHERE %s = %s' % (
+            ', '.join([column[0] for column in self.columns]),
+            self, keyCol, hash))
         return c.fetchall()
     
+    def getRowsByHashes(self, cursor, hashes):
+        """
+        A dictionary of the rows (values of the columns) of the given
+        hashes found in the table, looked up ``existenceCheckRows`` at a
+        time
+        """
+        keyCol = self.columns[0][0]
+        rows = {}
+        for start in range(0, len(hashes), self.existenceCheckRows):
+            chunk = hashes[start:start + self.existenceCheckRows]
+            cursor.execute("SELECT %s FROM %s WHERE %s IN (%s)" % (
+                ', '.join([column[0] for column in self.columns]),
+                self, keyCol, ', '.join(['%s'] * len(chunk))), chunk)
+            for row in cursor.fetchall():
+                rows[row[0]] = row
+        return rows
+    
+    def insertSQLCmd(self):
+        """
+        The command inserting a row (with no references yet)
+        """
+        return "%s %s (%s) VALUES (%s, 0)" % (
+            self.insertCommand, self,
+            ', '.join([column[0] for column in self.columns] +
+                      [self.referenceCountColumn]),
+            ', '.join(['%s'] * len(self.columns)))
+    
+    def queuedRows(self):
+        """
+        The rows (values of the columns) queued for insertion
+        """
+        raise NotImplementedError
+    
+    def insertIdentifiers(self, db):
+        """
+        Inserts the queued rows not in the table yet (looked up
+        ``existenceCheckRows`` hashes at a time, unless the insert command
+        skips the rows already there), checking the rows already there
+        against the queued ones if COLLISION_DETECTION is set, and resets
+        the queue.
+        """
+        if not self.hashUpdateQueue:
+            return
+        rows = self.queuedRows()
+        c = db.cursor()
+        if self.insertIgnoresDuplicates and not COLLISION_DETECTION:
+            c.executemany(self.insertSQLCmd(), rows)
+        else:
+            existing = self.getRowsByHashes(c, [row[0] for row in rows])
+            params = [row for row in rows if row[0] not in existing]
+            if params:
+                c.executemany(self.insertSQLCmd(), params)
+            if COLLISION_DETECTION:
+                for row in rows:
+                    if row[0] in existing and \
+                            _text(existing[row[0]][1:]) != _text(row[1:]):
+                        # Collision!!! Raise an exception (allow the app to
+                        # rollback the transaction if it wants to)
+                        c.close()
+                        raise Exception(
+                            "Hash Collision (in %s) on %r vs %r!" % (
+                                self, existing[row[0]][1:], row[1:]))
+        self.hashUpdateQueue = {}
+        c.close()
+    
+    def updateReferences(self, cursor, counts):
+        """
+        Adds ``counts`` (a dictionary of reference counts by id) to the
+        reference counts of the rows, and purges the rows they leave
+        unreferenced
+        """
+        keyCol = self.columns[0][0]
+        params = [(count, key) for key, count in counts.items() if count]
+        if params:
+            cursor.executemany("UPDATE %s SET %s = %s + %%s WHERE %s = %%s" %
+                               (self, self.referenceCountColumn,
+                                self.referenceCountColumn, keyCol), params)
+        released = [(key,) for key, count in counts.items() if count < 0]
+        if released:
+            cursor.executemany("DELETE FROM %s WHERE %s = %%s AND %s <= 0" %
+                               (self, keyCol, self.referenceCountColumn),
+                               released)
+    
+    def _dictRows(self, cursor, hashes):
+        if hashes is not None:
+            return self.getRowsByHashes(cursor, list(hashes)).values()
+        cursor.execute("select %s from %s" % (
+            ', '.join([column[0] for column in self.columns]), self))
+        return cursor.fetchall()
+    
     def dropSQL(self):
         pass
     
@@ -293,22 +438,29 @@ class IdentifierHash(RelationalHash):
             self.columns.append(('lexical', 'text', None))
     
     def viewUnionSelectExpression(self,relations_only=False):
-        return "select * from %s"%(repr(self))
+        return "select %s from %s" % (
+            ', '.join([column[0] for column in self.columns]), repr(self))
     
     def defaultStatements(self):
         """
         Since rdf:type is modeled explicitely (in the ABOX partition) it
-        must be inserted as a 'default' identifier.
+        must be inserted as a 'default' identifier (which the ABOX partition
+        keeps a reference to).
         """
-        return ["INSERT INTO %s VALUES (%s, 'U', '%s');" %
-                  (self, normalizeValue(RDF.type, 'U', self.useSignedInts),
+        return ["INSERT INTO %s (%s, %s) VALUES (%s, 'U', '%s', 1);" %
+                  (self, ', '.join([column[0] for column in self.columns]),
+                   self.referenceCountColumn,
+                   normalizeValue(RDF.type, 'U', self.useSignedInts),
                    RDF.type)]
     
-    def generateDict(self,db):
+    def generateDict(self,db,hashes=None):
+        """
+        A dictionary from the hashes of the table (or of the given
+        ``hashes`` only) to their term type and lexical form
+        """
         c=db.cursor()
-        c.execute("select * from %s"%self)
         rtDict = {}
-        for rt in c.fetchall():
+        for rt in self._dictRows(c, hashes):
             rtDict[rt[0]] = (rt[1],rt[2])
         c.close()
         return rtDict
@@ -319,40 +471,10 @@ class IdentifierHash(RelationalHash):
             self.hashUpdateQueue[md5Int] = (termType,
                                             self.normalizeTerm(term))
     
-    def insertIdentifiers(self,db):
-        c=db.cursor()
-        keyCol = self.columns[0][0]
-        if self.hashUpdateQueue:
-            params = [(md5Int, termType, lexical)
-                      for md5Int, (termType, lexical)
-                        in self.hashUpdateQueue.items()
-                        if len(self.getRowsByHash(db, md5Int)) == 0]
-            if len(params) > 0:
-                c.executemany(
-                  "INSERT INTO %s" % (self,) + " VALUES (%s,%s,%s)", params)
-            
-            if COLLISION_DETECTION:
-                insertedIds = self.hashUpdateQueue.keys()
-                if len(insertedIds) > 1:
-                    c.execute("SELECT * FROM %s" % \
-                            (self)+" WHERE %s" % \
-                                keyCol+" in %s",(tuple(insertedIds),))
-                else:
-                    c.execute("SELECT * FROM %s" % \
-                            (self)+" WHERE %s" % \
-                                keyCol+" = %s",tuple(insertedIds))
-                for key,termType,lexical in c.fetchall():
-                    if self.hashUpdateQueue[key] != (termType,lexical):
-                        # Collision!!! Raise an exception (allow the app to 
-                        # rollback the transaction if it wants to)
-                        raise Exception(
-                            "Hash Collision (in %s) on %s,%s vs %s,%s!" % \
-                                (self, termType, lexical, 
-                                self.hashUpdateQueue[key][0],
-                                self.hashUpdateQueue[key][1]))
-            
-            self.hashUpdateQueue = {}
-        c.close()
+    def queuedRows(self):
+        return [(md5Int, termType, lexical)
+                for md5Int, (termType, lexical)
+                    in self.hashUpdateQueue.items()]
     
 
 class LiteralHash(RelationalHash):
@@ -376,11 +498,14 @@ class LiteralHash(RelationalHash):
         return "select %s, 'L' as term_type, lexical from %s" % \
                 (self.columns[0][0],repr(self))
     
-    def generateDict(self,db):
+    def generateDict(self,db,hashes=None):
+        """
+        A dictionary from the hashes of the table (or of the given
+        ``hashes`` only) to their lexical form
+        """
         c=db.cursor()
-        c.execute("select * from %s"%self)
         rtDict = {}
-        for rt in c.fetchall():
+        for rt in self._dictRows(c, hashes):
             rtDict[rt[0]] = rt[1]
         c.close()
         return rtDict
@@ -390,36 +515,80 @@ class LiteralHash(RelationalHash):
             md5Int = normalizeValue(term, termType, self.useSignedInts)
             self.hashUpdateQueue[md5Int]=self.normalizeTerm(term)
     
-    def insertIdentifiers(self,db):
-        c=db.cursor()
-        keyCol = self.columns[0][0]
-        if self.hashUpdateQueue:
-            params = [(md5Int, lexical) for md5Int, lexical
-                        in self.hashUpdateQueue.items()
-                        if len(self.getRowsByHash(db, md5Int)) == 0]
-            if len(params) > 0:
-                c.executemany(
-                  "INSERT INTO %s" % (self,) + " VALUES (%s,%s)", params)
-            
-            if COLLISION_DETECTION:
-                insertedIds = self.hashUpdateQueue.keys()
-                if len(insertedIds) > 1:
-                    c.execute("SELECT * FROM %s" % \
-                        (self)+" WHERE %s" % \
-                            keyCol+" in %s",(tuple(insertedIds),))
+    def queuedRows(self):
+        return [(md5Int, lexical)
+                for md5Int, lexical in self.hashUpdateQueue.items()]
+    
+class TermDictionary(object):
+    """
+    A bounded in-process dictionary from the integer half-md5-hashes of the
+    identifier and value hashes of a store to the terms of the identifier
+    hash and the lexical forms of the value hash (the literals themselves
+    also depend on the datatype and language of each assertion), shared by
+    the threads using the store.
+    
+    An id stands for the same term for the life of the database, so the
+    entries never go stale: the dictionary is warmed lazily, the ids missing
+    from it being looked up (see RelationalHash.getRowsByHashes) as they are
+    asked for, and holds the ``maxsize`` most recently used ids of each hash.
+    """
+    def __init__(self, store, maxsize=100000):
+        self.store = store
+        self.identifiers = LRUCache(maxsize)
+        self.values = LRUCache(maxsize)
+        self._lock = threading.Lock()
+    
+    def _resolve(self, cache, hash, db, ids, decode):
+        found = {}
+        missing = []
+        self._lock.acquire()
+        try:
+            for id in ids:
+                value = cache.get(id)
+                if value is None:
+                    missing.append(id)
                 else:
-                    c.execute("SELECT * FROM %s" % \
-                            (self)+" WHERE %s" % \
-                                keyCol+" = %s",tuple(insertedIds))
-                for key,lexical in c.fetchall():
-                    if self.hashUpdateQueue[key] != lexical:
-                        # Collision!!! Raise an exception (allow the app to 
-                        # rollback the transaction if it wants to)
-                        raise Exception(
-                            "Hash Collision (in %s) on %s vs %s!" % \
-                                (self,lexical,self.hashUpdateQueue[key][0]))
-            self.hashUpdateQueue = {}
-        c.close()
+                    found[id] = value
+        finally:
+            self._lock.release()
+        if missing:
+            c = db.cursor()
+            try:
+                rows = hash.getRowsByHashes(c, missing)
+            finally:
+                c.close()
+            self._lock.acquire()
+            try:
+                for id, row in rows.items():
+                    found[id] = cache[id] = decode(_text(row))
+            finally:
+                self._lock.release()
+        return found
+    
+    def terms(self, db, ids):
+        """
+        A dictionary from the given ids of the identifier hash to their
+        terms (looked up through ``db`` if not in the dictionary yet)
+        """
+        store = self.store
+        return self._resolve(self.identifiers, store.idHash, db, ids,
+                             lambda row: createTerm(row[2], row[1], store))
+    
+    def lexicals(self, db, ids):
+        """
+        A dictionary from the given ids of the value hash to their lexical
+        forms (looked up through ``db`` if not in the dictionary yet)
+        """
+        return self._resolve(self.values, self.store.valueHash, db, ids,
+                             lambda row: row[1])
+    
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self.identifiers.clear()
+            self.values.clear()
+        finally:
+            self._lock.release()
     
 # Convenience
 # from rdfextras.store.FOPLRelationalModel.RelationalHash import COLLISION_DETECTION
@@ -432,4 +601,5 @@ class LiteralHash(RelationalHash):
 # from rdfextras.store.FOPLRelationalModel.RelationalHash import RelationalHash
 # from rdfextras.store.FOPLRelationalModel.RelationalHash import IdentifierHash
 # from rdfextras.store.FOPLRelationalModel.RelationalHash import LiteralHash
-# from rdfextras.store.FOPLRelationalModel.RelationalHash import GarbageCollectionQUERY
\ No newline at end of file
+# from rdfextras.store.FOPLRelationalModel.RelationalHash import GarbageCollectionQUERY
+# from rdfextras.store.FOPLRelationalModel.RelationalHash import ReferenceCountQUERY
\ No newline at end of file
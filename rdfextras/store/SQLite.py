@@ -0,0 +1,841 @@
+"""
+SQLite backends for the SQL stores: a store kept in a single database file
+(or in memory), with no database server to set up, for applications
+embedding their data and as a reference backend for benchmarking the SQL
+layouts.
+
+* :class:`SQLite` keeps the statements in the partitions of
+  :class:`~rdfextras.store.AbstractSQLStore.AbstractSQLStore`,
+* :class:`FOPLSQLite` keeps them in the partitions and hashes of the
+  :mod:`~rdfextras.store.FOPLRelationalModel`.
+
+The database is opened in WAL mode (readers do not block the writer), the
+tables are indexed when they are created and statements are prepared once
+per connection: sqlite3 keeps the ``cachedStatements`` most recently used
+statements of a connection prepared, and the stores hand it the same text
+for every execution of a statement shape.
+
+>>> from rdflib.graph import ConjunctiveGraph
+>>> from rdflib.term import Literal, URIRef
+>>> store = SQLite('test')
+>>> store.open(':memory:')
+1
+>>> g = ConjunctiveGraph(store)
+>>> g.add((URIRef('urn:a'), URIRef('urn:b'), Literal('c')))
+>>> list(g.objects(URIRef('urn:a')))
+[rdflib.term.Literal(u'c')]
+"""
+
+import os
+import re
+import sqlite3
+
+from rdflib.namespace import RDF
+from rdflib.store import VALID_STORE, CORRUPTED_STORE, NO_STORE
+from rdflib.store import TripleAddedEvent, TripleRemovedEvent
+from rdflib.term import Literal
+
+from rdfextras.store.AbstractSQLStore import AbstractSQLStore
+from rdfextras.store.AbstractSQLStore import CREATE_STATISTICS_TABLE
+from rdfextras.store.AbstractSQLStore import STATEMENT_CACHE_SIZE
+from rdfextras.store.AbstractSQLStore import STATISTICS_TABLE
+from rdfextras.store.AbstractSQLStore import convertParamstyle
+from rdfextras.store.AbstractSQLStore import createTerm
+from rdfextras.store.AbstractSQLStore import patternShape
+from rdfextras.store.AbstractSQLStore import table_name_prefixes
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    AssociativeBox
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    BGPResolutionQuery
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    BinaryRelationPartitionCoverage
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    NamedBinaryRelations
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    NamedLiteralProperties
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    ParallelResolution
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    PatternResolutionQueries
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    PatternResolutionQuery
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    VerticalPartitions
+from rdfextras.store.FOPLRelationalModel.QuadSlot import genQuadSlotsN
+from rdfextras.store.FOPLRelationalModel.RelationalHash import IdentifierHash
+from rdfextras.store.FOPLRelationalModel.RelationalHash import LiteralHash
+from rdfextras.store.FOPLRelationalModel.RelationalHash import \
+    ReferenceCountQUERY
+from rdfextras.store.FOPLRelationalModel.RelationalHash import TermDictionary
+from rdfextras.store.REGEXMatching import REGEXTerm
+from rdfextras.utils.lrucache import LRUCache
+from rdfextras.utils.termutils import constructGraph
+from rdfextras.utils.termutils import term2Letter
+
+__all__ = ['SQLite', 'FOPLSQLite', 'FormatConnection', 'FormatCursor',
+           'regexp']
+
+CREATE_ASSERTED_STATEMENTS_TABLE = """
+CREATE TABLE %s_asserted_statements (
+    subject     text not NULL,
+    predicate   text not NULL,
+    object      text not NULL,
+    context     text not NULL,
+    termComb    tinyint unsigned not NULL)"""
+
+CREATE_TYPE_STATEMENTS_TABLE = """
+CREATE TABLE %s_type_statements (
+    member      text not NULL,
+    klass       text not NULL,
+    context     text not NULL,
+    termComb    tinyint unsigned not NULL)"""
+
+CREATE_LITERAL_STATEMENTS_TABLE = """
+CREATE TABLE %s_literal_statements (
+    subject     text not NULL,
+    predicate   text not NULL,
+    object      text,
+    context     text not NULL,
+    termComb    tinyint unsigned not NULL,
+    objLanguage varchar(3),
+    objDatatype text)"""
+
+CREATE_QUOTED_STATEMENTS_TABLE = """
+CREATE TABLE %s_quoted_statements (
+    subject     text not NULL,
+    predicate   text not NULL,
+    object      text,
+    context     text not NULL,
+    termComb    tinyint unsigned not NULL,
+    objLanguage varchar(3),
+    objDatatype text)"""
+
+CREATE_NS_BINDS_TABLE = """
+CREATE TABLE %s_namespace_binds (
+    prefix      varchar(20) UNIQUE not NULL,
+    uri         text,
+    PRIMARY KEY (prefix))"""
+
+# The indexes of the tables of the SQLite store: (table, index name suffix,
+# indexed columns) triples
+INDEXES = [
+    ('%s_asserted_statements', 'spc', 'subject, predicate, context'),
+    ('%s_asserted_statements', 'po', 'predicate, object'),
+    ('%s_asserted_statements', 'o', 'object'),
+    ('%s_asserted_statements', 'c', 'context'),
+    ('%s_type_statements', 'mc', 'member, context'),
+    ('%s_type_statements', 'k', 'klass'),
+    ('%s_type_statements', 'c', 'context'),
+    ('%s_literal_statements', 'spc', 'subject, predicate, context'),
+    ('%s_literal_statements', 'po', 'predicate, object'),
+    ('%s_literal_statements', 'c', 'context'),
+    ('%s_quoted_statements', 'spc', 'subject, predicate, context'),
+    ('%s_quoted_statements', 'po', 'predicate, object'),
+    ('%s_quoted_statements', 'c', 'context'),
+    ('%s_namespace_binds', 'uri', 'uri'),
+    ('%s_statistics', 'kt', 'kind, term'),
+]
+
+# The unique keys of the partitions, which make the duplicate statements
+# skipped by INSERT OR IGNORE (they are kept during bulk loads). NULLs are
+# distinct from each other in a unique index, hence the coalesce()
+UNIQUE_INDEXES = [
+    ('%s_asserted_statements', 'spoc', 'subject, predicate, object, context'),
+    ('%s_type_statements', 'mkc', 'member, klass, context'),
+    ('%s_literal_statements', 'spoc',
+     "subject, predicate, object, context, coalesce(objLanguage, ''), "
+     "coalesce(objDatatype, '')"),
+    ('%s_quoted_statements', 'spoc',
+     "subject, predicate, coalesce(object, ''), context, "
+     "coalesce(objLanguage, ''), coalesce(objDatatype, '')"),
+]
+
+
+# A step of the plans of EXPLAIN QUERY PLAN reading a table: a full SCAN or
+# a SEARCH of a range of rows
+_PLAN_STEP = re.compile(
+    r'^(SCAN|SEARCH) (?:TABLE )?(\S+)(?: AS (\S+))?'
+    r'(?: USING (?:AUTOMATIC )?(?:PARTIAL )?(?:COVERING )?INDEX (\S+)'
+    r'| USING (?:INTEGER )?PRIMARY KEY)?')
+
+
+def regexp(expr, item):
+    """
+    The REGEXP function of the connections (``item REGEXP expr``)
+    """
+    if item is None:
+        return False
+    return re.compile(expr).match(item) is not None
+
+
+def _parameter(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    elif isinstance(value, unicode) and value.__class__ is not unicode:
+        return unicode(value)
+    return value
+
+
+class FormatCursor(sqlite3.Cursor):
+    """
+    A cursor taking statements with format (``%s``) parameter markers, and
+    utf-8 encoded strings as parameters, as the FOPLRelationalModel and
+    AbstractSQLStore hand them to the cursors of MySQLdb.
+    """
+
+    def execute(self, sql, parameters=None):
+        if parameters is None:
+            return sqlite3.Cursor.execute(self, sql)
+        return sqlite3.Cursor.execute(
+            self, self.connection.statement(sql),
+            [_parameter(value) for value in parameters])
+
+    def executemany(self, sql, seq_of_parameters):
+        return sqlite3.Cursor.executemany(
+            self, self.connection.statement(sql),
+            [[_parameter(value) for value in parameters]
+             for parameters in seq_of_parameters])
+
+
+class FormatConnection(sqlite3.Connection):
+    """
+    A connection whose cursors are :class:`FormatCursor`
+    """
+
+    def __init__(self, *args, **kwargs):
+        sqlite3.Connection.__init__(self, *args, **kwargs)
+        self.statements = LRUCache(STATEMENT_CACHE_SIZE)
+
+    def cursor(self, factory=FormatCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def statement(self, sql):
+        """
+        ``sql`` with its parameter markers rewritten for sqlite3
+        """
+        statement = self.statements.get(sql)
+        if statement is None:
+            statement = self.statements[sql] = \
+                convertParamstyle(sql, 'qmark')
+        return statement
+
+
+class SQLite(AbstractSQLStore):
+    """
+    SQLite implementation of AbstractSQLStore. The configuration string
+    given to ``open`` is the path of the database file (or ':memory:').
+    Several stores (with distinct identifiers) can share a database.
+    """
+    autocommit_default = False
+    insertCommand = 'INSERT OR IGNORE INTO'
+    # Each multi-row INSERT of a bulk load binds 7 parameters per row, and
+    # SQLite binds at most 999 (by default) per statement
+    bulkInsertRows = 100
+    # Journal mode and synchronous setting of the connections (with WAL
+    # journaling, NORMAL synchronization loses no data unless the machine
+    # itself crashes)
+    journalMode = 'WAL'
+    synchronous = 'NORMAL'
+    # Number of prepared statements sqlite3 keeps per connection
+    cachedStatements = 200
+
+    def __init__(self, identifier=None, configuration=None):
+        self.database = None
+        super(SQLite, self).__init__(identifier, configuration)
+
+    def connect(self, database=None):
+        """
+        Returns a new connection to the database of the store (or to
+        ``database``). A pool of them can be set up for a store shared by
+        several threads::
+
+            store.pool = ConnectionPool(store.connect)
+        """
+        if database is None:
+            database = self.database
+        connection = sqlite3.connect(
+            database, factory=FormatConnection,
+            cached_statements=self.cachedStatements,
+            # connections are handed over between threads by the pool
+            check_same_thread=False)
+        connection.create_function('regexp', 2, regexp)
+        connection.execute('PRAGMA journal_mode=%s' % self.journalMode)
+        connection.execute('PRAGMA synchronous=%s' % self.synchronous)
+        return connection
+
+    def tableNames(self):
+        """
+        The names of the tables of the store
+        """
+        return [prefix % self._internedId for prefix in table_name_prefixes
+               ] + [STATISTICS_TABLE % self._internedId]
+
+    def createStatements(self):
+        """
+        The statements creating the tables of the store (and their indexes)
+        """
+        return [statement % self._internedId for statement in [
+                    CREATE_ASSERTED_STATEMENTS_TABLE,
+                    CREATE_TYPE_STATEMENTS_TABLE,
+                    CREATE_LITERAL_STATEMENTS_TABLE,
+                    CREATE_QUOTED_STATEMENTS_TABLE,
+                    CREATE_NS_BINDS_TABLE,
+                    CREATE_STATISTICS_TABLE]] + [
+            "CREATE UNIQUE INDEX %s_%s ON %s (%s)" % (
+                table % self._internedId, suffix, table % self._internedId,
+                columns)
+            for table, suffix, columns in UNIQUE_INDEXES
+        ] + self.indexingStatements()
+
+    def open(self, configuration, create=True):
+        """
+        Opens the database ``configuration`` and returns VALID_STORE, or
+        NO_STORE if the tables of the store do not exist (they are created
+        if ``create`` is set), or CORRUPTED_STORE if only some of them do.
+        """
+        self.database = configuration
+        self._db = self.connect()
+        c = self._db.cursor()
+        c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing = set([row[0] for row in c.fetchall()])
+        tables = self.tableNames()
+        missing = [name for name in tables if name not in existing]
+        if not missing:
+            c.close()
+            return VALID_STORE
+        elif len(missing) < len(tables):
+            c.close()
+            return CORRUPTED_STORE
+        elif not create:
+            c.close()
+            return NO_STORE
+        for statement in self.createStatements():
+            c.execute(statement)
+        c.close()
+        self._db.commit()
+        return VALID_STORE
+
+    def destroy(self, configuration):
+        """
+        Drops the tables of the store from the database ``configuration``
+        """
+        if configuration is None or not os.path.exists(configuration):
+            return
+        db = self.connect(configuration)
+        c = db.cursor()
+        for name in self.tableNames():
+            c.execute("DROP TABLE IF EXISTS %s" % name)
+        c.close()
+        db.commit()
+        db.close()
+
+    def indexingStatements(self):
+        return ["CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)" % (
+                    table % self._internedId, suffix,
+                    table % self._internedId, columns)
+                for table, suffix, columns in INDEXES]
+
+    def removeIndexingStatements(self):
+        return ["DROP INDEX IF EXISTS %s_%s" % (table % self._internedId,
+                                                suffix)
+                for table, suffix, columns in INDEXES]
+
+    def explainQuery(self, cursor, query, params=None):
+        """
+        The plan of ``query``, read from the SCAN and SEARCH steps of
+        EXPLAIN QUERY PLAN (the tables are reported by their alias)
+        """
+        self.executeSQL(cursor, 'EXPLAIN QUERY PLAN ' + query, params)
+        plan = []
+        for row in cursor.fetchall():
+            match = _PLAN_STEP.match(row[-1])
+            if match is None:
+                continue
+            step, table, alias, index = match.groups()
+            if index is None and 'PRIMARY KEY' in row[-1]:
+                index = 'PRIMARY KEY'
+            plan.append((alias or table, index, step == 'SCAN'))
+        return plan
+
+    def _clause(self, column, term, tableName):
+        if tableName:
+            column = '%s.%s' % (tableName, column)
+        if isinstance(term, REGEXTerm):
+            return "regexp(%s, " + column + ")", [term]
+        elif isinstance(term, list):
+            clauseStrings = []
+            paramStrings = []
+            for item in term:
+                if isinstance(item, REGEXTerm):
+                    clauseStrings.append("regexp(%s, " + column + ")")
+                else:
+                    clauseStrings.append(column + "=%s")
+                paramStrings.append(self.normalizeTerm(item))
+            return '(' + ' or '.join(clauseStrings) + ')', paramStrings
+        elif term:
+            return column + "=%s", [term]
+        return None
+
+    def buildSubjClause(self, subject, tableName):
+        return self._clause('subject', subject, tableName)
+
+    def buildPredClause(self, predicate, tableName):
+        return self._clause('predicate', predicate, tableName)
+
+    def buildObjClause(self, obj, tableName):
+        return self._clause('object', obj, tableName)
+
+    def buildContextClause(self, context, tableName):
+        if context is not None:
+            context = self.normalizeTerm(context.identifier)
+        return self._clause('context', context, tableName)
+
+    def buildTypeMemberClause(self, subject, tableName):
+        return self._clause('member', subject, tableName)
+
+    def buildTypeClassClause(self, obj, tableName):
+        return self._clause('klass', obj, tableName)
+
+
+class SQLiteDialect(object):
+    """
+    The SQLite dialect of the tables of the FOPLRelationalModel (see
+    :class:`~rdfextras.store.FOPLRelationalModel.RelationalHash.Table`):
+    rows already in the tables are skipped by inserts (the hashes and
+    partitions have unique indexes), and the NULL datatypes and languages
+    of plain literals are indexed as empty strings.
+    """
+    insertCommand = 'INSERT OR IGNORE INTO'
+    insertIgnoresDuplicates = True
+    dropIndexSQL = 'DROP INDEX %(index)s'
+    addPrimaryKeySQL = \
+        'CREATE UNIQUE INDEX %(table)s_primaryKey ON %(table)s (%(columns)s)'
+    dropPrimaryKeySQL = 'DROP INDEX %(table)s_primaryKey'
+    unionParentheses = False
+    nullableKeyColumnSQL = "coalesce(%s, '')"
+
+
+class SQLiteIdentifierHash(SQLiteDialect, IdentifierHash):
+    pass
+
+
+class SQLiteLiteralHash(SQLiteDialect, LiteralHash):
+    pass
+
+
+class SQLiteAssociativeBox(SQLiteDialect, AssociativeBox):
+    pass
+
+
+class SQLiteNamedLiteralProperties(SQLiteDialect, NamedLiteralProperties):
+    pass
+
+
+class SQLiteNamedBinaryRelations(SQLiteDialect, NamedBinaryRelations):
+    pass
+
+
+class FOPLSQLite(SQLite):
+    """
+    SQLite implementation of the FOPL Relational Model as an rdflib Store:
+    the statements are kept in the AssociativeBox (rdf:type statements),
+    NamedLiteralProperties (statements with a literal object) and
+    NamedBinaryRelations (all the others) partitions, as the integer
+    half-MD5-hashes of their terms (held in the IdentifierHash and
+    LiteralHash tables). Quoted statements are kept with the others, their
+    context has the 'F' term type.
+
+    The basic graph patterns of SPARQL queries are each resolved by a single
+    query (see :meth:`batch_unify`) unless ``batch_unification`` is unset.
+
+    If ``decodeIds`` is set, the triple pattern queries select the ids of
+    the terms only (rather than joining the partitions with the hashes),
+    and the ids are decoded through the ``termDictionary`` of the store (a
+    TermDictionary of the ``termDictionarySize`` most recently used ids).
+
+    If ``parallelPartitions`` is set and the store has a ``pool``, the
+    partitions matching a triple pattern are queried concurrently, on
+    connections of the pool (see ParallelResolution): the statements the
+    connection of the calling thread has not committed yet are not seen,
+    and the database must be a file (each connection to ':memory:' opens a
+    database of its own).
+
+    The statements of the ``verticalPredicates`` (hot predicates, given to
+    the constructor or set on a subclass) are kept in partitions of their
+    own (see VerticalPartitions). The layout of a database is fixed once
+    its tables are created: a store opening it with other predicates finds
+    it corrupted.
+    """
+    # The hashes are stored as signed integers, which SQLite columns hold
+    useSignedInts = True
+    hashFieldType = 'BIGINT'
+    select_modifier = ''
+    can_cast_bigint = True
+    batch_unification = True
+    # The ids missing from the termDictionary are looked up while the rows
+    # are read, which a server side scanCursor may not allow
+    decodeIds = False
+    termDictionarySize = 100000
+    parallelPartitions = False
+    verticalPredicates = ()
+    # The partitions are counted by __len__ (and the hashes keep reference
+    # counts instead): there is no statistics table
+    statistics = False
+
+    def __init__(self, identifier=None, configuration=None,
+                 verticalPredicates=None):
+        super(FOPLSQLite, self).__init__(identifier)
+        if verticalPredicates is not None:
+            self.verticalPredicates = verticalPredicates
+        args = (self.useSignedInts, self.hashFieldType, '', True)
+        self.idHash = SQLiteIdentifierHash(self._internedId, *args)
+        self.valueHash = SQLiteLiteralHash(self._internedId, *args)
+        self.binaryRelations = SQLiteNamedBinaryRelations(
+            self._internedId, self.idHash, self.valueHash, self, *args)
+        self.literalProperties = SQLiteNamedLiteralProperties(
+            self._internedId, self.idHash, self.valueHash, self, *args)
+        self.aboxAssertions = SQLiteAssociativeBox(
+            self._internedId, self.idHash, self.valueHash, self, *args)
+        self.verticalPartitions = VerticalPartitions(
+            self._internedId, self.idHash, self.valueHash, self,
+            self.verticalPredicates, *args,
+            **{'literalClass': SQLiteNamedLiteralProperties,
+               'relationsClass': SQLiteNamedBinaryRelations})
+        self.hashes = [self.idHash, self.valueHash]
+        # the literal properties come first in the UNION queries
+        self.partitions = [self.literalProperties] + [
+            self.verticalPartitions[predicate][0]
+            for predicate in self.verticalPredicates] + [
+            self.aboxAssertions, self.binaryRelations] + [
+            self.verticalPartitions[predicate][1]
+            for predicate in self.verticalPredicates]
+        self.tables = self.hashes + self.partitions
+        self.termDictionary = TermDictionary(self, self.termDictionarySize)
+        if configuration is not None:
+            self.open(configuration)
+
+    def tableNames(self):
+        return [str(table) for table in self.tables] + \
+               ['%s_namespace_binds' % self._internedId]
+
+    def createStatements(self):
+        statements = []
+        for table in self.tables:
+            statements.extend(table.createStatements())
+            statements.extend(table.indexingStatements())
+            statements.extend(table.defaultStatements())
+        statements.append(CREATE_NS_BINDS_TABLE % self._internedId)
+        statements.append("CREATE INDEX %s_namespace_binds_uri ON "
+                          "%s_namespace_binds (uri)" % (self._internedId,
+                                                        self._internedId))
+        return statements
+
+    # The unique indexes (the primary keys of the hashes and the index over
+    # the quads of each partition) are kept during bulk loads, as inserts
+    # rely on them to skip the rows already stored
+    def indexingStatements(self):
+        statements = []
+        for table in self.tables:
+            statements.extend(table.indexingStatements(unique=False))
+        return statements
+
+    def removeIndexingStatements(self):
+        statements = []
+        for table in self.tables:
+            statements.extend(table.removeIndexingStatements(unique=False))
+        return statements
+
+    def _partition(self, predicate, obj):
+        vertical = self.verticalPartitions.get(predicate)
+        if isinstance(obj, Literal):
+            if vertical is not None:
+                return vertical[0]
+            return self.literalProperties
+        elif predicate == RDF.type:
+            return self.aboxAssertions
+        elif vertical is not None:
+            return vertical[1]
+        return self.binaryRelations
+
+    def add(self, (subject, predicate, obj), context=None, quoted=False):
+        """ Add a triple to the store of triples. """
+        if not self._buffered((subject, predicate, obj, context)):
+            self.addN([(subject, predicate, obj, context)])
+
+    def addN(self, quads, dispatch=True):
+        c = self._db.cursor()
+        self._loadQuads(c, quads, dispatch)
+        c.close()
+
+    def _loadQuads(self, cursor, quads, dispatch=True):
+        partitions = []
+        quads = list(quads)
+        slots = genQuadSlotsN(quads, self.useSignedInts)
+        for idx in range(len(quads)):
+            subject, predicate, obj, context = quads[idx]
+            partition = self._partition(predicate, obj)
+            partition.insertRelations([slots[idx]])
+            if partition not in partitions:
+                partitions.append(partition)
+            if dispatch:
+                self.dispatcher.dispatch(TripleAddedEvent(
+                    triple=(subject, predicate, obj), context=context))
+        for partition in partitions:
+            partition.flushInsertions(self._db)
+
+    def remove(self, (subject, predicate, obj), context=None):
+        """
+        Remove a triple from the store (releasing the references of the
+        removed statements to the hashes). The statements of a context are
+        all removed by a DELETE per partition.
+        """
+        self.flush()
+        c = self._db.cursor()
+        if context is not None and subject is None and predicate is None \
+                and obj is None \
+                and not isinstance(context.identifier, REGEXTerm):
+            for partition in self.partitions:
+                partition.deleteContext(c, context)
+            c.close()
+            self.dispatcher.dispatch(TripleRemovedEvent(
+                triple=(subject, predicate, obj), context=context))
+            return
+        pattern = (subject, predicate, obj, context)
+        for partition in BinaryRelationPartitionCoverage(pattern,
+                                                         self.partitions):
+            whereClause, params = partition.generateWhereClause(pattern)
+            columns = [column for column, hash in
+                       partition.referenceColumns()]
+            self.executeSQL(
+                c, "SELECT %s.rowid, %s FROM %s %s WHERE %s" % (
+                    partition, ', '.join(['%s.%s' % (partition, column)
+                                          for column in columns]),
+                    partition, partition._intersectionSQL, whereClause),
+                params)
+            rows = c.fetchall()
+            if rows:
+                self.executeSQL(c, "DELETE FROM %s WHERE rowid = %%s" %
+                                partition, [row[:1] for row in rows],
+                                paramList=True)
+                partition.updateReferences(
+                    c, columns, [row[1:] for row in rows], -1)
+        c.close()
+        self.dispatcher.dispatch(TripleRemovedEvent(
+            triple=(subject, predicate, obj), context=context))
+
+    def _internContext(self, context):
+        # adds the identifier of the ``context`` graph to the identifier hash
+        self.idHash.updateIdentifierQueue([(context, term2Letter(context))])
+        self.idHash.insertIdentifiers(self._db)
+
+    def copyContext(self, source, target):
+        """
+        Adds the statements of the ``source`` graph to the ``target`` graph
+        by an INSERT ... SELECT per partition (see
+        BinaryRelationPartition.copyContext). Nothing is committed. The
+        events dispatched are those of AbstractSQLStore.copyContext.
+        """
+        if source.identifier == target.identifier:
+            raise ValueError("Cannot copy a context into itself")
+        self.flush()
+        self._internContext(target)
+        c = self._db.cursor()
+        for partition in self.partitions:
+            partition.copyContext(c, source, target)
+        c.close()
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(None, None, None), context=target))
+
+    def replaceContext(self, context, staging):
+        """
+        Replaces the statements of the ``context`` graph by those of the
+        ``staging`` graph (which is left empty), by a DELETE and an UPDATE
+        per partition: the terms of the statements staging and context have
+        in common keep their rows in the hashes. Nothing is committed. The
+        events dispatched are those of AbstractSQLStore.replaceContext.
+        """
+        if context.identifier == staging.identifier:
+            raise ValueError("Cannot replace a context by itself")
+        self.flush()
+        c = self._db.cursor()
+        for partition in self.partitions:
+            partition.deleteContext(c, context)
+        self._internContext(context)
+        for partition in self.partitions:
+            partition.renameContext(c, staging, context)
+        c.close()
+        for graph in (context, staging):
+            self.dispatcher.dispatch(TripleRemovedEvent(
+                triple=(None, None, None), context=graph))
+        self.dispatcher.dispatch(TripleAddedEvent(
+            triple=(None, None, None), context=context))
+
+    def triples(self, (subject, predicate, obj), context=None):
+        """
+        A generator over all the triples matching the pattern, resolved by a
+        single UNION query over the relevant partitions (see
+        PatternResolutionQuery)
+        """
+        self.flush()
+        pattern = (subject, predicate, obj, context)
+        shape = patternShape(subject, predicate, obj, context)
+        # the rows are only sorted (so that the contexts of a triple come
+        # together) when the pattern spans several contexts
+        queries = []
+        if self.parallelPartitions and self.pool is not None:
+            queries = PatternResolutionQueries(
+                pattern, self.partitions, orderByTriple=context is None,
+                select_modifier=self.select_modifier,
+                idsOnly=self.decodeIds)
+        if len(queries) > 1:
+            if self.analyzeQueries:
+                for query, params in queries:
+                    self._analyzeQuery(query, params, shape)
+            c = ParallelResolution(queries, self.pool, context is None,
+                                   fetchSize=self.fetchSize)
+        else:
+            c = self.scanCursor()
+            query, params = PatternResolutionQuery(
+                pattern, self.partitions, orderByTriple=context is None,
+                select_modifier=self.select_modifier,
+                idsOnly=self.decodeIds)
+            if self.analyzeQueries:
+                self._analyzeQuery(query, params, shape)
+            self.executeSQL(c, query, params)
+        decodeBatch = self.decodeIds and self._decodeIdBatch or None
+        for triple, contexts in self._decodeRows(c, context, decodeBatch):
+            yield triple, iter(contexts)
+        c.close()
+
+    def _decodeIdBatch(self, rows):
+        # decodes a batch of rows of ids (see PatternResolutionQuery) with
+        # the termDictionary, which looks up the ids it is missing at once
+        identifiers = set()
+        values = set()
+        for subject, subjTerm, predicate, predTerm, obj, objTerm, \
+                rtContext, ctxTerm, objDatatype, objLanguage in rows:
+            identifiers.add(subject)
+            identifiers.add(predicate)
+            identifiers.add(rtContext)
+            if objTerm == 'L':
+                values.add(obj)
+                if objDatatype is not None:
+                    identifiers.add(objDatatype)
+            else:
+                identifiers.add(obj)
+        db = self._readDb
+        terms = self.termDictionary.terms(db, identifiers)
+        lexicals = self.termDictionary.lexicals(db, values)
+        decoded = []
+        for subject, subjTerm, predicate, predTerm, obj, objTerm, \
+                rtContext, ctxTerm, objDatatype, objLanguage in rows:
+            if objTerm == 'L':
+                if objDatatype is not None:
+                    objDatatype = terms[objDatatype]
+                obj = createTerm(lexicals[obj], 'L', self,
+                                 objLanguage, objDatatype)
+            else:
+                obj = terms[obj]
+            context = terms[rtContext]
+            if ctxTerm == 'F':
+                context = context.identifier
+            decoded.append(((terms[subject], terms[predicate], obj),
+                            ctxTerm, context))
+        return decoded
+
+    def batch_unify(self, patterns, filters=()):
+        """
+        A generator over the solutions (dictionaries binding each variable
+        of ``patterns`` to a term) of a basic graph pattern: a list of quad
+        patterns whose terms are ground or variables (a context of None
+        stands for any asserted context), resolved by a single join (see
+        BGPResolutionQuery). ``filters`` (in the simpleFilter form of
+        :mod:`rdfextras.sparql.evaluate`) narrow the solutions down.
+        """
+        self.flush()
+        query, params, variables = BGPResolutionQuery(
+            patterns, self.partitions, filters)
+        if query is None:
+            return
+        if self.analyzeQueries:
+            self._analyzeQuery(query, params, ' '.join(
+                [patternShape(*pattern) for pattern in patterns]))
+        c = self.scanCursor()
+        self.executeSQL(c, query, params)
+        rows = c.fetchmany(self.fetchSize)
+        while rows:
+            for row in rows:
+                bindings = {}
+                for idx in range(len(variables)):
+                    lexical, termType, datatype, language = \
+                        row[4 * idx:4 * idx + 4]
+                    bindings[variables[idx]] = createTerm(
+                        lexical, termType, self, language, datatype)
+                yield bindings
+            rows = c.fetchmany(self.fetchSize)
+        c.close()
+
+    def __len__(self, context=None):
+        """ Number of statements in the store. """
+        self.flush()
+        c = self._readDb.cursor()
+        total = 0
+        for partition in self.partitions:
+            whereClause, params = partition.generateWhereClause(
+                (None, None, None, context))
+            self.executeSQL(c, "SELECT count(*) FROM %s WHERE %s" % (
+                partition, whereClause), params)
+            total += c.fetchall()[0][0]
+        c.close()
+        return total
+
+    def contexts(self, triple=None):
+        if triple is None:
+            triple = (None, None, None)
+        subject, predicate, obj = triple
+        self.flush()
+        c = self._readDb.cursor()
+        query, params = PatternResolutionQuery(
+            (subject, predicate, obj, None), self.partitions,
+            fetchContexts=True)
+        self.executeSQL(c, query, params)
+        rows = set(c.fetchall())
+        c.close()
+        for identifier, termType in rows:
+            graphKlass, idKlass = constructGraph(termType)
+            yield graphKlass(self, idKlass(identifier))
+
+    def __repr__(self):
+        c = self._readDb.cursor()
+        # literal properties, classifications and other relations
+        counts = [0, 0, 0]
+        for partition in self.partitions:
+            c.execute("SELECT count(*) FROM %s" % partition)
+            kind = partition.literalTable and 0 or \
+                partition.objectPropertyTable and 2 or 1
+            counts[kind] += c.fetchall()[0][0]
+        c.close()
+        return "<FOPL SQLite Store: %s property/value assertions, " \
+               "%s classification assertions and %s other assertions>" % \
+               tuple(counts)
+
+    def rebuildStatistics(self):
+        """
+        Does nothing: the FOPL SQLite store keeps no statistics (see
+        recountReferences for the consistency check of its hashes)
+        """
+        pass
+
+    def recountReferences(self):
+        """
+        Recounts the references to the rows of the hashes from scratch, and
+        purges the rows left unreferenced: an offline consistency check of
+        the reference counts kept up to date as statements are added and
+        removed.
+        """
+        self.flush()
+        c = self._db.cursor()
+        for statement in ReferenceCountQUERY(self.idHash, self.valueHash,
+                                             self.partitions):
+            self.executeSQL(c, statement)
+        c.close()
@@ -2,3 +2,4 @@ import pathutils
 import cmdlineutils
 import termutils
 import graphutils
+import lrucache
@@ -0,0 +1,156 @@
+"""
+A bounded mapping which discards its least recently used entries.
+
+Used to intern RDF terms (and other values which are expensive to construct
+but repeat a lot) without letting the cache grow for the life of the
+process.
+
+>>> from rdfextras.utils.lrucache import LRUCache
+>>> cache = LRUCache(2)
+>>> cache['a'] = 1
+>>> cache['b'] = 2
+>>> cache.get('a')
+1
+>>> cache['c'] = 3
+>>> 'b' in cache
+False
+>>> sorted(cache.keys())
+['a', 'c']
+>>> cache.hits, cache.misses
+(1, 0)
+
+"""
+
+__all__ = ['LRUCache']
+
+_PREV, _NEXT, _KEY, _VALUE, _SIZE = 0, 1, 2, 3, 4
+
+
+class LRUCache(object):
+    """
+    A dictionary-like container holding at most ``maxsize`` entries.
+
+    Reading an entry (with :meth:`get` or item access) marks it as recently
+    used; once the cache is full, adding an entry evicts the one used least
+    recently. The ``hits`` and ``misses`` counters record the outcome of the
+    lookups made with :meth:`get`.
+
+    If a ``sizeof`` callable is given, it is called with the key and value of
+    every new entry and ``maxsize`` bounds the sum of the returned sizes
+    (a memory budget in bytes, for instance) instead of the number of
+    entries. The current total is available as ``size``.
+
+    If an ``expired`` callable is given, :meth:`get` calls it with the key
+    and value of the entry found, and discards the entry (counting a miss)
+    if it returns true.
+
+    >>> cache = LRUCache(10, sizeof=lambda key, value: len(value))
+    >>> cache['a'] = 'xxxx'
+    >>> cache['b'] = 'yyyyyy'
+    >>> cache.size
+    10
+    >>> cache['c'] = 'z'
+    >>> 'a' in cache, cache.size
+    (False, 7)
+    """
+
+    def __init__(self, maxsize=10000, sizeof=None, expired=None):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.expired = expired
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._map = {}
+        # circular doubly linked list of [prev, next, key, value, size]
+        # links, most recently used first
+        self._root = root = []
+        root[:] = [root, root, None, None, 0]
+
+    def _moveToFront(self, link):
+        root = self._root
+        prev, next = link[_PREV], link[_NEXT]
+        prev[_NEXT] = next
+        next[_PREV] = prev
+        first = root[_NEXT]
+        link[_PREV] = root
+        link[_NEXT] = first
+        first[_PREV] = link
+        root[_NEXT] = link
+
+    def _unlink(self, link):
+        prev, next = link[_PREV], link[_NEXT]
+        prev[_NEXT] = next
+        next[_PREV] = prev
+        del self._map[link[_KEY]]
+        self.size -= link[_SIZE]
+
+    def get(self, key, default=None):
+        link = self._map.get(key)
+        if link is not None and self.expired is not None and \
+                self.expired(key, link[_VALUE]):
+            self._unlink(link)
+            link = None
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._moveToFront(link)
+        return link[_VALUE]
+
+    def __getitem__(self, key):
+        link = self._map[key]
+        self._moveToFront(link)
+        return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        if self.sizeof is None:
+            size = 1
+        else:
+            size = self.sizeof(key, value)
+        link = self._map.get(key)
+        if link is not None:
+            self.size += size - link[_SIZE]
+            link[_VALUE] = value
+            link[_SIZE] = size
+            self._moveToFront(link)
+        else:
+            root = self._root
+            first = root[_NEXT]
+            link = [root, first, key, value, size]
+            first[_PREV] = link
+            root[_NEXT] = link
+            self._map[key] = link
+            self.size += size
+        root = self._root
+        while self.size > self.maxsize and self._map:
+            self._unlink(root[_PREV])
+
+    def __delitem__(self, key):
+        self._unlink(self._map[key])
+
+    def pop(self, key, default=None):
+        link = self._map.get(key)
+        if link is None:
+            return default
+        self._unlink(link)
+        return link[_VALUE]
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def __len__(self):
+        return len(self._map)
+
+    def keys(self):
+        return self._map.keys()
+
+    def clear(self):
+        self._map.clear()
+        self.size = 0
+        root = self._root
+        root[:] = [root, root, None, None, 0]
+
+    def __repr__(self):
+        return "<LRUCache: %s entries, size %s of %s, %s hits, %s misses>" % (
+            len(self._map), self.size, self.maxsize, self.hits, self.misses)
@@ -100,7 +100,8 @@ def normalizeGraph(graph):
 
 @format_doctest_out
 def term2Letter(term):
-    """Relate a given term to one of several key types: 
+    """Relate a given term to one of several key types (looked up by the
+    class of the term once it is known, except for graphs): 
      
     * :class:`~rdflib.term.BNode`, 
     * :class:`~rdflib.term.Literal`, 
@@ -135,6 +136,18 @@ def term2Letter(term):
     's'
     
     """
+    letter = _termLetters.get(term.__class__)
+    if letter is None:
+        letter = _term2Letter(term)
+        # the letter of a graph is that of its identifier
+        if not isinstance(term, Graph) or isinstance(term, QuotedGraph):
+            _termLetters[term.__class__] = letter
+    return letter
+
+# The letters of the classes of terms seen by term2Letter
+_termLetters = {}
+
+def _term2Letter(term):
     if isinstance(term,URIRef):
         return 'U'
     elif isinstance(term,BNode):
@@ -93,6 +93,10 @@ config.update(
             'rdf2dot = rdfextras.tools.rdf2dot:main',
             'rdfs2dot = rdfextras.tools.rdfs2dot:main',
         ],
+        'rdf.plugins.store': [
+            'SQLite = rdfextras.store.SQLite:SQLite',
+            'FOPLSQLite = rdfextras.store.SQLite:FOPLSQLite',
+        ],
         'rdf.plugins.queryprocessor': [
             'sparql = rdfextras.sparql.processor:Processor',
         ],
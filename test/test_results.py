@@ -143,6 +143,23 @@ class TestSparqlResultsFormats(unittest.TestCase):
 """
         self._test(jsonres,"json")
 
+    def testRepeatedTermsAreShared(self):
+        jsonres=u"""{
+   "head": { "vars": [ "s", "type" ] },
+   "results": {
+       "bindings": [
+           { "s": { "type": "uri", "value": "http://example.org/a" },
+             "type": { "type": "uri", "value": "http://example.org/T" } },
+           { "s": { "type": "uri", "value": "http://example.org/b" },
+             "type": { "type": "uri", "value": "http://example.org/T" } }
+       ]
+   }
+}"""
+        r = rdflib.query.Result.parse(StringIO(jsonres), format="json")
+        first, second = r.bindings
+        var = [v for v in first if v == 'type'][0]
+        self.assert_(first[var] is second[var])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,7 +3,9 @@ from StringIO import StringIO
 import unittest
 
 import rdflib
+from nose.exc import SkipTest
 
+from rdfextras.sparql.results import jsonlayer
 
 
 # json is only available as of python2.6, but simplejson is available 
@@ -124,7 +126,47 @@ class TestSparqlJsonResults(unittest.TestCase):
     testSelectVars = make_method('select_vars')
     
     testWildcardVars = make_method('wildcard_vars')
-    
+
+
+class TestJsonLayerDump(unittest.TestCase):
+
+    doc = {u'head': {u'vars': [u'x']}, u'results': {u'bindings': [
+        {u'x': {u'type': u'literal', u'value': u'caf\xe9 \u2603'}},
+        {u'x': {u'type': u'uri', u'value': u'http://example.org/a'}}]},
+        u'score': 1.123456789012345}
+
+    def tearDown(self):
+        jsonlayer.use()
+
+    def _check(self, module):
+        try:
+            __import__(module)
+        except ImportError:
+            raise SkipTest("%s is not installed" % module)
+        jsonlayer.use(module)
+        for encoding in ('utf-8', 'latin-1', 'utf-16', None):
+            stream = StringIO()
+            jsonlayer.dump(self.doc, stream, encoding)
+            data = stream.getvalue()
+            if encoding is not None:
+                data = data.decode(encoding)
+            self.assertEquals(json.loads(data), self.doc)
+            self.failIf('\\/' in data)
+        self.assertEquals(json.loads(jsonlayer.encode(self.doc)), self.doc)
+        for value in (float('nan'), float('inf')):
+            self.assertRaises(ValueError, jsonlayer.encode, [value])
+            self.assertRaises(ValueError, jsonlayer.dump, [value],
+                              StringIO(), 'utf-8')
+
+    def testStdlib(self):
+        self._check('json')
+
+    def testSimplejson(self):
+        self._check('simplejson')
+
+    def testUjson(self):
+        self._check('ujson')
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,109 @@
+import unittest
+
+from nose.exc import SkipTest
+
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.namespace import XSD
+from rdfextras.sparql.query import SPARQLQueryResult
+
+a = URIRef('http://example.org/a')
+b = URIRef('http://example.org/b')
+x = Variable('x')
+y = Variable('y')
+
+
+class SPARQLQueryResultTest(unittest.TestCase):
+
+    def _result(self, rows, vars=[x, y]):
+        return SPARQLQueryResult((rows, vars, vars, None, False, []))
+
+    def testTuplesAreNotCopiedIntoDictionaries(self):
+        r = self._result([(a, Literal(1)), (b, None)])
+        self.assertEquals(len(r), 2)
+        self.assertEquals(r._bindings, None)
+        self.assertEquals(list(r), [(a, Literal(1)), (b, None)])
+        self.assertEquals(r._bindings, None)
+
+    def testAllNoneRowsAreSkipped(self):
+        r = self._result([(None, None), (a, None), (None, None)])
+        self.assertEquals(len(r), 1)
+        self.assertEquals(r.bindings, [{x: a, y: None}])
+
+    def testSingleVariable(self):
+        r = self._result([a, None, b], vars=[x])
+        self.assertEquals(list(r), [(a,), (b,)])
+        self.assertEquals(r.bindings, [{x: a}, {x: b}])
+
+    def testIteratorSource(self):
+        r = self._result(iter([(a, b), (b, a)]))
+        self.assertEquals(list(r), [(a, b), (b, a)])
+        # consumed rows are kept, so the result can be iterated again
+        self.assertEquals(list(r), [(a, b), (b, a)])
+        self.assertEquals(len(r), 2)
+
+    def testSerializeFromTuples(self):
+        r = self._result([(a, None)])
+        xml = r.serialize(format='xml')
+        self.assert_('http://example.org/a' in xml)
+        self.assertEquals(r._bindings, None)
+
+    def testColumns(self):
+        c = BNode()
+        r = self._result([(a, Literal(1)), (c, Literal(2.5)),
+                          (a, None), (None, Literal('x'))])
+        columns = r.to_columns()
+        self.assertEquals(list(columns['x']), [a, c, a, None])
+        self.assertEquals(columns['x'].categories, [a, c])
+        self.assertEquals(list(columns['x'].codes), [0, 1, 0, -1])
+        # a plain literal keeps the column as terms
+        self.assertEquals(columns['y'], [Literal(1), Literal(2.5), None,
+                                         Literal('x')])
+        self.assertEquals(r._bindings, None)
+
+    def testNumericColumns(self):
+        r = self._result([(Literal(1), Literal('2', datatype=XSD.decimal)),
+                          (Literal(0), None)])
+        columns = r.to_columns()
+        self.assertEquals(list(columns['x']), [1, 0])
+        first, unbound = list(columns['y'])
+        self.assertEquals(first, 2.0)
+        # None, or NaN with NumPy
+        self.assert_(unbound is None or unbound != unbound)
+
+    def testIllTypedNumericColumns(self):
+        ill = Literal('abc', datatype=XSD.integer)
+        r = self._result([(ill, Literal('1.5', datatype=XSD.double)),
+                          (Literal(1), Literal('x', datatype=XSD.double))])
+        columns = r.to_columns()
+        self.assertEquals(columns['x'], [ill, Literal(1)])
+        self.assertEquals(columns['y'], [Literal('1.5', datatype=XSD.double),
+                                         Literal('x', datatype=XSD.double)])
+
+    def testLargeIntegerColumns(self):
+        large = 99999999999999999999
+        r = self._result([(Literal(str(large), datatype=XSD.integer),
+                           Literal(str(10 ** 400), datatype=XSD.integer)),
+                          (Literal(1), None)])
+        columns = r.to_columns()
+        self.assertEquals(list(columns['x']), [large, 1])
+        first, unbound = list(columns['y'])
+        self.assertEquals(first, 10 ** 400)
+        self.assert_(unbound is None)
+
+    def testEmptyColumns(self):
+        self.assertEquals(self._result([]).to_columns(), {'x': [], 'y': []})
+
+    def testDataFrame(self):
+        try:
+            import pandas
+        except ImportError:
+            raise SkipTest("pandas is not installed")
+        r = self._result([(a, Literal(1)), (b, Literal(2)), (a, Literal(3))])
+        df = r.to_dataframe()
+        self.assertEquals(list(df.columns), ['x', 'y'])
+        self.assertEquals(list(df['x']), [a, b, a])
+        self.assertEquals(list(df['y']), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
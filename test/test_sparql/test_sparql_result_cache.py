@@ -0,0 +1,98 @@
+import gc
+import unittest
+import weakref
+
+from rdflib import ConjunctiveGraph, Graph, Literal, URIRef
+from rdfextras.sparql.resultcache import disableResultCache
+from rdfextras.sparql.resultcache import enableResultCache
+
+a = URIRef('http://example.org/a')
+b = URIRef('http://example.org/b')
+p = URIRef('http://example.org/p')
+
+query = 'SELECT ?s ?o WHERE { ?s <http://example.org/p> ?o }'
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = ConjunctiveGraph()
+        self.graph.add((a, p, Literal(1)))
+        self.cache = enableResultCache(self.graph.store)
+
+    def tearDown(self):
+        disableResultCache(self.graph.store)
+
+    def testHit(self):
+        first = list(self.graph.query(query))
+        second = list(self.graph.query(
+            query.replace(' ', '\n  ') + ' # same query'))
+        self.assertEquals(first, [(a, Literal(1))])
+        self.assertEquals(second, first)
+        self.assertEquals((self.cache.hits, self.cache.misses), (1, 1))
+
+    def testChangesInvalidate(self):
+        self.assertEquals(len(self.graph.query(query)), 1)
+        self.graph.add((b, p, Literal(2)))
+        self.assertEquals(len(self.graph.query(query)), 2)
+        self.graph.remove((a, p, None))
+        self.assertEquals(list(self.graph.query(query)), [(b, Literal(2))])
+        self.assertEquals(self.cache.hits, 0)
+
+    def testBindingsArePartOfTheKey(self):
+        self.graph.add((b, p, Literal(2)))
+        r = self.graph.query(query, initBindings={'s': a})
+        self.assertEquals(list(r), [(a, Literal(1))])
+        r = self.graph.query(query, initBindings={'s': b})
+        self.assertEquals(list(r), [(b, Literal(2))])
+
+    def testGraphIsPartOfTheKey(self):
+        other = Graph(self.graph.store, URIRef('http://example.org/g'))
+        self.assertEquals(len(self.graph.query(query)), 1)
+        self.assertEquals(len(other.query(query)), 0)
+
+    def testAsk(self):
+        ask = 'ASK { ?s <http://example.org/p> 1 }'
+        self.assertEquals(self.graph.query(ask).askAnswer, True)
+        self.assertEquals(self.graph.query(ask).askAnswer, True)
+        self.assertEquals(self.cache.hits, 1)
+
+    def testCompactAndTTL(self):
+        disableResultCache(self.graph.store)
+        self.cache = enableResultCache(self.graph.store, ttl=0, compact=True)
+        self.assertEquals(len(self.graph.query(query)), 1)
+        self.assertEquals(list(self.graph.query(query)), [(a, Literal(1))])
+        self.assertEquals(self.cache.hits, 0)
+
+    def testDisableDetachesTheCache(self):
+        handlers = dict([(eventType, list(handlers)) for eventType, handlers
+                         in self.graph.store.dispatcher._dispatch_map.items()])
+        cache = weakref.ref(self.cache)
+        del self.cache
+        for i in range(3):
+            disableResultCache(self.graph.store)
+            self.cache = enableResultCache(self.graph.store)
+        gc.collect()
+        self.assert_(cache() is None)
+        self.assertEquals(self.graph.store.dispatcher._dispatch_map, handlers)
+        self.assertEquals(len(self.graph.query(query)), 1)
+        self.graph.add((b, p, Literal(2)))
+        self.assertEquals(len(self.graph.query(query)), 2)
+
+    def testExpiredEntriesAreMisses(self):
+        disableResultCache(self.graph.store)
+        self.cache = enableResultCache(self.graph.store, ttl=0)
+        self.graph.query(query)
+        self.graph.query(query)
+        self.assertEquals((self.cache.hits, self.cache.misses), (0, 2))
+        self.assertEquals(len(self.cache), 1)
+
+    def testMemoryBudget(self):
+        disableResultCache(self.graph.store)
+        self.cache = enableResultCache(self.graph.store, maxBytes=1)
+        self.graph.query(query)
+        self.assertEquals(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
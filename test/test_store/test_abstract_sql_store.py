@@ -0,0 +1,315 @@
+import unittest
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import RDF
+from rdflib.namespace import XSD
+from rdfextras.store.AbstractSQLStore import AbstractSQLStore
+from rdfextras.store.AbstractSQLStore import createTerm
+from rdfextras.store.AbstractSQLStore import patternShape
+from rdfextras.store.AbstractSQLStore import queryAnalysis
+from rdfextras.store.AbstractSQLStore import unionSELECT
+from rdfextras.store.AbstractSQLStore import ASSERTED_NON_TYPE_PARTITION
+from rdfextras.store.AbstractSQLStore import TRIPLE_SELECT_NO_ORDER
+from rdfextras.store.AbstractSQLStore import writeDelimitedRows
+from rdfextras.utils.termutils import TERM_COMBINATIONS
+
+
+class FakeCursor(object):
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.batches = 0
+        self.executed = []
+        self.rowcount = 0
+
+    def execute(self, qStr, params=None):
+        self.executed.append((qStr, params))
+        # an INSERT adds its row, there is no row to UPDATE
+        self.rowcount = int(qStr.startswith('INSERT'))
+
+    def executemany(self, qStr, paramList):
+        self.executed.append((qStr, paramList))
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.batches += 1
+        return batch
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.cursors = []
+        self.commits = 0
+
+    def cursor(self):
+        cursor = FakeCursor()
+        self.cursors.append(cursor)
+        return cursor
+
+    def commit(self):
+        self.commits += 1
+
+    def executed(self):
+        return [statement for cursor in self.cursors
+                          for statement in cursor.executed]
+
+
+class CreateTermTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AbstractSQLStore('test')
+
+    def testLiteralsAreCached(self):
+        for lang, datatype in [(None, None), ('en', None),
+                               (None, XSD.integer)]:
+            first = createTerm(u'1', 'L', self.store, lang, datatype)
+            second = createTerm(u'1', 'L', self.store, lang, datatype)
+            self.assert_(first is second)
+            self.assertEquals(first, Literal(u'1', lang=lang,
+                                             datatype=datatype))
+        self.assertEquals(self.store.cacheHits, 3)
+        self.assertEquals(self.store.cacheMisses, 3)
+
+    def testTermTypesAreDistinct(self):
+        self.assertEquals(createTerm(u'x', 'U', self.store), URIRef(u'x'))
+        self.assertEquals(createTerm(u'x', 'B', self.store), BNode(u'x'))
+        self.assertEquals(createTerm(u'x', 'L', self.store), Literal(u'x'))
+        self.assertEquals(self.store.cacheHits, 0)
+
+    def testCacheIsBounded(self):
+        self.store.termCache.maxsize = 2000
+        for i in xrange(1000):
+            createTerm(u'http://example.org/%s' % i, 'U', self.store)
+        self.assert_(len(self.store.termCache) < 1000)
+        self.assert_(self.store.termCache.size <= 2000)
+        uri = u'http://example.org/999'
+        self.assert_(createTerm(uri, 'U', self.store) is
+                     createTerm(uri, 'U', self.store))
+
+
+class DecodeRowsTest(unittest.TestCase):
+
+    def testContextsAreGrouped(self):
+        store = AbstractSQLStore('test')
+        store.fetchSize = 2
+        uuuu = TERM_COMBINATIONS['UUUU']
+        uulu = TERM_COMBINATIONS['UULU']
+        rows = [(u'a', u'b', u'c', u'g1', uuuu, None, None),
+                (u'a', u'b', u'c', u'g2', uuuu, None, None),
+                (u'a', u'b', u'1', u'g1', uulu, None, XSD.integer)]
+        cursor = FakeCursor(rows)
+        result = list(store._decodeRows(cursor))
+        self.assertEquals(cursor.batches, 3)
+        self.assertEquals([triple for triple, contexts in result],
+                          [(URIRef(u'a'), URIRef(u'b'), URIRef(u'c')),
+                           (URIRef(u'a'), URIRef(u'b'), Literal(1))])
+        first, second = [contexts for triple, contexts in result]
+        self.assertEquals([g.identifier for g in first],
+                          [URIRef(u'g1'), URIRef(u'g2')])
+        # one graph per context
+        self.assert_(first[0] is second[0])
+
+
+class ExecuteSQLTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AbstractSQLStore('test')
+        self.cursor = FakeCursor()
+
+    def testBoundParameters(self):
+        self.store.paramstyle = 'qmark'
+        self.store.executeSQL(self.cursor, 'select * from t where a=%s',
+                              ['x'])
+        self.store.executeSQL(self.cursor, 'select * from t where a=%s',
+                              ['y'])
+        self.assertEquals(self.cursor.executed,
+                          [(u'select * from t where a=?', ('x',)),
+                           (u'select * from t where a=?', ('y',))])
+        self.assertEquals(len(self.store._statements), 1)
+
+    def testParameterList(self):
+        self.store.executeSQL(self.cursor, 'insert into t values (%s, %s)',
+                              [['a', None], ['b', 1]], paramList=True)
+        self.assertEquals(self.cursor.executed,
+                          [(u'insert into t values (%s, %s)',
+                            [('a', None), ('b', 1)])])
+
+    def testInPlace(self):
+        self.store.paramstyle = None
+        self.store.executeSQL(self.cursor, 'insert into t values (%s, %s)',
+                              [['a', None], ['b', 1]], paramList=True)
+        self.assertEquals(self.cursor.executed,
+                          [(u"insert into t values ('a', NULL)", None),
+                           (u"insert into t values ('b', 1)", None)])
+
+    def testLiteralInsertBindsNull(self):
+        cmd, params = self.store.buildLiteralTripleSQLCommand(
+            URIRef(u'a'), URIRef(u'b'), Literal(u"it's"),
+            Graph(identifier=URIRef(u'g')), 'kb')
+        self.assertEquals(params[2], "it's")
+        self.assertEquals(params[-2:], [None, None])
+
+
+class BuildInClauseTest(unittest.TestCase):
+
+    def testInClause(self):
+        store = AbstractSQLStore('test')
+        clause, params = store.buildClause(
+            'asserted', [URIRef(u'a'), URIRef(u'b')], None, None)
+        self.assertEquals(clause, 'where asserted.subject in (%s, %s)')
+        self.assertEquals(params, ['a', 'b'])
+
+    def testEmptyChoicesMatchNothing(self):
+        store = AbstractSQLStore('test')
+        self.assertEquals(list(store.triples_choices(
+            (URIRef(u'a'), [], None))), [])
+
+
+class UnionSELECTTest(unittest.TestCase):
+
+    selects = [('kb_asserted_statements', 'asserted', '',
+                ASSERTED_NON_TYPE_PARTITION)]
+
+    def testOrdered(self):
+        self.assert_(unionSELECT(self.selects).endswith(
+            'order by subject,predicate,object'))
+
+    def testUnordered(self):
+        q = unionSELECT(self.selects, selectType=TRIPLE_SELECT_NO_ORDER)
+        self.failIf('order by' in q)
+
+
+class BulkLoadTest(unittest.TestCase):
+
+    data = """@prefix ex: <http://example.org/> .
+ex:a a ex:C ; ex:p ex:b, ex:c ; ex:l "x", "y" .
+"""
+
+    def setUp(self):
+        self.store = AbstractSQLStore('test')
+        self.store.bulkInsertRows = 2
+        self.store._db = FakeConnection()
+
+    def testAutocommitIsTurnedOffOnce(self):
+        a, b = URIRef(u'a'), URIRef(u'b')
+        g = Graph(identifier=URIRef(u'g'))
+        self.store.add((a, b, a), g)
+        self.store.add((a, b, b), g)
+        self.assertEquals([q for q, params in self.store._db.executed()
+                           if 'AUTOCOMMIT' in q], ['SET AUTOCOMMIT=0'])
+
+    def testMultiRowInserts(self):
+        self.store.autocommit_default = False
+        count = self.store.load(data=self.data, format='n3',
+                                context=URIRef(u'http://example.org/g'))
+        self.assertEquals(count, 5)
+        self.assertEquals(self.store._db.commits, 1)
+        # the statements are loaded with the first cursor, namespace
+        # bindings are added with their own
+        inserts = [(q.split()[2], len(params))
+                   for q, params in self.store._db.cursors[0].executed]
+        self.assertEquals(inserts, [
+            ('kb_a94a8fe5cc_type_statements', 4),
+            ('kb_a94a8fe5cc_asserted_statements', 10),
+            ('kb_a94a8fe5cc_literal_statements', 14)])
+
+    def testIndexesAreRebuilt(self):
+        self.store.autocommit_default = False
+        self.store.removeIndexingStatements = lambda: ['DROP INDEX i']
+        self.store.indexingStatements = lambda: ['CREATE INDEX i']
+        self.store.load(data=self.data, format='n3',
+                        context=URIRef(u'http://example.org/g'))
+        executed = [q for q, params in self.store._db.cursors[0].executed]
+        self.assertEquals(executed[0], 'DROP INDEX i')
+        self.assertEquals(executed[-1], 'CREATE INDEX i')
+
+    def testDelimitedRows(self):
+        from StringIO import StringIO
+        stream = StringIO()
+        writeDelimitedRows([(u'\xe9\n', 'a\\b', None, 3)], stream)
+        self.assertEquals(stream.getvalue(),
+                          '\xc3\xa9\\n\ta\\\\b\t\\N\t3\n')
+
+
+class StatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = AbstractSQLStore('test')
+        self.store.autocommit_default = False
+        self.store.statistics = True
+        self.store._db = FakeConnection()
+
+    def testAddUpdatesCounts(self):
+        g = Graph(identifier=URIRef(u'g'))
+        self.store.add((URIRef(u'a'), RDF.type, URIRef(u'C')), g)
+        executed = self.store._db.cursors[0].executed
+        updates = sorted([tuple(params[1:]) for q, params in executed
+                          if q.startswith('UPDATE')])
+        self.assertEquals(updates, [('C', 'g'), ('K', 'C'),
+                                    ('P', str(RDF.type)), ('T', '')])
+        # no row to update (rowcount is 0), so they are inserted
+        inserts = [q for q, params in executed
+                   if q.startswith('INSERT INTO kb_a94a8fe5cc_statistics')]
+        self.assertEquals(len(inserts), 4)
+
+    def testLenReadsStatistics(self):
+        len(self.store)
+        self.assertEquals(self.store._db.executed(),
+            [('SELECT total FROM kb_a94a8fe5cc_statistics '
+              'WHERE kind = %s AND term = %s', ('T', ''))])
+
+
+class ServerSideStore(AbstractSQLStore):
+
+    def serverSideCursor(self, connection):
+        cursor = connection.cursor()
+        cursor.serverSide = True
+        return cursor
+
+
+class ScanCursorTest(unittest.TestCase):
+
+    def testServerSideCursors(self):
+        store = ServerSideStore('test')
+        store._db = FakeConnection()
+        self.failIf(hasattr(store.scanCursor(), 'serverSide'))
+        store.serverSideCursors = True
+        self.assert_(store.scanCursor().serverSide)
+
+
+class QueryAnalysisTest(unittest.TestCase):
+
+    def testMySQLPlans(self):
+        store = AbstractSQLStore('test')
+        cursor = FakeCursor([
+            (1, 'PRIMARY', 'literal', 'ref', 'spc', 'spc', 767, 'const', 2,
+             ''),
+            (2, 'UNION', 'asserted', 'ALL', None, None, None, None, 90,
+             'Using where'),
+            (None, 'UNION RESULT', '<union1,2>', 'ALL', None, None, None,
+             None, None, '')])
+        cursor.description = [(name,) for name in [
+            'id', 'select_type', 'table', 'type', 'possible_keys', 'key',
+            'key_len', 'ref', 'rows', 'Extra']]
+        shape = patternShape(URIRef(u'a'), None, None, None)
+        plan = queryAnalysis('select ...', store, cursor, [], shape)
+        self.assertEquals(plan, [('literal', 'spc', False),
+                                 ('asserted', None, True)])
+        self.assertEquals(store.queryOptMarks[('FULL SCAN', 'asserted')], 1)
+        self.assertEquals(store.queryPlans.fullScans(),
+                          [('s???', 'asserted', 1)])
+        self.assertEquals(store.queryPlans.report().splitlines(), [
+            's???: 1 queries, 1 full scans',
+            '    asserted: FULL SCAN (1)',
+            '    literal: index spc (1)'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import threading
+import unittest
+
+from rdfextras.store.AbstractSQLStore import AbstractSQLStore
+from rdfextras.store.ConnectionPool import ConnectionPool
+from rdfextras.store.ConnectionPool import PoolError
+
+
+class FakeConnection(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class Connector(object):
+
+    def __init__(self, name='primary'):
+        self.name = name
+        self.made = []
+
+    def __call__(self):
+        connection = FakeConnection(self.name)
+        self.made.append(connection)
+        return connection
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def testThreadsHaveTheirOwnConnection(self):
+        pool = ConnectionPool(Connector())
+        connections = []
+
+        def work():
+            connections.append((pool.connection(), pool.connection()))
+            pool.releaseConnection()
+        main = pool.connection()
+        threads = [threading.Thread(target=work) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # each thread gets the same connection until it releases it
+        for first, second in connections:
+            self.assert_(first is second)
+            self.failIf(first is main)
+        self.assertEquals(pool.opened, pool.idle + 1)
+
+    def testIdleConnectionsAreChecked(self):
+        connect = Connector()
+        pool = ConnectionPool(connect, checkInterval=-1,
+                              healthCheck=lambda connection: False)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        self.failIf(first is second)
+        self.assert_(first.closed)
+        self.assertEquals(pool.opened, 1)
+
+    def testSizeBoundsIdleConnections(self):
+        pool = ConnectionPool(Connector(), size=1)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        self.assertEquals(pool.idle, 1)
+        self.assert_(second.closed)
+
+    def testMaxConnections(self):
+        pool = ConnectionPool(Connector(), maxConnections=1, timeout=0.01)
+        connection = pool.acquire()
+        self.assertRaises(PoolError, pool.acquire)
+        pool.release(connection)
+        self.assert_(pool.acquire() is connection)
+
+    def testReplicas(self):
+        pool = ConnectionPool(Connector(),
+                              replicas=[Connector('r1'), Connector('r2')])
+        self.assertEquals(pool.readConnection().name, 'r1')
+        self.assertEquals(pool.connection().name, 'primary')
+        pool.releaseConnection()
+        self.assertEquals(pool.replicas[0].idle, 1)
+        pool.close()
+        self.assertRaises(PoolError, pool.acquire)
+        self.assertRaises(PoolError, pool.replicas[0].acquire)
+
+
+class PooledStoreTest(unittest.TestCase):
+
+    def testStoreUsesThreadConnection(self):
+        store = AbstractSQLStore('test')
+        store.pool = ConnectionPool(Connector(),
+                                    replicas=[Connector('replica')])
+        self.assertEquals(store._db.name, 'primary')
+        self.assertEquals(store._readDb.name, 'replica')
+        other = []
+        thread = threading.Thread(target=lambda: other.append(store._db))
+        thread.start()
+        thread.join()
+        self.failIf(other[0] is store._db)
+        store.close()
+        self.assert_(store.pool.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
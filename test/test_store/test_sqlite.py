@@ -0,0 +1,570 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import unittest
+from itertools import islice
+from tempfile import mkstemp
+
+from rdflib import ConjunctiveGraph
+from rdflib import Graph
+from rdflib import Literal
+from rdflib import RDF
+from rdflib import URIRef
+from rdflib.graph import QuotedGraph
+from rdflib.store import NO_STORE, VALID_STORE
+
+from rdfextras.sparql.resultcache import disableResultCache
+from rdfextras.sparql.resultcache import enableResultCache
+from rdfextras.store.ConnectionPool import ConnectionPool
+from rdfextras.store.FOPLRelationalModel import RelationalHash
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    BinaryRelationPartitionCoverage
+from rdfextras.store.FOPLRelationalModel.BinaryRelationPartition import \
+    ParallelResolution
+from rdfextras.store.REGEXMatching import REGEXTerm
+from rdfextras.store.SQLite import SQLite, FOPLSQLite
+
+import test_context
+import test_graph
+
+michel = URIRef(u'michel')
+likes = URIRef(u'likes')
+name = URIRef(u'name')
+person = URIRef(u'person')
+c1 = URIRef(u'context-1')
+
+n3doc = u"""@prefix : <http://example.org/> .
+
+:a :b :c ; :d "e" , "é"@fr ; a :f .
+"""
+
+bgpdoc = u"""@prefix : <http://example.org/> .
+
+:a :name "Alice" ; :knows :b , :c ; a :Person ; :age 30 .
+:b :name "Bob"@en ; :knows :c ; a :Person .
+:c :name "Carol" ; a :Robot ; :knows [ :name "Dan" ] .
+"""
+
+bgpqueries = [
+    "SELECT ?x ?y ?n WHERE { ?x :knows ?y . ?y :name ?n }",
+    "SELECT ?x ?n WHERE { ?x a :Person ; :name ?n }",
+    "SELECT ?x WHERE { ?x :name 'Bob'@en }",
+    "SELECT ?n WHERE { ?x :knows [ :name ?n ] }",
+    "SELECT ?x ?p ?o WHERE { ?x ?p ?o . FILTER(isLiteral(?o)) }",
+    "SELECT ?x ?y WHERE { ?x :knows ?y . "
+    "FILTER(?y != <http://example.org/c> && !isBlank(?y)) }",
+    "SELECT ?g ?x WHERE { GRAPH ?g { ?x a :Robot } }",
+    "SELECT ?x ?c ?a WHERE { ?x a ?c . OPTIONAL { ?x :age ?a } }",
+]
+
+
+class IdDecodingFOPLSQLite(FOPLSQLite):
+    decodeIds = True
+
+
+class VerticalFOPLSQLite(FOPLSQLite):
+    verticalPredicates = [likes, URIRef(u'http://example.org/knows'),
+                          URIRef(u'http://example.org/name')]
+
+
+class WriteBehindSQLite(SQLite):
+    writeBehindSize = 100
+
+
+class WriteBehindFOPLSQLite(FOPLSQLite):
+    writeBehindSize = 100
+
+
+class SQLiteMixin:
+    store_class = SQLite
+
+    def setUp(self):
+        fd, self.path = mkstemp(prefix='test', suffix='.sqlite')
+        os.close(fd)
+        self.store = self.store_class('test')
+        self.assertEquals(self.store.open(self.path), VALID_STORE)
+        self.graph = self.graph_class(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        for path in [self.path, self.path + '-wal', self.path + '-shm']:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SQLiteGraphTestCase(SQLiteMixin, test_graph.GraphTestCase):
+    graph_class = Graph
+
+
+class SQLiteContextTestCase(SQLiteMixin, test_context.ContextTestCase):
+    graph_class = ConjunctiveGraph
+
+    # The SQL stores count a statement once per context it is in
+
+    def testConjunction(self):
+        self.addStuffInMultipleContexts()
+        graph = Graph(self.graph.store, self.c1)
+        graph.add((self.pizza, self.likes, self.pizza))
+        self.assertEquals(len(graph), 2)
+        self.assertEquals(len(self.graph), 4)
+
+    def testLenInMultipleContexts(self):
+        self.addStuffInMultipleContexts()
+        self.assertEquals(len(self.graph), 3)
+        self.assertEquals(len(Graph(self.graph.store, self.c1)), 1)
+
+
+class FOPLSQLiteGraphTestCase(SQLiteGraphTestCase):
+    store_class = FOPLSQLite
+
+
+class FOPLSQLiteContextTestCase(SQLiteContextTestCase):
+    store_class = FOPLSQLite
+
+
+class IdDecodingFOPLSQLiteGraphTestCase(SQLiteGraphTestCase):
+    store_class = IdDecodingFOPLSQLite
+
+
+class IdDecodingFOPLSQLiteContextTestCase(SQLiteContextTestCase):
+    store_class = IdDecodingFOPLSQLite
+
+
+class VerticalFOPLSQLiteGraphTestCase(SQLiteGraphTestCase):
+    store_class = VerticalFOPLSQLite
+
+
+class VerticalFOPLSQLiteContextTestCase(SQLiteContextTestCase):
+    store_class = VerticalFOPLSQLite
+
+
+class WriteBehindSQLiteGraphTestCase(SQLiteGraphTestCase):
+    store_class = WriteBehindSQLite
+
+
+class WriteBehindSQLiteContextTestCase(SQLiteContextTestCase):
+    store_class = WriteBehindSQLite
+
+
+class WriteBehindFOPLSQLiteGraphTestCase(SQLiteGraphTestCase):
+    store_class = WriteBehindFOPLSQLite
+
+
+class WriteBehindFOPLSQLiteContextTestCase(SQLiteContextTestCase):
+    store_class = WriteBehindFOPLSQLite
+
+
+class SQLiteStoreTestCase(SQLiteMixin, unittest.TestCase):
+    graph_class = ConjunctiveGraph
+
+    def testReopen(self):
+        self.graph.get_context(c1).add((michel, name, Literal(u'Michel')))
+        self.graph.commit()
+        self.store.close()
+        store = self.store_class('test')
+        self.assertEquals(store.open(self.path, create=False), VALID_STORE)
+        self.assertEquals(len(store), 1)
+        store.destroy(self.path)
+        self.assertEquals(store.open(self.path, create=False), NO_STORE)
+        self.store = store
+
+    def testLiterals(self):
+        g = self.graph.get_context(c1)
+        literals = [Literal(u"O'Neil"), Literal(u'café', lang=u'fr'),
+                    Literal(1), Literal(u'1')]
+        for literal in literals + literals:
+            g.add((michel, name, literal))
+        self.assertEquals(len(g), 4)
+        self.assertEquals(sorted(g.objects(michel, name)), sorted(literals))
+        self.assertEquals(list(g.subjects(name, Literal(1))), [michel])
+        self.assertEquals(
+            list(g.objects(michel, REGEXTerm(u'O.*'))), [])
+        self.assertEquals(
+            list(g.triples((michel, name, REGEXTerm(u'O.*')))),
+            [(michel, name, Literal(u"O'Neil"))])
+
+    def testQuotedStatements(self):
+        formula = QuotedGraph(self.store, URIRef(u'formula'))
+        formula.add((michel, likes, person))
+        self.graph.get_context(c1).add((michel, RDF.type, person))
+        self.assertEquals(len(self.graph), 1)
+        self.assertEquals(list(formula), [(michel, likes, person)])
+
+    def testQueryPlans(self):
+        self.store.analyzeQueries = True
+        list(self.graph.triples((None, None, Literal(u'x'))))
+        list(self.graph.triples((michel, name, None)))
+        plans = self.store.queryPlans
+        self.assertEquals(plans.queries, {'??o?': 1, 'sp??': 1})
+        for shape, table, count in plans.fullScans():
+            self.assertEquals(shape, '??o?')
+        self.failIf(
+            [access for access in plans.accesses['sp??'] if access[2]])
+
+    def testLoad(self):
+        count = self.store.load(data=n3doc, format='n3', context=c1)
+        self.assertEquals(count, 4)
+        g = self.graph.get_context(c1)
+        self.assertEquals(len(g), 4)
+        self.assertEquals(
+            set(g.objects(URIRef(u'http://example.org/a'),
+                          URIRef(u'http://example.org/d'))),
+            set([Literal(u'e'), Literal(u'é', lang=u'fr')]))
+
+    def testContextOperations(self):
+        staging = self.graph.get_context(URIRef(u'staging'))
+        staging.parse(data=bgpdoc, format='n3')
+        self.store.load(data=n3doc, format='n3', context=c1)
+        g = self.graph.get_context(c1)
+        triples = set(staging)
+        copy = self.graph.get_context(URIRef(u'copy'))
+        self.store.copyContext(staging, copy)
+        self.store.copyContext(staging, copy)
+        self.assertEquals(set(copy), triples)
+        self.assertEquals(len(copy), len(triples))
+        self.store.replaceContext(g, staging)
+        self.assertEquals(set(g), triples)
+        self.assertEquals(len(staging), 0)
+        self.assertRaises(ValueError, self.store.replaceContext, g, g)
+        self.graph.remove_context(copy)
+        self.assertEquals(len(copy), 0)
+        self.assertEquals(len(self.graph), len(triples))
+
+    def testContextOperationsAndResultCache(self):
+        staging = self.graph.get_context(URIRef(u'staging'))
+        staging.add((michel, likes, person))
+        copy = self.graph.get_context(URIRef(u'copy'))
+        query = 'SELECT ?o WHERE { ?s ?p ?o }'
+        enableResultCache(self.store)
+        try:
+            self.assertEquals(len(copy.query(query)), 0)
+            self.store.copyContext(staging, copy)
+            self.assertEquals(list(copy.query(query)), [(person,)])
+            self.assertEquals(len(staging.query(query)), 1)
+            self.store.replaceContext(copy, staging)
+            self.assertEquals(len(staging.query(query)), 0)
+        finally:
+            disableResultCache(self.store)
+
+    def testWriteBehind(self):
+        self.store.writeBehindSize = 3
+        self.store.writeBehindAge = 3600
+        g = self.graph.get_context(c1)
+        g.add((michel, likes, person))
+        g.add((michel, name, Literal(u'Michel')))
+        self.assertEquals(len(self.store._writeBuffer.quads), 2)
+        # reads see the buffered statements
+        self.assertEquals(len(g), 2)
+        self.failIf(self.store._writeBuffer.quads)
+        for i in range(3):
+            g.add((michel, name, Literal(i)))
+        self.failIf(self.store._writeBuffer.quads)
+        self.store.writeBehindAge = 0
+        g.add((michel, RDF.type, person))
+        self.failIf(self.store._writeBuffer.quads)
+        self.store.writeBehindAge = 3600
+        self.store.commit()
+        g.add((person, likes, michel))
+        self.store.rollback()
+        self.failIf(self.store._writeBuffer.quads)
+        self.assertEquals(len(g), 6)
+        g.add((person, likes, michel))
+        self.store.commit()
+        self.failIf(self.store._writeBuffer.quads)
+        self.assertEquals(set(g.objects(person, likes)), set([michel]))
+
+    def testWriteBehindAndResultCache(self):
+        self.store.writeBehindSize = 100
+        self.store.writeBehindAge = 3600
+        enableResultCache(self.store)
+        try:
+            query = 'SELECT ?o WHERE { ?s ?p ?o }'
+            self.assertEquals(len(self.graph.query(query)), 0)
+            self.graph.get_context(c1).add((michel, likes, person))
+            self.assertEquals(len(self.store._writeBuffer.quads), 1)
+            self.assertEquals(list(self.graph.query(query)), [(person,)])
+        finally:
+            disableResultCache(self.store)
+
+
+class SQLiteTemplateQueriesTestCase(SQLiteMixin, unittest.TestCase):
+    graph_class = ConjunctiveGraph
+
+    def testTemplateQueries(self):
+        g = self.graph.get_context(c1)
+        patterns = [
+            (None, None, None, None), (michel, None, None, g),
+            (None, RDF.type, person, None), (michel, name, Literal(u''), g),
+            (None, name, Literal(u'x', lang=u'en'), None),
+            (None, name, Literal(1), g), (REGEXTerm(u'm.*'), None, None, g),
+            (None, REGEXTerm(u'.*type'), [person, REGEXTerm(u'p')], None),
+            ([michel, person], likes, None, None),
+            (None, None, None, Graph(self.store, REGEXTerm(u'context')))]
+        for subject, predicate, obj, context in patterns:
+            q, parameters, aliases = self.store._triplesQuery(
+                subject, predicate, obj, context)
+            key, slots = self.store._queryShape(
+                subject, predicate, obj, context)
+            self.assertEquals(self.store._queryParameters(aliases, slots),
+                              parameters)
+        g.add((michel, name, Literal(u'Michel')))
+        for i in range(3):
+            self.assertEquals(
+                len(list(g.triples((michel, name, Literal(u'Michel'))))), 1)
+            self.assertEquals(
+                len(list(g.triples((None, None, Literal(u'x'))))), 0)
+        self.assertEquals(len(self.store._tripleQueries), 2)
+
+
+class SQLiteStatisticsTestCase(SQLiteMixin, unittest.TestCase):
+    graph_class = ConjunctiveGraph
+
+    def setUp(self):
+        SQLiteMixin.setUp(self)
+        self.store.statistics = True
+
+    def testDuplicatesAreNotCounted(self):
+        g = self.graph.get_context(c1)
+        triples = [(michel, likes, person), (michel, name, Literal(u'M'))]
+        for i in range(2):
+            for triple in triples:
+                g.add(triple)
+        self.assertEquals(len(self.store), 2)
+        self.store.addN([triple + (g,) for triple in triples])
+        self.store.load(data=bgpdoc, format='n3', context=c1)
+        self.store.load(data=bgpdoc, format='n3', context=c1)
+        total = len(self.store)
+        self.store.rebuildStatistics()
+        self.assertEquals(len(self.store), total)
+        self.assertEquals(len(self.store), len(list(g)))
+
+
+class FOPLSQLiteStoreTestCase(SQLiteStoreTestCase):
+    store_class = FOPLSQLite
+
+    def testUniqueIndexesAreKeptByLoads(self):
+        indexes = self.store.removeIndexingStatements()
+        self.assert_(indexes)
+        self.failIf([statement for statement in indexes
+                     if 'posc' in statement or 'primaryKey' in statement])
+        self.store.load(data=n3doc, format='n3', context=c1)
+        self.store.load(data=n3doc, format='n3', context=c1)
+        self.assertEquals(len(self.graph), 4)
+
+    def testNoStatistics(self):
+        self.failIf(self.store.statistics)
+        self.store.load(data=n3doc, format='n3', context=c1)
+        self.store.rebuildStatistics()
+        self.assertEquals(len(self.graph), 4)
+
+    def testReferenceCounts(self):
+        g = self.graph.get_context(c1)
+        g.parse(data=bgpdoc, format='n3')
+        g.parse(data=bgpdoc, format='n3')
+        c = self.store._db.cursor()
+        counts = {}
+        for hash in self.store.hashes:
+            c.execute("SELECT id, ref_count FROM %s" % hash)
+            counts[hash] = sorted(c.fetchall())
+        c.execute("UPDATE %s SET ref_count = 0" % self.store.idHash)
+        self.store.recountReferences()
+        for hash in self.store.hashes:
+            c.execute("SELECT id, ref_count FROM %s" % hash)
+            self.assertEquals(sorted(c.fetchall()), counts[hash])
+        g.remove((None, None, None))
+        c.execute("SELECT lexical FROM %s" % self.store.idHash)
+        self.assertEquals(c.fetchall(), [(unicode(RDF.type),)])
+        c.execute("SELECT count(*) FROM %s" % self.store.valueHash)
+        self.assertEquals(c.fetchall(), [(0,)])
+        c.close()
+
+    def testContextOperationsKeepReferenceCounts(self):
+        self.testContextOperations()
+        c = self.store._db.cursor()
+        counts = {}
+        for hash in self.store.hashes:
+            c.execute("SELECT id, ref_count FROM %s" % hash)
+            counts[hash] = sorted(c.fetchall())
+        self.store.recountReferences()
+        for hash in self.store.hashes:
+            c.execute("SELECT id, ref_count FROM %s" % hash)
+            self.assertEquals(sorted(c.fetchall()), counts[hash])
+        c.close()
+
+    def testHashCollisions(self):
+        g = self.graph.get_context(c1)
+        g.add((michel, name, Literal(u'Michél')))
+        c = self.store._db.cursor()
+        c.execute("UPDATE %s SET lexical = 'Michel'" % self.store.valueHash)
+        c.close()
+        RelationalHash.COLLISION_DETECTION = True
+        try:
+            g.add((michel, likes, person))
+            self.assertRaises(Exception, g.add,
+                              (person, name, Literal(u'Michél')))
+        finally:
+            RelationalHash.COLLISION_DETECTION = False
+
+    def testParallelPartitions(self):
+        g = self.graph.get_context(c1)
+        g.parse(data=bgpdoc, format='n3')
+        self.graph.get_context(URIRef(u'context-2')).parse(
+            data=n3doc, format='n3')
+        self.graph.commit()
+        patterns = [((None, None, None), None), ((None, None, None), g),
+                    ((None, URIRef(u'http://example.org/knows'), None), None)]
+        serial = [list(self.store.triples(triple, context))
+                  for triple, context in patterns]
+        self.store.pool = ConnectionPool(self.store.connect)
+        self.store.parallelPartitions = True
+        self.store.fetchSize = 2
+        try:
+            for idx in range(len(patterns)):
+                triple, context = patterns[idx]
+                rows = [(t, sorted([ctx.identifier for ctx in contexts]))
+                        for t, contexts in self.store.triples(triple,
+                                                              context)]
+                expected = [(t, sorted([ctx.identifier for ctx in contexts]))
+                            for t, contexts in serial[idx]]
+                if context is None:
+                    self.assertEquals(rows, expected)
+                else:
+                    self.assertEquals(sorted(rows), sorted(expected))
+            # a scan given up midway stops its queries, which hand their
+            # connections back to the pool
+            triples = self.store.triples((None, None, None), None)
+            triples.next()
+            triples.close()
+            pool = self.store.pool
+            pool.releaseConnection()
+            self.assertEquals(pool.idle, pool.opened)
+        finally:
+            self.store.parallelPartitions = False
+            self.store.pool.releaseConnection()
+
+    def testBatchUnification(self):
+        self.graph.get_context(c1).parse(data=bgpdoc, format='n3')
+        memory = ConjunctiveGraph()
+        for s, p, o, c in self.graph.quads((None, None, None)):
+            memory.get_context(c.identifier).add((s, p, o))
+        self.assert_(self.store.batch_unification)
+        for query in bgpqueries:
+            query = "PREFIX : <http://example.org/> " + query
+            self.assertEquals(
+                sorted([tuple(row) for row in self.graph.query(query)]),
+                sorted([tuple(row) for row in memory.query(query)]))
+
+
+class IdDecodingFOPLSQLiteStoreTestCase(FOPLSQLiteStoreTestCase):
+    store_class = IdDecodingFOPLSQLite
+
+    def testTermDictionary(self):
+        g = self.graph.get_context(c1)
+        g.parse(data=bgpdoc, format='n3')
+        formula = QuotedGraph(self.store, URIRef(u'formula'))
+        formula.add((michel, likes, Literal(u'café', lang=u'fr')))
+        quads = sorted(self.graph.quads((None, None, None)))
+        dictionary = self.store.termDictionary
+        misses = dictionary.identifiers.misses, dictionary.values.misses
+        self.assertEquals(sorted(self.graph.quads((None, None, None))),
+                          quads)
+        self.assertEquals(
+            (dictionary.identifiers.misses, dictionary.values.misses),
+            misses)
+        self.assertEquals(list(formula),
+                          [(michel, likes, Literal(u'café', lang=u'fr'))])
+        id = dictionary.values.keys()[0]
+        self.assertEquals(
+            self.store.valueHash.generateDict(self.store._db, [id]),
+            {id: dictionary.values[id]})
+
+
+class VerticalFOPLSQLiteStoreTestCase(FOPLSQLiteStoreTestCase):
+    store_class = VerticalFOPLSQLite
+
+    def testVerticalPartitions(self):
+        knows = URIRef(u'http://example.org/knows')
+        self.graph.get_context(c1).parse(data=bgpdoc, format='n3')
+        literals, relations = self.store.verticalPartitions[knows]
+        c = self.store._db.cursor()
+        c.execute("SELECT count(*) FROM %s" % relations)
+        self.assertEquals(c.fetchall(), [(4,)])
+        c.execute("SELECT count(*) FROM %s" % self.store.binaryRelations)
+        self.assertEquals(c.fetchall(), [(0,)])
+        c.close()
+        pattern = (None, knows, None, None)
+        self.assertEquals(
+            BinaryRelationPartitionCoverage(pattern, self.store.partitions),
+            [literals, relations])
+        pattern = (None, [knows, likes], None, None)
+        self.assertEquals(
+            len(BinaryRelationPartitionCoverage(pattern,
+                                                self.store.partitions)), 4)
+        self.assertEquals(len(list(self.graph.triples(pattern[:3]))), 4)
+        self.assertRaises(ValueError, FOPLSQLite, 'test', None, [RDF.type])
+
+
+class RowsPool(object):
+    # a pool whose connections answer the queries of a ParallelResolution
+    # from lists of rows (see RowsCursor)
+    replicas = []
+
+    def acquire(self):
+        return self
+
+    def release(self, connection):
+        pass
+
+    def cursor(self):
+        return RowsCursor()
+
+
+class RowsCursor(object):
+
+    def execute(self, query, fetched):
+        # query: the rows, and a delay before the first batch is read
+        rows, self.delay = query
+        self.rows = iter(rows)
+        self.fetched = fetched
+
+    def fetchmany(self, size):
+        time.sleep(self.delay)
+        self.delay = 0
+        rows = list(islice(self.rows, size))
+        self.fetched.append(len(rows))
+        return rows
+
+    def close(self):
+        pass
+
+
+def row(i):
+    return (i, 'U', 0, 'U', 0, 'U', 0, 'U', None, None)
+
+
+class ParallelResolutionTestCase(unittest.TestCase):
+
+    def _resolution(self, fetched):
+        queries = [(([row(0)], 0.5), []),
+                   (([row(i) for i in range(1, 20001)], 0), fetched)]
+        return ParallelResolution(
+            queries, RowsPool(), execute=lambda c, q, p: c.execute(q, p),
+            fetchSize=10, queueSize=2)
+
+    def testMergeReadsAheadBoundedly(self):
+        # the merge waits for the slow query, the fast one is not read
+        # beyond its queue
+        fetched = []
+        resolution = self._resolution(fetched)
+        self.assertEquals(resolution.fetchmany(1), [row(0)])
+        self.assert_(sum(fetched) <= 40, sum(fetched))
+        self.assertEquals(len(resolution.fetchall()), 20000)
+        fetched = []
+        resolution = self._resolution(fetched)
+        resolution.fetchmany(1)
+        resolution.close()
+        self.assert_(sum(fetched) <= 50, sum(fetched))
+
+
+if __name__ == "__main__":
+    unittest.main()